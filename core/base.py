@@ -1,22 +1,403 @@
-from typing import List
+from typing import Iterable, List
 
+import numpy as np
 from sympy import Point2D, Segment
 
+from core.spatial import SpatialIndex
+
 __author__ = 'Xomak'
 
 
-class Area:
+class PointCloud:
+    """
+    Points storage, backed by contiguous float64 (N, 2) array. Finders should use array views, provided by this class,
+    sympy points are built only on demand (for the old code) and are cached until the cloud is changed.
+    """
+
+    def __init__(self, points: np.ndarray = None):
+        """
+        Inits cloud
+        :param points: Array-like object of shape (N, 2). It is not copied, if it is already contiguous float64 array
+        """
+        if points is None:
+            array = np.empty((0, 2), dtype=np.float64)
+        else:
+            array = np.ascontiguousarray(points, dtype=np.float64)
+            if array.size == 0:
+                array = array.reshape((0, 2))
+
+        if array.ndim != 2 or array.shape[1] != 2:
+            raise ValueError("Points array of shape (N, 2) expected, but {} received".format(array.shape))
+
+        self._buffer = array
+        self._size = len(array)
+        self._sympy_points = None
+
+    @staticmethod
+    def from_points(points: Iterable[Point2D]) -> 'PointCloud':
+        """
+        Builds cloud from sympy points. Given points are kept to be returned by to_points() as is
+        :param points: Iterable of points
+        :return: New cloud
+        """
+        points_list = list(points)
+        cloud = PointCloud(PointCloud.as_array(points_list))
+        cloud._sympy_points = points_list
+        return cloud
+
+    @staticmethod
+    def as_array(points) -> np.ndarray:
+        """
+        Converts given points to float64 (N, 2) array. Clouds and arrays are not copied, when it is possible
+        :param points: PointCloud, array-like object or iterable of sympy points
+        :return: Points array
+        """
+        if isinstance(points, PointCloud):
+            return points.array
+
+        if isinstance(points, np.ndarray):
+            return np.ascontiguousarray(points, dtype=np.float64).reshape((-1, 2))
+
+        coordinates = [(float(point[0]), float(point[1])) for point in points]
+        return np.array(coordinates, dtype=np.float64).reshape((-1, 2))
+
+    @property
+    def array(self) -> np.ndarray:
+        """
+        Read-only (N, 2) view of the points, no data is copied
+        """
+        view = self._buffer[:self._size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.array[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.array[:, 1]
+
+    def __len__(self):
+        return self._size
+
+    def append(self, point):
+        """
+        Appends point to the end of the cloud. Storage grows geometrically, so appending is amortized O(1)
+        :param point: Point2D or (x, y) pair
+        """
+        if self._size == len(self._buffer):
+            capacity = max(2 * len(self._buffer), 16)
+            buffer = np.empty((capacity, 2), dtype=np.float64)
+            buffer[:self._size] = self._buffer[:self._size]
+            self._buffer = buffer
+
+        self._buffer[self._size, 0] = float(point[0])
+        self._buffer[self._size, 1] = float(point[1])
+        self._size += 1
+
+        if self._sympy_points is not None and isinstance(point, Point2D):
+            self._sympy_points.append(point)
+        else:
+            self._sympy_points = None
+
+    def to_points(self) -> List[Point2D]:
+        """
+        Returns points as sympy objects. They are created lazily on the first call
+        :return: List of points
+        """
+        if self._sympy_points is None:
+            self._sympy_points = [Point2D(x, y) for x, y in self.array.tolist()]
+        return list(self._sympy_points)
+
+
+class ObjectsStore:
+    """
+    Base of the columnar objects storages: each attribute of the objects is the column array, which storage grows
+    geometrically like the one of PointCloud. Columns are returned as read-only views. Sympy objects are built only on
+    demand and are cached, objects, which were added as sympy ones, are returned as is.
+    """
 
     def __init__(self):
+        self._size = 0
+        self._sources = np.empty(0, dtype=np.int16)
+        self._source_names = []
+        self._sympy_objects = dict()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def sources(self) -> np.ndarray:
+        """
+        Read-only view of the codes of the finders, which found the objects: indices in source_names or -1
+        """
+        return self._view(self._sources, self._size)
+
+    @property
+    def source_names(self) -> List[str]:
+        return list(self._source_names)
+
+    def _encode_source(self, source) -> int:
+        if source is None:
+            return -1
+
+        if source not in self._source_names:
+            self._source_names.append(source)
+        return self._source_names.index(source)
+
+    @staticmethod
+    def _view(column: np.ndarray, size: int) -> np.ndarray:
+        view = column[:size]
+        view.flags.writeable = False
+        return view
+
+    @staticmethod
+    def _grown(column: np.ndarray, size: int, required_size: int) -> np.ndarray:
+        """
+        Returns column with the capacity at least of required_size. Column is reallocated, if it is needed
+        :param column: Column array
+        :param size: Number of used rows
+        :param required_size: Required number of rows
+        :return: The same or the new column
+        """
+        if required_size <= len(column):
+            return column
+
+        capacity = max(2 * len(column), required_size, 16)
+        grown_column = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+        grown_column[:size] = column[:size]
+        return grown_column
+
+
+class SegmentsStore(ObjectsStore):
+    """
+    Segments storage: ends (x1, y1, x2, y2), numbers of points, supporting the segments (-1 if it is unknown),
+    their densities (nan if it is unknown) and sources
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ends = np.empty((0, 4), dtype=np.float64)
+        self._points_numbers = np.empty(0, dtype=np.intp)
+        self._densities = np.empty(0, dtype=np.float64)
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self._view(self._ends, self._size)
+
+    @property
+    def points_numbers(self) -> np.ndarray:
+        return self._view(self._points_numbers, self._size)
+
+    @property
+    def densities(self) -> np.ndarray:
+        return self._view(self._densities, self._size)
+
+    def add_segments(self, ends, points_numbers=None, densities=None, source: str = None):
+        """
+        Appends many segments at once
+        :param ends: (M, 4) array of segments' ends
+        :param points_numbers: (M) array of numbers of supporting points or None
+        :param densities: (M) array of densities or None
+        :param source: Name of the finder, which found the segments
+        """
+        ends = np.asarray(ends, dtype=np.float64).reshape((-1, 4))
+        start, end = self._size, self._size + len(ends)
+
+        self._ends = self._grown(self._ends, start, end)
+        self._points_numbers = self._grown(self._points_numbers, start, end)
+        self._densities = self._grown(self._densities, start, end)
+        self._sources = self._grown(self._sources, start, end)
+
+        self._ends[start:end] = ends
+        self._points_numbers[start:end] = -1 if points_numbers is None else points_numbers
+        self._densities[start:end] = np.nan if densities is None else densities
+        self._sources[start:end] = self._encode_source(source)
+        self._size = end
+
+    def append(self, segment: Segment, source: str = None):
+        """
+        Appends one sympy segment. It is kept to be returned by to_segments() as is
+        :param segment: Segment
+        :param source: Name of the finder, which found the segment
+        """
+        self.add_segments((segment.p1.x, segment.p1.y, segment.p2.x, segment.p2.y), source=source)
+        self._sympy_objects[self._size - 1] = segment
+
+    def to_segments(self) -> List[Segment]:
+        """
+        Returns segments as sympy objects. They are created lazily on the first call
+        :return: List of segments
+        """
+        if len(self._sympy_objects) < self._size:
+            for index, (x1, y1, x2, y2) in enumerate(self.ends.tolist()):
+                if index not in self._sympy_objects:
+                    self._sympy_objects[index] = Segment(Point2D(x1, y1), Point2D(x2, y2))
+
+        return [self._sympy_objects[index] for index in range(self._size)]
+
+
+class PolylinesStore(ObjectsStore):
+    """
+    Polylines storage: vertices of all polylines are concatenated, and offsets are their boundaries: vertices of the
+    i-th polyline are vertices[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._vertices = np.empty((0, 2), dtype=np.float64)
+        self._vertices_number = 0
+        self._offsets = np.zeros(1, dtype=np.intp)
+
+    @property
+    def vertices(self) -> np.ndarray:
+        return self._view(self._vertices, self._vertices_number)
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._view(self._offsets, self._size + 1)
+
+    def get_vertices(self, index: int) -> np.ndarray:
+        """
+        Returns read-only view of the vertices of one polyline
+        :param index: Index of the polyline
+        :return: (K, 2) array of vertices
+        """
+        return self.vertices[self._offsets[index]:self._offsets[index + 1]]
+
+    def add_polylines(self, points, offsets, source: str = None):
+        """
+        Appends many polylines at once
+        :param points: PointCloud or (N, 2) array of concatenated points of the polylines
+        :param offsets: (P + 1) array of boundaries: points of the i-th polyline are points[offsets[i]:offsets[i + 1]]
+        :param source: Name of the finder, which found the polylines
+        """
+        np_points = PointCloud.as_array(points)
+        offsets = np.asarray(offsets, dtype=np.intp)
+        polylines_number = len(offsets) - 1
+        if polylines_number < 1:
+            return
+
+        start, end = self._vertices_number, self._vertices_number + int(offsets[-1] - offsets[0])
+        self._vertices = self._grown(self._vertices, start, end)
+        self._vertices[start:end] = np_points[offsets[0]:offsets[-1]]
+        self._vertices_number = end
+
+        self._offsets = self._grown(self._offsets, self._size + 1, self._size + polylines_number + 1)
+        self._offsets[self._size + 1:self._size + polylines_number + 1] = offsets[1:] - offsets[0] + start
+
+        self._sources = self._grown(self._sources, self._size, self._size + polylines_number)
+        self._sources[self._size:self._size + polylines_number] = self._encode_source(source)
+        self._size += polylines_number
+
+    def append(self, polyline: 'Polyline', source: str = None):
+        """
+        Appends one polyline. It is kept to be returned by to_polylines() as is
+        :param polyline: Polyline
+        :param source: Name of the finder, which found the polyline
+        """
+        points = polyline.points
+        self.add_polylines(PointCloud.as_array(points), (0, len(points)), source)
+        self._sympy_objects[self._size - 1] = polyline
+
+    def to_polylines(self) -> List['Polyline']:
+        """
+        Returns polylines as objects with sympy points. They are created lazily on the first call
+        :return: List of polylines
+        """
+        if len(self._sympy_objects) < self._size:
+            offsets = self.offsets.tolist()
+            for index in range(self._size):
+                if index not in self._sympy_objects:
+                    polyline = Polyline()
+                    for x, y in self._vertices[offsets[index]:offsets[index + 1]].tolist():
+                        polyline.add(Point2D(x, y))
+                    self._sympy_objects[index] = polyline
+
+        return [self._sympy_objects[index] for index in range(self._size)]
+
+
+class Area:
+
+    def __init__(self, points=None):
         self._objects_dict = dict()
+        self._segments = SegmentsStore()
+        self._polylines = PolylinesStore()
+        self._spatial_index = None
+        self.points = points
+
+    @property
+    def points(self) -> PointCloud:
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        if isinstance(points, PointCloud):
+            self._points = points
+        elif points is None or isinstance(points, np.ndarray):
+            self._points = PointCloud(points)
+        else:
+            self._points = PointCloud.from_points(points)
+        self._spatial_index = None
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """
+        KD-tree over the points. It is built on the first access and is cached until the points are replaced or extended
+        """
+        if self._spatial_index is None or len(self._spatial_index) != len(self._points):
+            self._spatial_index = SpatialIndex(self._points.array)
+        return self._spatial_index
+
+    @property
+    def segments(self) -> SegmentsStore:
+        return self._segments
+
+    @property
+    def polylines(self) -> PolylinesStore:
+        return self._polylines
+
+    def add_segments(self, ends, points_numbers=None, densities=None, source: str = None):
+        """
+        Adds many segments at once without creating sympy objects (see SegmentsStore.add_segments())
+        """
+        self._segments.add_segments(ends, points_numbers, densities, source)
+
+    def add_polylines(self, points, offsets, source: str = None):
+        """
+        Adds many polylines at once without creating sympy objects (see PolylinesStore.add_polylines())
+        """
+        self._polylines.add_polylines(points, offsets, source)
 
     def get_objects(self, objects_type) -> List:
+        if objects_type is Point2D:
+            return self._points.to_points()
+
+        if objects_type is Segment:
+            return self._segments.to_segments()
+
+        if objects_type is Polyline:
+            return self._polylines.to_polylines()
+
         if objects_type in self._objects_dict:
             return list(self._objects_dict[objects_type])
         else:
             return []
 
     def add_object(self, object_type, object_to_add):
+        if object_type is Point2D:
+            self._points.append(object_to_add)
+            return
+
+        if object_type is Segment:
+            self._segments.append(object_to_add)
+            return
+
+        if object_type is Polyline:
+            self._polylines.append(object_to_add)
+            return
+
         if object_type not in self._objects_dict:
             self._objects_dict[object_type] = list()
         self._objects_dict[object_type].append(object_to_add)
@@ -24,8 +405,8 @@ class Area:
 
 class SimpleArea(Area):
 
-    def __init__(self, x, y):
-        super().__init__()
+    def __init__(self, x, y, points=None):
+        super().__init__(points)
         self._x = x
         self._y = y
 
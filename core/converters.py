@@ -2,9 +2,10 @@ from collections import namedtuple
 from typing import Iterable
 
 import numpy as np
+from scipy import sparse
 from sympy import Point2D
 
-from core.utils import MinFinder, MaxFinder
+from core.base import PointCloud
 
 __author__ = 'Xomak'
 
@@ -23,75 +24,103 @@ class PointToPointConverter:
 
 class ImagePointToCloudPointConverter(PointToPointConverter):
 
-    def __init__(self, origin: Point2D):
-        self.origin = Point2D(round(origin.x), round(origin.y))
+    def __init__(self, origin: Point2D, scale=1):
+        """
+        Inits converter
+        :param origin: Cloud point, corresponding to the image's origin. It is snapped to the image grid
+        :param scale: Size of the image cell in the cloud units
+        """
+        self.scale = scale
+        self.origin = Point2D(round(origin.x / scale) * scale, round(origin.y / scale) * scale)
 
     def convert(self, point: Point2D) -> Point2D:
-        return point + self.origin
+        return point * self.scale + self.origin
+
+    def convert_array(self, points: np.ndarray) -> np.ndarray:
+        """
+        Converts image points in bulk
+        :param points: (N, 2) array of image points (column, row)
+        :return: (N, 2) array of cloud points
+        """
+        origin = np.array([float(self.origin.x), float(self.origin.y)])
+        return np.asarray(points, dtype=np.float64) * self.scale + origin
 
 
 class PointsToImageRoundBasedConverter:
 
     CloudParams = namedtuple('CloudParams', ('min_x', 'max_x', 'min_y', 'max_y', 'min_precision'))
 
-    def __init__(self, min_precision=0.5):
+    def __init__(self, min_precision=0.5, cell_size=1, dtype=np.uint8, sparse=False):
+        """
+        Inits converter
+        :param min_precision: Minimal allowed distance between points' coordinates
+        :param cell_size: Size of the image cell (pixel) in the cloud units
+        :param dtype: Type of the image values, e.g. uint8 or bool
+        :param sparse: Whether image should be returned as scipy.sparse.coo_matrix instead of the dense array
+        """
+        if cell_size <= 0:
+            raise ValueError("Cell size must be positive")
+
         self.min_precision = min_precision
+        self.cell_size = cell_size
+        self.dtype = dtype
+        self.sparse = sparse
 
     @staticmethod
-    def find_cloud_params(points: Iterable[Point2D]) -> CloudParams:
-        points_list = list(points)
-
-        min_x = MinFinder()
-        max_x = MaxFinder()
-        min_y = MinFinder()
-        max_y = MaxFinder()
-        min_precision = MinFinder()
-
-        for i in range(0, len(points_list)):
-            point_a = points_list[i]
-
-            min_x.put(point_a.x)
-            max_x.put(point_a.x)
-
-            min_y.put(point_a.y)
-            max_y.put(point_a.y)
-
-            for j in range(i+1, len(points_list)):
-                point_b = points_list[j]
-                x_precision = (abs(point_a.x - point_b.x))
-                y_precision = (abs(point_a.y - point_b.y))
-                min_precision.put(x_precision)
-                min_precision.put(y_precision)
-
-        return PointsToImageRoundBasedConverter.CloudParams(min_x.current,
-                                                            max_x.current,
-                                                            min_y.current,
-                                                            max_y.current,
-                                                            min_precision.current)
-
-    def convert(self, points: Iterable[Point2D]) -> (np.ndarray, PointToPointConverter):
-        params = self.find_cloud_params(points)
-
-        if params.min_precision < self.min_precision:
+    def find_cloud_params(points) -> CloudParams:
+        """
+        Finds cloud's extent and minimal non-trivial distance between points' coordinates. Minimal distance along
+        each axis is found between neighbours of the sorted coordinates, so it takes O(n log n)
+        :param points: PointCloud, (N, 2) array or iterable of points
+        :return: Cloud params. If there are less than two points, min_precision is None
+        """
+        np_points = PointCloud.as_array(points)
+
+        if len(np_points) == 0:
+            return PointsToImageRoundBasedConverter.CloudParams(None, None, None, None, None)
+
+        min_x, min_y = np_points.min(axis=0).tolist()
+        max_x, max_y = np_points.max(axis=0).tolist()
+
+        min_precision = None
+        if len(np_points) > 1:
+            sorted_points = np.sort(np_points, axis=0)
+            min_precision = float(np.diff(sorted_points, axis=0).min())
+
+        return PointsToImageRoundBasedConverter.CloudParams(min_x, max_x, min_y, max_y, min_precision)
+
+    def convert(self, points) -> (np.ndarray, PointToPointConverter):
+        """
+        Rasterizes points: each cell, containing at least one point, is set to 1
+        :param points: PointCloud, (N, 2) array or iterable of points
+        :return: Image (dense array or sparse matrix with rows along y axis) and converter of image points to the cloud
+        """
+        np_points = PointCloud.as_array(points)
+        params = self.find_cloud_params(np_points)
+
+        if params.min_precision is not None and params.min_precision < self.min_precision:
             raise ValueError("Cloud contains points with precision less then required.")
 
-        width = round(params.max_x) - round(params.min_x) + 1
-        height = round(params.max_y) - round(params.min_y) + 1
-
-        new_origin = Point2D(params.min_x, params.min_y)
-        result_array = np.zeros((height, width), dtype=int)
+        # Cells are counted from the origin, snapped to the grid, as ImagePointToCloudPointConverter does, so that
+        # image points are mapped back to the cloud without shift
+        cell_size = self.cell_size
+        origin_column = round(params.min_x / cell_size)
+        origin_row = round(params.min_y / cell_size)
+        width = round(params.max_x / cell_size) - origin_column + 1
+        height = round(params.max_y / cell_size) - origin_row + 1
 
-        for point in points:
-            point_translated = point - new_origin
+        columns = np.round(np_points[:, 0] / cell_size).astype(np.intp) - origin_column
+        rows = np.round(np_points[:, 1] / cell_size).astype(np.intp) - origin_row
 
-            row = round(point_translated.y)
-            if row >= height:
-                row = height - 1
+        image_converter = ImagePointToCloudPointConverter(Point2D(params.min_x, params.min_y), cell_size)
 
-            column = round(point_translated.x)
-            if column >= width:
-                column = width - 1
+        if self.sparse:
+            cells = np.unique(rows * width + columns)
+            values = np.ones(len(cells), dtype=self.dtype)
+            image = sparse.coo_matrix((values, (cells // width, cells % width)), shape=(height, width))
+            return image, image_converter
 
-            result_array[row, column] = 1
+        image = np.zeros((height, width), dtype=self.dtype)
+        image[rows, columns] = 1
 
-        return result_array, ImagePointToCloudPointConverter(new_origin)
+        return image, image_converter
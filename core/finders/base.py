@@ -1,4 +1,9 @@
-from core.base import Area
+from typing import List
+
+import numpy as np
+from sympy import Segment, Point2D
+
+from core.base import Area, Polyline, PointCloud
 
 __author__ = 'Xomak'
 
@@ -14,4 +19,103 @@ class SegmentsFinder(Finder):
         :param area: Area to find objects
         :return: The same object (but modified)
         """
-        pass
\ No newline at end of file
+        pass
+
+
+class SimplifyingSegmentsFinder(SegmentsFinder):
+    """
+    Base class for finders, which simplify polylines of the area and take segments of the simplified polylines.
+    Subclasses only choose the main points of the polylines (see _find_masks())
+    """
+
+    def find(self, area: Area) -> Area:
+        ends = self.find_segments_array(area.polylines.vertices, area.polylines.offsets)
+        area.add_segments(ends, source=type(self).__name__)
+        return area
+
+    def _find_masks(self, points: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """
+        Finds main points of many polylines
+        :param points: (N, 2) array of concatenated points of the polylines
+        :param offsets: (P + 1) array of boundaries: points of the i-th polyline are points[offsets[i]:offsets[i + 1]]
+        :return: Boolean mask of main points
+        """
+        raise NotImplementedError()
+
+    def find_segments_array(self, points, offsets: np.ndarray) -> np.ndarray:
+        """
+        Simplifies many polylines and returns their segments
+        :param points: PointCloud or (N, 2) array of concatenated points of the polylines
+        :param offsets: (P + 1) array of polylines' boundaries (see _find_masks())
+        :return: (M, 4) array of segments' ends (x1, y1, x2, y2). Segments of zero length are skipped
+        """
+        np_points = PointCloud.as_array(points)
+        offsets = np.asarray(offsets, dtype=np.intp)
+
+        main_indices = np.flatnonzero(self._find_masks(np_points, offsets))
+        polylines_indices = np.searchsorted(offsets, main_indices, side='right')
+
+        is_segment = polylines_indices[1:] == polylines_indices[:-1]
+        segments_ends = np.hstack((np_points[main_indices[:-1][is_segment]],
+                                   np_points[main_indices[1:][is_segment]]))
+
+        return segments_ends[(segments_ends[:, :2] != segments_ends[:, 2:]).any(axis=1)]
+
+    @staticmethod
+    def _concatenate_polylines(polylines: List[Polyline]) -> (List[Point2D], np.ndarray):
+        points = []
+        offsets = [0]
+        for polyline in polylines:
+            points += polyline.points
+            offsets.append(len(points))
+
+        return points, np.array(offsets, dtype=np.intp)
+
+    def reduce_polylines(self, polylines: List[Polyline]) -> List[Polyline]:
+        """
+        Reduces polylines in list. All polylines are simplified in one batch
+        :param polylines: Polylines list
+        :return: List of reduced polylines
+        """
+        polylines = [polyline for polyline in polylines if len(polyline.points) > 1]
+        points, offsets = self._concatenate_polylines(polylines)
+        mask = self._find_masks(PointCloud.as_array(points), offsets)
+
+        reduced_polylines = []
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            polyline = Polyline()
+            for point, is_main in zip(points[start:end], mask[start:end]):
+                if is_main:
+                    polyline.add(point)
+            reduced_polylines.append(polyline)
+
+        return reduced_polylines
+
+    def find_segments_in_polylines(self, polylines: List[Polyline]) -> List[Segment]:
+        """
+        Finds segments in given polylines (with their reducing)
+        :param polylines: Polylines to extract segments
+        :return: List of segments
+        """
+        segments = []
+
+        reduced_polylines = self.reduce_polylines(polylines)
+        for polyline in reduced_polylines:
+            segments += polyline.get_segments()
+
+        return segments
+
+    def find_polyline_in_points(self, points: List[Point2D]) -> Polyline:
+        """
+        Finds polyline in given points list
+        :param points: List of points
+        :return: Polyline
+        """
+        mask = self._find_masks(PointCloud.as_array(points), np.array([0, len(points)], dtype=np.intp))
+
+        polyline = Polyline()
+        for point, is_main in zip(points, mask):
+            if is_main:
+                polyline.add(point)
+
+        return polyline
@@ -4,40 +4,328 @@ import numpy as np
 from skimage import transform
 from sympy import Point2D, Segment
 
-from core.base import Area
+from core.base import Area, PointCloud
 from core.converters import PointsToImageRoundBasedConverter
 from core.finders.base import SegmentsFinder
+from core.finders.segments import SegmentsInLineFinder
 
 
 class HoughTransformSegmentsFinder(SegmentsFinder):
 
-    def __init__(self, threshold=10, line_length=50, line_gap=10):
+    def __init__(self, threshold=10, line_length=50, line_gap=10, cell_size=1):
+        """
+        Inits finder
+        :param threshold: Threshold of the probabilistic Hough transform
+        :param line_length: Minimal length of the segment (in cells)
+        :param line_gap: Maximal gap between points of one segment (in cells)
+        :param cell_size: Size of the image cell in the cloud units
+        """
         self._threshold = threshold
         self._line_length = line_length
         self._line_gap = line_gap
+        self._cell_size = cell_size
 
     def find(self, area: Area) -> Area:
-        points = area.get_objects(Point2D)
-
-        segments = self.find_segments_from_points(points)
-        for segment in segments:
-            area.add_object(Segment, segment)
-
+        area.add_segments(self.find_segments_array(area.points), source=type(self).__name__)
         return area
 
-    def find_segments_from_points(self, points: List[Point2D]) -> List[Segment]:
-        points_converter = PointsToImageRoundBasedConverter(min_precision=0.0)
+    def find_segments_from_points(self, points) -> List[Segment]:
+        ends = self.find_segments_array(points)
+        return [Segment(Point2D(x1, y1), Point2D(x2, y2)) for x1, y1, x2, y2 in ends.tolist()]
+
+    def find_segments_array(self, points) -> np.ndarray:
+        """
+        Finds segments in given points
+        :param points: PointCloud, (N, 2) array or list of points
+        :return: (M, 4) array of segments' ends (x1, y1, x2, y2)
+        """
+        points_converter = PointsToImageRoundBasedConverter(min_precision=0.0, cell_size=self._cell_size, dtype=bool)
         image, image_converter = points_converter.convert(points)
 
         hough_lines = self._find_segments_in_image(image)
-        segments = []
-        for start, end in hough_lines:
-            start_point = image_converter.convert(Point2D(start[0], start[1]))
-            end_point = image_converter.convert(Point2D(end[0], end[1]))
-            segment = Segment(start_point, end_point)
-            segments.append(segment)
+        if len(hough_lines) == 0:
+            return np.empty((0, 4))
 
-        return segments
+        ends = image_converter.convert_array(np.array(hough_lines, dtype=np.float64).reshape((-1, 2)))
+        return ends.reshape((-1, 4))
 
     def _find_segments_in_image(self, image: np.array) -> List[tuple]:
         return transform.probabilistic_hough_line(image, self._threshold, self._line_length, self._line_gap)
+
+
+class HoughAccumulator:
+    """
+    (theta, rho) votes accumulator for the points-based Hough transform. Lines are parametrized as
+    x * cos(theta) + y * sin(theta) = rho, theta in [0, pi). Accumulator can be reused between frames:
+    its storage is reallocated only when the frame requires wider rho range than any previous one.
+    """
+
+    def __init__(self, theta_resolution=np.pi / 180, rho_resolution=1.0):
+        """
+        Inits accumulator
+        :param theta_resolution: Size of the theta bin in radians
+        :param rho_resolution: Size of the rho bin in the cloud units
+        """
+        if theta_resolution <= 0 or rho_resolution <= 0:
+            raise ValueError("Resolutions must be positive")
+
+        self._theta_resolution = theta_resolution
+        self._thetas = np.arange(0, np.pi, theta_resolution)
+        self._trigonometry = np.vstack((np.cos(self._thetas), np.sin(self._thetas)))
+        self._rho_resolution = rho_resolution
+        self._rho_max = 0.0
+        self._rho_number = 1
+        self._storage = np.zeros(len(self._thetas), dtype=np.int32)
+
+    @property
+    def thetas(self) -> np.ndarray:
+        return self._thetas
+
+    @property
+    def theta_resolution(self) -> float:
+        return self._theta_resolution
+
+    @property
+    def rho_resolution(self) -> float:
+        return self._rho_resolution
+
+    @property
+    def votes(self) -> np.ndarray:
+        """
+        (thetas number, rhos number) view of the votes
+        """
+        return self._storage[:len(self._thetas) * self._rho_number].reshape((len(self._thetas), self._rho_number))
+
+    def reset(self, rho_max: float):
+        """
+        Clears votes and prepares accumulator for lines with |rho| <= rho_max
+        :param rho_max: Maximal absolute rho
+        """
+        self._rho_max = float(rho_max)
+        self._rho_number = 2 * int(np.ceil(self._rho_max / self._rho_resolution)) + 1
+
+        size = len(self._thetas) * self._rho_number
+        if size > len(self._storage):
+            self._storage = np.zeros(size, dtype=np.int32)
+        else:
+            self._storage[:size] = 0
+
+    def rho_indices(self, points: np.ndarray) -> np.ndarray:
+        """
+        Finds rho bins of the lines through each point for each theta
+        :param points: (N, 2) array of points, which must lie within rho_max from the origin
+        :return: (N, thetas number) array of rho indices
+        """
+        rhos = points.dot(self._trigonometry)
+        return np.round((rhos + self._rho_max) / self._rho_resolution).astype(np.intp)
+
+    def vote(self, points: np.ndarray, weight=1):
+        """
+        Adds votes of the points for all lines through them
+        :param points: (N, 2) array of points, which must lie within rho_max from the origin
+        :param weight: Weight of the vote, -1 can be used to remove votes of the points
+        """
+        if len(points) == 0:
+            return
+
+        theta_indices = np.arange(len(self._thetas)) * self._rho_number
+        cells = (self.rho_indices(points) + theta_indices).ravel()
+        votes = self.votes
+        counts = np.bincount(cells, minlength=votes.size).reshape(votes.shape)
+        votes += (weight * counts).astype(votes.dtype)
+
+    def peak(self) -> (float, float, int):
+        """
+        Finds line with the maximal votes number
+        :return: Theta, rho and votes of the line
+        """
+        votes = self.votes
+        theta_index, rho_index = np.unravel_index(np.argmax(votes), votes.shape)
+        return self.get_theta(theta_index), self.get_rho(rho_index), int(votes[theta_index, rho_index])
+
+    def get_theta(self, theta_index: int) -> float:
+        return float(self._thetas[theta_index])
+
+    def get_rho(self, rho_index: int) -> float:
+        return rho_index * self._rho_resolution - self._rho_max
+
+
+class PointsHoughTransformSegmentsFinder(HoughTransformSegmentsFinder):
+    """
+    Hough transform, voting directly from the points, without their rasterization. After each peak of the accumulator
+    is found, segments are extracted by projecting supporting points on the line, and votes of these points are
+    removed from the accumulator.
+    """
+
+    def __init__(self, threshold=10, line_length=50, line_gap=10, theta_resolution=np.pi / 180, rho_resolution=1.0,
+                 accumulator: HoughAccumulator = None):
+        """
+        Inits finder
+        :param threshold: Minimal votes number of the line
+        :param line_length: Minimal length of the segment (in the cloud units)
+        :param line_gap: Maximal gap between points of one segment (in the cloud units)
+        :param theta_resolution: Size of the accumulator's theta bin in radians
+        :param rho_resolution: Size of the accumulator's rho bin in the cloud units. Points, lying not further than
+        this value from the line, are considered as supporting it
+        :param accumulator: Accumulator to reuse between frames. If it is given, resolutions are taken from it
+        """
+        super().__init__(threshold, line_length, line_gap)
+        if accumulator is None:
+            accumulator = HoughAccumulator(theta_resolution, rho_resolution)
+        self._accumulator = accumulator
+        self._support_distance = accumulator.rho_resolution
+
+    @property
+    def accumulator(self) -> HoughAccumulator:
+        return self._accumulator
+
+    def find_segments_from_points(self, points) -> List[Segment]:
+        return [Segment(Point2D(x1, y1), Point2D(x2, y2))
+                for x1, y1, x2, y2 in self.find_segments_array(points).tolist()]
+
+    def find_segments_array(self, points) -> np.ndarray:
+        """
+        Finds segments in the points
+        :param points: PointCloud, (N, 2) array or list of points
+        :return: (M, 4) array of segments' ends (x1, y1, x2, y2)
+        """
+        np_points = PointCloud.as_array(points)
+        if len(np_points) == 0:
+            return np.empty((0, 4))
+
+        # Points are centred to keep rho range (and accumulator) as small as possible
+        centre = np_points.mean(axis=0)
+        centred_points = np_points - centre
+
+        accumulator = self._accumulator
+        accumulator.reset(np.sqrt((centred_points ** 2).sum(axis=1)).max())
+        accumulator.vote(centred_points)
+
+        active = np.ones(len(centred_points), dtype=bool)
+        segments = []
+
+        while active.any():
+            theta, rho, votes = accumulator.peak()
+            if votes < self._threshold:
+                break
+
+            theta, rho = self._refine_line(centred_points[active], theta, rho)
+            normal = np.array([np.cos(theta), np.sin(theta)])
+            support = active & (np.abs(centred_points.dot(normal) - rho) <= self._support_distance)
+
+            if not support.any():
+                break
+
+            # Line is fitted to the supporting points to get rid of the accumulator's quantization
+            normal, rho = self._fit_line(centred_points[support])
+            support |= active & (np.abs(centred_points.dot(normal) - rho) <= self._support_distance)
+
+            direction = np.array([-normal[1], normal[0]])
+            found_segments = SegmentsInLineFinder.find_segments_array(rho * normal, direction,
+                                                                      centred_points[support], self._line_gap)
+            ends = found_segments.ends
+            lengths = np.hypot(ends[:, 2] - ends[:, 0], ends[:, 3] - ends[:, 1])
+            segments.append(ends[lengths >= self._line_length])
+
+            accumulator.vote(centred_points[support], -1)
+            active &= ~support
+
+        if len(segments) == 0:
+            return np.empty((0, 4))
+
+        return np.vstack(segments) + np.tile(centre, 2)
+
+    def _refine_line(self, points: np.ndarray, theta: float, rho: float) -> (float, float):
+        """
+        Refines accumulator's peak: line is fitted to the points within the accumulator's rho bin of the peak
+        :param points: Points, which are not assigned to any line yet
+        :param theta: Theta of the peak
+        :param rho: Rho of the peak
+        :return: Refined theta and rho
+        """
+        normal = np.array([np.cos(theta), np.sin(theta)])
+        near_points = points[np.abs(points.dot(normal) - rho) <= self._accumulator.rho_resolution]
+        if len(near_points) < 2:
+            return theta, rho
+
+        normal, rho = self._fit_line(near_points)
+        return float(np.arctan2(normal[1], normal[0])), rho
+
+    @staticmethod
+    def _fit_line(points: np.ndarray) -> (np.ndarray, float):
+        """
+        Fits line to the points with total least squares
+        :param points: (N, 2) array of points
+        :return: Unit normal and rho of the line
+        """
+        mean = points.mean(axis=0)
+        centred = points - mean
+        eigenvalues, eigenvectors = np.linalg.eigh(centred.T.dot(centred))
+        normal = eigenvectors[:, 0]
+        return normal, float(mean.dot(normal))
+
+
+class PyramidHoughTransformSegmentsFinder(PointsHoughTransformSegmentsFinder):
+    """
+    Coarse-to-fine points-based Hough transform. Points vote only into the coarse accumulator, and each of its peaks
+    is refined level by level: on each level points near the current line vote into a small local accumulator,
+    covering the neighbourhood of the peak with resolution, increased by the given factor.
+    """
+
+    def __init__(self, threshold=10, line_length=50, line_gap=10, theta_resolution=np.pi / 180, rho_resolution=1.0,
+                 levels=2, factor=4, accumulator: HoughAccumulator = None):
+        """
+        Inits finder
+        :param threshold: Minimal votes number of the line in the coarse accumulator
+        :param line_length: Minimal length of the segment (in the cloud units)
+        :param line_gap: Maximal gap between points of one segment (in the cloud units)
+        :param theta_resolution: Size of the theta bin on the finest level in radians
+        :param rho_resolution: Size of the rho bin on the finest level in the cloud units
+        :param levels: Number of the pyramid levels, including the coarse one
+        :param factor: Ratio of resolutions of the consecutive levels
+        :param accumulator: Coarse accumulator to reuse between frames. Its resolutions must be factor^(levels - 1)
+        times bigger, than the finest ones
+        """
+        if levels < 1 or factor < 1:
+            raise ValueError("Levels number and factor must be positive")
+
+        coarse_scale = factor ** (levels - 1)
+        if accumulator is None:
+            accumulator = HoughAccumulator(theta_resolution * coarse_scale, rho_resolution * coarse_scale)
+
+        super().__init__(threshold, line_length, line_gap, accumulator=accumulator)
+        self._levels = levels
+        self._factor = int(factor)
+        self._support_distance = accumulator.rho_resolution / coarse_scale
+
+    def _refine_line(self, points: np.ndarray, theta: float, rho: float) -> (float, float):
+        factor = self._factor
+        theta_step = self._accumulator.theta_resolution
+        rho_step = self._accumulator.rho_resolution
+        offsets = np.arange(-factor, factor + 1)
+
+        for level in range(1, self._levels):
+            normal = np.array([np.cos(theta), np.sin(theta)])
+            near_points = points[np.abs(points.dot(normal) - rho) <= rho_step]
+            if len(near_points) == 0:
+                break
+
+            # Local accumulator covers one bin of the previous level in each direction
+            thetas = theta + offsets * (theta_step / factor)
+            rho_start = rho - rho_step
+            theta_step /= factor
+            rho_step /= factor
+
+            rhos = near_points.dot(np.vstack((np.cos(thetas), np.sin(thetas))))
+            rho_indices = np.round((rhos - rho_start) / rho_step).astype(np.intp)
+            rho_number = 2 * factor + 1
+            is_valid = (rho_indices >= 0) & (rho_indices < rho_number)
+
+            cells = (rho_indices + np.arange(len(thetas)) * rho_number)[is_valid]
+            votes = np.bincount(cells, minlength=len(thetas) * rho_number)
+            theta_index, rho_index = np.unravel_index(np.argmax(votes), (len(thetas), rho_number))
+
+            theta = float(thetas[theta_index])
+            rho = rho_start + rho_index * rho_step
+
+        return theta, rho
@@ -0,0 +1,292 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+from sympy import Point2D, Segment
+
+from core.base import Area, PointCloud
+from core.finders.base import SegmentsFinder
+from core.finders.segments import SegmentsInLineFinder
+from core.spatial import SpatialIndex
+
+__author__ = 'Xomak'
+
+
+def _find_preferences(points: np.ndarray, pairs: np.ndarray, residual_threshold: float) -> np.ndarray:
+    """
+    Finds preference sets of the points for the line hypotheses. It is module-level function to be run in the worker
+    processes
+    :param points: (N, 2) array of points
+    :param pairs: (M, 2) array of indices of the points, defining hypotheses
+    :param residual_threshold: Maximal distance from the point to the line for the point to prefer it
+    :return: (N, M) boolean matrix, packed along the second axis with numpy.packbits
+    """
+    directions = points[pairs[:, 1]] - points[pairs[:, 0]]
+    lengths = np.hypot(directions[:, 0], directions[:, 1])
+    lengths[lengths == 0] = np.inf
+
+    normals = np.column_stack((-directions[:, 1], directions[:, 0])) / lengths[:, np.newaxis]
+    offsets = (normals * points[pairs[:, 0]]).sum(axis=1)
+
+    # Degenerate hypotheses have zero normal and are preferred by nobody
+    preferences = (np.abs(points.dot(normals.T) - offsets) < residual_threshold) & np.isfinite(lengths)
+    return np.packbits(preferences, axis=1)
+
+
+class JLinkageSegmentsFinder(SegmentsFinder):
+    """
+    Multi-model segments finder, based on J-linkage. Preference sets of the points for the pool of random line
+    hypotheses are computed in parallel worker processes. Then points are clustered agglomeratively by Jaccard
+    distance of their preference sets, and lines are fitted to all clusters at once.
+
+    Clustering keeps the dense (N, N) float32 matrix of distances between all clusters, so it takes about 8 * N^2 bytes
+    at peak (e.g. 800 MB for 10k points). Clouds with more than max_points points are refused: split them by
+    SimpleAreaSplitter first.
+    """
+
+    def __init__(self, residual_threshold, segments_threshold, hypotheses_number=1000, sampling_radius=10,
+                 min_points=5, workers=1, random_state=None, sampling_distance=None, executor: Executor = None,
+                 max_points=5000):
+        """
+        Inits finder
+        :param residual_threshold: Maximal distance from the point to the hypothesis for the point to prefer it
+        :param segments_threshold: Maximal distance between points in one line to be considered as one segment
+        :param hypotheses_number: Number of line hypotheses
+        :param sampling_radius: Second point of the hypothesis is sampled within this index distance from the first one,
+        which is efficient for points, ordered by scan
+        :param min_points: Minimal number of points in the cluster to fit line to it
+        :param workers: Number of chunks of hypotheses, processed in parallel. If it is 1, hypotheses are processed in
+        the current process. Otherwise, they are processed in the executor or, if it is not given, in the new process
+        pool for each call, which pays off only for large clouds. Clustering is not parallel anyway
+        :param random_state: Seed or numpy.random.RandomState
+        :param sampling_distance: If it is set, second point of the hypothesis is sampled among the points within this
+        distance from the first one instead, using spatial index. It suits clouds, which are not ordered by scan
+        :param executor: Long-lived executor (e.g. ProcessPoolExecutor) to reuse between frames
+        :param max_points: Maximal number of points in the cloud, which bounds the memory of clustering
+        """
+        self.residual_threshold = residual_threshold
+        self.segments_threshold = segments_threshold
+        self.hypotheses_number = hypotheses_number
+        self.sampling_radius = sampling_radius
+        self.min_points = min_points
+        self.workers = workers
+        self.random_state = random_state
+        self.sampling_distance = sampling_distance
+        self.executor = executor
+        self.max_points = max_points
+
+    def find(self, area: Area) -> Area:
+        spatial_index = area.spatial_index if self.sampling_distance is not None else None
+        found_segments = self.find_segments_array(area.points, spatial_index)
+        area.add_segments(found_segments.ends, found_segments.points_numbers, found_segments.densities,
+                          type(self).__name__)
+        return area
+
+    def find_segments_in_points(self, points, spatial_index: SpatialIndex = None) -> List[Segment]:
+        """
+        Finds segments in given points
+        :param points: PointCloud, (N, 2) array or list of points
+        :param spatial_index: Index of the points for sampling by distance. It is built, if it is needed and not given
+        :return: List of segments
+        """
+        ends = self.find_segments_array(points, spatial_index).ends
+        return [Segment(Point2D(x1, y1), Point2D(x2, y2)) for x1, y1, x2, y2 in ends.tolist()]
+
+    def find_segments_array(self, points, spatial_index: SpatialIndex = None) -> SegmentsInLineFinder.FoundSegments:
+        """
+        Finds segments in given points
+        :param points: PointCloud, (N, 2) array or list of points
+        :param spatial_index: Index of the points for sampling by distance. It is built, if it is needed and not given
+        :return: Found segments of all lines (see SegmentsInLineFinder.find_segments_array())
+        """
+        np_points = PointCloud.as_array(points)
+        if len(np_points) < 2:
+            return SegmentsInLineFinder.concatenate_found_segments([])
+
+        if len(np_points) > self.max_points:
+            raise ValueError("Cloud of {} points is too large for clustering, maximal number of points is {}"
+                             .format(len(np_points), self.max_points))
+
+        if self.sampling_distance is not None and spatial_index is None:
+            spatial_index = SpatialIndex(np_points)
+
+        preferences = self.find_preferences(np_points, spatial_index)
+        labels = self.cluster(preferences)
+        origins, directions, labels = self.fit_lines(np_points, labels)
+
+        return SegmentsInLineFinder.concatenate_found_segments(
+            SegmentsInLineFinder.find_segments_array(origin, direction, np_points[labels == cluster],
+                                                     self.segments_threshold)
+            for cluster, (origin, direction) in enumerate(zip(origins, directions)))
+
+    def sample_hypotheses(self, points_number: int, spatial_index: SpatialIndex = None) -> np.ndarray:
+        """
+        Samples pairs of points, defining line hypotheses
+        :param points_number: Number of points
+        :param spatial_index: Index of the points. If it is given, pairs are sampled by sampling_distance
+        :return: (M, 2) array of indices of different points
+        """
+        random_state = self.random_state
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+
+        if spatial_index is not None:
+            return self._sample_hypotheses_by_distance(spatial_index, random_state)
+
+        radius = max(1, min(self.sampling_radius, points_number - 1))
+        first = random_state.randint(0, points_number, self.hypotheses_number)
+        shifts = random_state.randint(1, radius + 1, self.hypotheses_number)
+        second = first + shifts
+        second[second >= points_number] = first[second >= points_number] - shifts[second >= points_number]
+        second[second < 0] = (first[second < 0] + 1) % points_number
+        return np.column_stack((first, second))
+
+    def _sample_hypotheses_by_distance(self, spatial_index: SpatialIndex, random_state) -> np.ndarray:
+        """
+        Samples second points among the neighbours of the first ones, found by one bulk query. Points without
+        neighbours are paired with the nearest point
+        """
+        points = spatial_index.points
+        first = random_state.randint(0, len(points), self.hypotheses_number)
+        offsets, indices = spatial_index.query_radius(points[first], self.sampling_distance)
+
+        # The first point is its own neighbour, so it is skipped: neighbourhoods are ordered by index, and choices
+        # from its position onwards are shifted by one
+        counts = np.diff(offsets) - 1
+        has_neighbours = counts > 0
+        choices = (random_state.random_sample(self.hypotheses_number) * np.maximum(counts, 1)).astype(np.intp)
+        positions = offsets[:-1] + choices
+        positions[indices[np.minimum(positions, len(indices) - 1)] >= first] += 1
+
+        second = np.empty_like(first)
+        second[has_neighbours] = indices[positions[has_neighbours]]
+
+        if not np.all(has_neighbours):
+            lonely = first[~has_neighbours]
+            _, nearest = spatial_index.query_knn(points[lonely], 2)
+            second[~has_neighbours] = np.where(nearest[:, 0] != lonely, nearest[:, 0], nearest[:, 1])
+
+        return np.column_stack((first, second))
+
+    def find_preferences(self, points: np.ndarray, spatial_index: SpatialIndex = None) -> np.ndarray:
+        """
+        Finds preference sets of the points, distributing hypotheses among worker processes
+        :param points: (N, 2) array of points
+        :param spatial_index: Index of the points for sampling by distance
+        :return: (N, M) boolean preferences matrix
+        """
+        pairs = self.sample_hypotheses(len(points), spatial_index)
+        chunks = [chunk for chunk in np.array_split(pairs, self.workers) if len(chunk) > 0]
+
+        thresholds = [self.residual_threshold] * len(chunks)
+        if len(chunks) == 1:
+            packed_chunks = [_find_preferences(points, chunks[0], self.residual_threshold)]
+        elif self.executor is not None:
+            packed_chunks = list(self.executor.map(_find_preferences, [points] * len(chunks), chunks, thresholds))
+        else:
+            with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+                packed_chunks = list(executor.map(_find_preferences, [points] * len(chunks), chunks, thresholds))
+
+        return np.hstack([np.unpackbits(packed, axis=1)[:, :len(chunk)].astype(bool)
+                          for packed, chunk in zip(packed_chunks, chunks)])
+
+    @staticmethod
+    def cluster(preferences: np.ndarray) -> np.ndarray:
+        """
+        Clusters points with J-linkage: clusters with the smallest Jaccard distance of preference sets are merged
+        (preference set of the cluster is intersection of the members' ones), until all distances are equal to 1.
+        It keeps the dense (N, N) distances matrix, see the class description
+        :param preferences: (N, M) boolean preferences matrix
+        :return: Cluster label of each point
+        """
+        points_number = len(preferences)
+        cluster_preferences = preferences.copy()
+        labels = np.arange(points_number)
+
+        weights = cluster_preferences.astype(np.float32)
+        sizes = weights.sum(axis=1)
+        intersections = weights.dot(weights.T)
+        distances = JLinkageSegmentsFinder._jaccard_distances(intersections, sizes[:, np.newaxis], sizes)
+        np.fill_diagonal(distances, np.inf)
+
+        nearest = np.argmin(distances, axis=1)
+        nearest_distances = distances[np.arange(points_number), nearest]
+
+        while points_number > 1:
+            first = int(np.argmin(nearest_distances))
+            if nearest_distances[first] >= 1:
+                break
+            second = int(nearest[first])
+
+            cluster_preferences[first] &= cluster_preferences[second]
+            labels[labels == second] = first
+
+            distances[second, :] = np.inf
+            distances[:, second] = np.inf
+            nearest_distances[second] = np.inf
+
+            first_weights = cluster_preferences[first].astype(np.float32)
+            sizes[first] = first_weights.sum()
+            first_distances = JLinkageSegmentsFinder._jaccard_distances(weights.dot(first_weights), sizes,
+                                                                        sizes[first])
+            first_distances[first] = np.inf
+            first_distances[np.isinf(distances[:, first])] = np.inf
+            weights[first] = first_weights
+
+            distances[first, :] = first_distances
+            distances[:, first] = first_distances
+
+            nearest[first] = np.argmin(first_distances)
+            nearest_distances[first] = first_distances[nearest[first]]
+
+            # Rows, which nearest cluster was changed, are updated
+            outdated = np.flatnonzero((nearest == first) | (nearest == second))
+            outdated = outdated[np.isfinite(nearest_distances[outdated]) & (outdated != first)]
+            nearest[outdated] = np.argmin(distances[outdated], axis=1)
+            nearest_distances[outdated] = distances[outdated, nearest[outdated]]
+
+            improved = first_distances < nearest_distances
+            nearest[improved] = first
+            nearest_distances[improved] = first_distances[improved]
+
+        return labels
+
+    @staticmethod
+    def _jaccard_distances(intersections, first_sizes, second_sizes) -> np.ndarray:
+        unions = first_sizes + second_sizes - intersections
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances = 1 - intersections / unions
+        distances[unions == 0] = 1
+        return distances
+
+    def fit_lines(self, points: np.ndarray, labels: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Fits lines to all clusters at once with total least squares
+        :param points: (N, 2) array of points
+        :param labels: Cluster label of each point
+        :return: (K, 2) arrays of origins and directions of the lines and new labels of the points:
+        index of the line or -1 for the points of too small clusters
+        """
+        unique_labels, labels = np.unique(labels, return_inverse=True)
+        counts = np.bincount(labels)
+        is_valid = counts >= max(self.min_points, 2)
+
+        new_labels = np.full(len(unique_labels), -1, dtype=np.intp)
+        new_labels[is_valid] = np.arange(is_valid.sum())
+        labels = new_labels[labels]
+
+        valid_points = points[labels >= 0]
+        valid_labels = labels[labels >= 0]
+        counts = counts[is_valid]
+
+        means = np.column_stack((np.bincount(valid_labels, valid_points[:, 0]),
+                                 np.bincount(valid_labels, valid_points[:, 1]))) / counts[:, np.newaxis]
+        centred = valid_points - means[valid_labels]
+        sxx = np.bincount(valid_labels, centred[:, 0] ** 2)
+        syy = np.bincount(valid_labels, centred[:, 1] ** 2)
+        sxy = np.bincount(valid_labels, centred[:, 0] * centred[:, 1])
+
+        angles = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+        directions = np.column_stack((np.cos(angles), np.sin(angles)))
+
+        return means, directions, labels
@@ -3,19 +3,167 @@ import sys
 from typing import List
 
 import numpy as np
-from sympy import Point2D, Line2D, Segment
 
-from core.base import Area
+from core.base import Area, PointCloud
 from core.finders.base import SegmentsFinder
 from core.finders.segments import SegmentsInLineFinder
 
+# Resolution of the coordinates in XY logs. It bounds the residual deviation of the orthogonal model from below, so
+# that exactly collinear windows still have positive definite covariance
+DEFAULT_NOISE_SIGMA = 1e-3
+
+
+class LinearRegressionStatistics:
+    """
+    Sufficient statistics of the points: prefix sums of x, y, x^2, xy and y^2. Sums of any range of points are found
+    as differences of two prefix sums, so the range can be fitted and ranges can be merged in O(1). Points are centred
+    by their mean to keep sums well-conditioned.
+    """
+
+    _ROUNDING_ERROR_FACTOR = 8
+
+    def __init__(self, points):
+        """
+        Inits statistics
+        :param points: PointCloud, (N, 2) array or list of points
+        """
+        self._points = PointCloud.as_array(points)
+        self._mean = self._points.mean(axis=0) if len(self._points) > 0 else np.zeros(2)
+
+        centred = self._points - self._mean
+        x_values = centred[:, 0]
+        y_values = centred[:, 1]
+
+        self._prefix_sums = np.zeros((len(self._points) + 1, 5))
+        np.cumsum(np.column_stack((x_values, y_values, x_values * x_values, x_values * y_values,
+                                   y_values * y_values)), axis=0, out=self._prefix_sums[1:])
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._points
+
+    def __len__(self):
+        return len(self._points)
+
+    def _find_scatterings(self, starts, stops):
+        starts = np.asarray(starts, dtype=np.intp)
+        stops = np.asarray(stops, dtype=np.intp)
+        counts = (stops - starts).astype(np.float64)
+
+        sx, sy, sxx, sxy, syy = (self._prefix_sums[stops] - self._prefix_sums[starts]).T
+
+        scattering_xx = sxx - sx * sx / counts
+        scattering_xy = sxy - sx * sy / counts
+        scattering_yy = syy - sy * sy / counts
+
+        # Differences of prefix sums carry rounding errors, proportional to the prefix sums themselves. Scatterings
+        # within this error are zeroed, so that axis-aligned and collinear ranges stay exactly singular, as with np.cov
+        magnitudes = (self._prefix_sums[stops] + self._prefix_sums[starts])[:, [2, 4]].sum(axis=1)
+        tolerances = self._ROUNDING_ERROR_FACTOR * np.finfo(np.float64).eps * magnitudes
+        scattering_xx[np.abs(scattering_xx) <= tolerances] = 0
+        scattering_xy[np.abs(scattering_xy) <= tolerances] = 0
+        scattering_yy[np.abs(scattering_yy) <= tolerances] = 0
+
+        means = np.column_stack((sx, sy)) / counts[:, np.newaxis] + self._mean
+        return counts, means, scattering_xx, scattering_xy, scattering_yy
+
+    def fit(self, starts, stops) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Fits lines to the ranges points[starts[i]:stops[i]] at once. Ranges with (almost) constant x are fitted with
+        numpy.polyfit
+        :param starts: Starts of the ranges
+        :param stops: Stops of the ranges, each range must contain at least two points
+        :return: Slopes, offsets and (M, 2, 2) covariance matrices of the points' coordinates
+        """
+        counts, means, scattering_xx, scattering_xy, scattering_yy = self._find_scatterings(starts, stops)
+
+        is_degenerate = scattering_xx == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = scattering_xy / scattering_xx
+        offsets = means[:, 1] - slopes * means[:, 0]
+
+        for i in np.flatnonzero(is_degenerate).tolist():
+            range_points = self._points[starts[i]:stops[i]]
+            slopes[i], offsets[i] = np.polyfit(range_points[:, 0], range_points[:, 1], 1)
+
+        covariances = np.empty((len(counts), 2, 2))
+        covariances[:, 0, 0] = scattering_xx
+        covariances[:, 0, 1] = scattering_xy
+        covariances[:, 1, 0] = scattering_xy
+        covariances[:, 1, 1] = scattering_yy
+        covariances /= (counts - 1)[:, np.newaxis, np.newaxis]
+
+        return slopes, offsets, covariances
+
+    def fit_orthogonal(self, starts, stops, noise_sigma=DEFAULT_NOISE_SIGMA) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Fits lines x cos(angle) + y sin(angle) = distance to the ranges at once with total least squares, which is
+        well-conditioned for any line direction. Covariance of the parameters is found from the residual variance
+        sigma^2 and scattering S along the line: var(angle) = sigma^2 / S, var(distance) = sigma^2 / n +
+        t^2 var(angle), cov = t var(angle), where t is coordinate of the mean along the line
+        :param starts: Starts of the ranges
+        :param stops: Stops of the ranges, each range must contain at least two points
+        :param noise_sigma: Lower bound of the residual standard deviation, so that exact fits are not overconfident
+        :return: Angles in [0, pi), distances and (M, 2, 2) covariance matrices of the parameters
+        """
+        counts, means, scattering_xx, scattering_xy, scattering_yy = self._find_scatterings(starts, stops)
+
+        half_sums = (scattering_xx + scattering_yy) / 2
+        radii = np.hypot((scattering_xx - scattering_yy) / 2, scattering_xy)
+        along_scatterings = half_sums + radii
+        across_scatterings = np.maximum(half_sums - radii, 0)
+
+        angles = np.mod(0.5 * np.arctan2(2 * scattering_xy, scattering_xx - scattering_yy) + np.pi / 2, np.pi)
+        cosines = np.cos(angles)
+        sines = np.sin(angles)
+        distances = means[:, 0] * cosines + means[:, 1] * sines
+        along_coordinates = -means[:, 0] * sines + means[:, 1] * cosines
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            residual_variances = np.where(counts > 2, across_scatterings / (counts - 2), 0)
+            residual_variances = np.maximum(residual_variances, noise_sigma ** 2)
+            angle_variances = residual_variances / along_scatterings
+
+        covariances = np.empty((len(counts), 2, 2))
+        covariances[:, 0, 0] = angle_variances
+        covariances[:, 0, 1] = along_coordinates * angle_variances
+        covariances[:, 1, 0] = covariances[:, 0, 1]
+        covariances[:, 1, 1] = residual_variances / counts + along_coordinates ** 2 * angle_variances
+
+        return angles, distances, covariances
+
 
 class LinearRegressionEntity:
 
-    def __init__(self, points=None, slope=None, offset=None, covariance=None):
-        if points is not None:
-            x_values = np.array(list(map(lambda p: p.x, points)), dtype=float)
-            y_values = np.array(list(map(lambda p: p.y, points)), dtype=float)
+    def __init__(self, points=None, slope=None, offset=None, covariance=None, statistics=None, start=0, stop=None):
+        """
+        Inits entity: fits line to the points or to the range of the statistics, or takes given parameters.
+        If parameters are given together with points or range, they are assumed to be precomputed for them
+        :param points: Points list or (N, 2) array
+        :param slope: Slope of the line
+        :param offset: Offset of the line
+        :param covariance: Covariance matrix of the points' coordinates
+        :param statistics: LinearRegressionStatistics, which points of the entity are range of
+        :param start: Start of the range
+        :param stop: Stop of the range
+        """
+        self._statistics = statistics
+        self._start = start
+        self._stop = stop
+
+        if statistics is not None:
+            if slope is None:
+                slopes, offsets, covariances = statistics.fit([start], [stop])
+                slope, offset, covariance = float(slopes[0]), float(offsets[0]), covariances[0]
+
+            self._slope = slope
+            self._offset = offset
+            self._covariance = covariance
+            self._points = None
+        elif points is not None and slope is None:
+            np_points = PointCloud.as_array(points)
+            x_values = np_points[:, 0]
+            y_values = np_points[:, 1]
 
             line_params = np.polyfit(x_values, y_values, 1)
             cov = np.cov(x_values, y_values)
@@ -28,6 +176,7 @@ class LinearRegressionEntity:
             self._slope = slope
             self._offset = offset
             self._covariance = covariance
+            self._points = points
 
     @property
     def slope(self) -> float:
@@ -42,9 +191,26 @@ class LinearRegressionEntity:
         return self._covariance
 
     @property
-    def points(self) -> List[Point2D]:
+    def points(self):
+        """
+        Points of the entity: list or array, it was created with, or view into the points of the statistics
+        """
+        if self._statistics is not None:
+            return self._statistics.points[self._start:self._stop]
         return self._points
 
+    @property
+    def statistics(self) -> LinearRegressionStatistics:
+        return self._statistics
+
+    @property
+    def start(self) -> int:
+        return self._start
+
+    @property
+    def stop(self) -> int:
+        return self._stop
+
     @staticmethod
     def euqlid_distance_sqr(entity1: 'LinearRegressionEntity', entity2: 'LinearRegressionEntity') -> float:
         points1 = np.array([entity1.slope, entity1.offset])
@@ -53,56 +219,284 @@ class LinearRegressionEntity:
 
         return points_diff.dot(points_diff.T)
 
+    @property
+    def parameters(self) -> np.ndarray:
+        return np.array([self.slope, self.offset])
+
+    @property
+    def line(self) -> (np.ndarray, np.ndarray):
+        """
+        :return: Origin and direction vector of the line
+        """
+        return np.array([0.0, self.offset]), np.array([1.0, self.slope])
+
+    def extend(self, stop: int) -> 'LinearRegressionEntity':
+        """
+        Creates entity for the longer range of the same statistics
+        :param stop: New stop of the range
+        :return: New entity
+        """
+        return LinearRegressionEntity(statistics=self._statistics, start=self._start, stop=stop)
+
     @staticmethod
-    def mahalanobis_distance_sqr(entity1: 'LinearRegressionEntity', entity2: 'LinearRegressionEntity') -> float:
-        points1 = np.array([entity1.slope, entity1.offset])
-        points2 = np.array([entity2.slope, entity2.offset])
-        points_diff = points2 - points1
-        covariance = entity1.covariance + entity2.covariance
+    def from_ranges(statistics: LinearRegressionStatistics, starts, stops,
+                    noise_sigma=DEFAULT_NOISE_SIGMA) -> List['LinearRegressionEntity']:
+        """
+        Fits entities to many ranges of the statistics at once
+        :param statistics: Statistics of the points
+        :param starts: Starts of the ranges
+        :param stops: Stops of the ranges
+        :param noise_sigma: Not used by this model
+        :return: List of entities
+        """
+        slopes, offsets, covariances = statistics.fit(starts, stops)
+        return [LinearRegressionEntity(slope=slope, offset=offset, covariance=covariance, statistics=statistics,
+                                       start=start, stop=stop)
+                for slope, offset, covariance, start, stop in zip(slopes.tolist(), offsets.tolist(), covariances,
+                                                                  np.asarray(starts).tolist(),
+                                                                  np.asarray(stops).tolist())]
 
-        if not is_singular_covariance(covariance):
-            return (points_diff.dot(np.linalg.inv(covariance))).dot(points_diff.T)
-        else:
-            return (points_diff.dot(np.linalg.pinv(covariance))).dot(points_diff.T)
+    @staticmethod
+    def align_parameters(parameters: np.ndarray, reference_parameters: np.ndarray) -> np.ndarray:
+        """
+        Brings parameters to the form, comparable with the reference ones. Slope model is unique, so it is identity
+        """
+        return parameters
+
+    @staticmethod
+    def mahalanobis_distance_sqr(entity1: 'LinearRegressionEntity', entity2: 'LinearRegressionEntity') -> float:
+        distances = mahalanobis_distances_sqr(entity1.parameters[np.newaxis], entity2.parameters[np.newaxis],
+                                              (entity1.covariance + entity2.covariance)[np.newaxis])
+        return float(distances[0])
 
     @staticmethod
     def weighted_mean_entity(entities: List['LinearRegressionEntity']) -> 'LinearRegressionEntity':
         if len(entities) == 0:
             raise ValueError("Entities list must not be empty")
 
-        inv_weighted_cov = None
-        weighted_point = None
+        parameters = np.array([[entity.slope, entity.offset] for entity in entities])
+        covariances = np.array([entity.covariance for entity in entities])
+        weighted_parameters, weighted_covariances = weighted_means(parameters[:, np.newaxis],
+                                                                   covariances[:, np.newaxis])
+
+        return LinearRegressionEntity(slope=weighted_parameters[0, 0], offset=weighted_parameters[0, 1],
+                                      covariance=weighted_covariances[0])
+
+
+class OrthogonalRegressionEntity:
+    """
+    Line x cos(angle) + y sin(angle) = distance, fitted with total least squares. Unlike slope and offset, these
+    parameters and their covariance stay well-conditioned for near-vertical lines. Since (angle, distance) and
+    (angle + pi, -distance) are the same line, parameters are aligned before comparison.
+    """
+
+    def __init__(self, points=None, angle=None, distance=None, covariance=None, statistics=None, start=0, stop=None,
+                 noise_sigma=DEFAULT_NOISE_SIGMA):
+        """
+        Inits entity: fits line to the points or to the range of the statistics, or takes given parameters
+        :param points: Points list or (N, 2) array
+        :param angle: Angle of the line's normal
+        :param distance: Signed distance from the origin to the line
+        :param covariance: Covariance matrix of the parameters
+        :param statistics: LinearRegressionStatistics, which points of the entity are range of
+        :param start: Start of the range
+        :param stop: Stop of the range
+        :param noise_sigma: Lower bound of the residual standard deviation
+        """
+        if statistics is None and points is not None:
+            statistics = LinearRegressionStatistics(points)
+            start = 0
+            stop = len(statistics)
+
+        if statistics is not None and angle is None:
+            angles, distances, covariances = statistics.fit_orthogonal([start], [stop], noise_sigma)
+            angle, distance, covariance = float(angles[0]), float(distances[0]), covariances[0]
+
+        self._angle = angle
+        self._distance = distance
+        self._covariance = covariance
+        self._statistics = statistics
+        self._start = start
+        self._stop = stop
+        self._noise_sigma = noise_sigma
 
-        for entity in entities:
-            if not is_singular_covariance(entity.covariance):
-                inv_cov = np.linalg.inv(entity.covariance)
-            else:
-                inv_cov = np.linalg.pinv(entity.covariance)
+    @property
+    def angle(self) -> float:
+        return self._angle
 
-            if weighted_point is None:
-                weighted_point = inv_cov.dot(np.array([entity.slope, entity.offset]).T)
-            else:
-                weighted_point = weighted_point + inv_cov.dot(np.array([entity.slope, entity.offset]).T)
+    @property
+    def distance(self) -> float:
+        return self._distance
 
-            if inv_weighted_cov is None:
-                inv_weighted_cov = inv_cov
-            else:
-                inv_weighted_cov = inv_weighted_cov + inv_cov
+    @property
+    def covariance(self) -> np.ndarray:
+        return self._covariance
 
-        if not is_singular_covariance(inv_weighted_cov):
-            weighted_cov = np.linalg.inv(inv_weighted_cov)
-        else:
-            weighted_cov = np.linalg.pinv(inv_weighted_cov)
+    @property
+    def parameters(self) -> np.ndarray:
+        return np.array([self.angle, self.distance])
+
+    @property
+    def points(self) -> np.ndarray:
+        if self._statistics is None:
+            return None
+        return self._statistics.points[self._start:self._stop]
+
+    @property
+    def statistics(self) -> LinearRegressionStatistics:
+        return self._statistics
+
+    @property
+    def start(self) -> int:
+        return self._start
+
+    @property
+    def stop(self) -> int:
+        return self._stop
+
+    @property
+    def line(self) -> (np.ndarray, np.ndarray):
+        """
+        :return: Origin and direction vector of the line
+        """
+        normal = np.array([math.cos(self.angle), math.sin(self.angle)])
+        return normal * self.distance, np.array([-normal[1], normal[0]])
 
-        weighted_point = weighted_cov.dot(weighted_point.T)
+    def extend(self, stop: int) -> 'OrthogonalRegressionEntity':
+        return OrthogonalRegressionEntity(statistics=self._statistics, start=self._start, stop=stop,
+                                          noise_sigma=self._noise_sigma)
 
-        return LinearRegressionEntity(slope=weighted_point[0], offset=weighted_point[1], covariance=weighted_cov)
+    @staticmethod
+    def from_ranges(statistics: LinearRegressionStatistics, starts, stops,
+                    noise_sigma=DEFAULT_NOISE_SIGMA) -> List['OrthogonalRegressionEntity']:
+        angles, distances, covariances = statistics.fit_orthogonal(starts, stops, noise_sigma)
+        return [OrthogonalRegressionEntity(angle=angle, distance=distance, covariance=covariance,
+                                           statistics=statistics, start=start, stop=stop, noise_sigma=noise_sigma)
+                for angle, distance, covariance, start, stop in zip(angles.tolist(), distances.tolist(), covariances,
+                                                                    np.asarray(starts).tolist(),
+                                                                    np.asarray(stops).tolist())]
+
+    @staticmethod
+    def align_parameters(parameters: np.ndarray, reference_parameters: np.ndarray) -> np.ndarray:
+        """
+        Turns lines' normals by multiples of pi, so that angles differ from the reference ones by at most pi / 2
+        :param parameters: (..., 2) array of angles and distances
+        :param reference_parameters: Array of reference parameters, broadcastable to the parameters
+        :return: Aligned parameters
+        """
+        turns = np.round((parameters[..., 0] - reference_parameters[..., 0]) / np.pi)
+        aligned = np.empty(np.broadcast(parameters, reference_parameters).shape)
+        aligned[..., 0] = parameters[..., 0] - turns * np.pi
+        aligned[..., 1] = np.where(np.mod(turns, 2) == 0, parameters[..., 1], -parameters[..., 1])
+        return aligned
+
+    @staticmethod
+    def mahalanobis_distance_sqr(entity1: 'OrthogonalRegressionEntity', entity2: 'OrthogonalRegressionEntity') -> float:
+        parameters2 = OrthogonalRegressionEntity.align_parameters(entity2.parameters, entity1.parameters)
+        distances = mahalanobis_distances_sqr(entity1.parameters[np.newaxis], parameters2[np.newaxis],
+                                              (entity1.covariance + entity2.covariance)[np.newaxis])
+        return float(distances[0])
+
+    @staticmethod
+    def weighted_mean_entity(entities: List['OrthogonalRegressionEntity']) -> 'OrthogonalRegressionEntity':
+        if len(entities) == 0:
+            raise ValueError("Entities list must not be empty")
+
+        parameters = OrthogonalRegressionEntity.align_parameters(np.array([entity.parameters for entity in entities]),
+                                                                 entities[0].parameters)
+        covariances = np.array([entity.covariance for entity in entities])
+        weighted_parameters, weighted_covariances = weighted_means(parameters[:, np.newaxis],
+                                                                   covariances[:, np.newaxis])
+
+        return OrthogonalRegressionEntity(angle=weighted_parameters[0, 0], distance=weighted_parameters[0, 1],
+                                          covariance=weighted_covariances[0])
+
+
+_SINGULARITY_RCOND = 1e-10
 
 
 def is_singular_covariance(covariance: np.array) -> bool:
     return math.fabs(np.linalg.det(covariance)) < sys.float_info.epsilon
 
 
+def inverse_covariances(covariances: np.ndarray) -> np.ndarray:
+    """
+    Inverts stacked symmetric 2x2 matrices in closed form. Singular and ill-conditioned matrices (with absolute
+    determinant less than machine epsilon or eigenvalues ratio less than _SINGULARITY_RCOND) are pseudo-inverted
+    through closed-form eigendecomposition, where small eigenvalues are truncated. It regularizes sums of (almost)
+    singular covariances of collinear windows, which otherwise depend on rounding errors
+    :param covariances: (N, 2, 2) array of covariance matrices
+    :return: (N, 2, 2) array of (pseudo) inverse matrices
+    """
+    a = covariances[:, 0, 0]
+    b = covariances[:, 0, 1]
+    c = covariances[:, 1, 1]
+    determinants = a * c - b * b
+
+    half_sums = (a + c) / 2
+    radii = np.hypot((a - c) / 2, b)
+    eigenvalues = np.column_stack((half_sums + radii, half_sums - radii))
+    cutoffs = _SINGULARITY_RCOND * np.abs(eigenvalues).max(axis=1, keepdims=True)
+    is_small = np.abs(eigenvalues) <= cutoffs
+
+    inverses = np.empty_like(covariances)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverses[:, 0, 0] = c / determinants
+        inverses[:, 0, 1] = -b / determinants
+        inverses[:, 1, 0] = -b / determinants
+        inverses[:, 1, 1] = a / determinants
+
+    is_singular = (np.abs(determinants) < sys.float_info.epsilon) | is_small.any(axis=1)
+    if not is_singular.any():
+        return inverses
+
+    angles = 0.5 * np.arctan2(2 * b[is_singular], (a - c)[is_singular])
+    cosines = np.cos(angles)
+    sines = np.sin(angles)
+    with np.errstate(divide='ignore'):
+        inverse_eigenvalues = np.where(is_small[is_singular], 0, 1 / eigenvalues[is_singular])
+
+    first, second = inverse_eigenvalues.T
+    inverses[is_singular, 0, 0] = first * cosines * cosines + second * sines * sines
+    inverses[is_singular, 0, 1] = (first - second) * cosines * sines
+    inverses[is_singular, 1, 0] = inverses[is_singular, 0, 1]
+    inverses[is_singular, 1, 1] = first * sines * sines + second * cosines * cosines
+
+    return inverses
+
+
+def mahalanobis_distances_sqr(parameters1: np.ndarray, parameters2: np.ndarray,
+                              covariances: np.ndarray) -> np.ndarray:
+    """
+    Finds squared Mahalanobis distances between stacked parameters
+    :param parameters1: (N, 2) array of parameters
+    :param parameters2: (N, 2) array of parameters
+    :param covariances: (N, 2, 2) array of summary covariances
+    :return: Distances
+    """
+    differences = parameters2 - parameters1
+    return np.einsum('ni,nij,nj->n', differences, inverse_covariances(covariances), differences)
+
+
+def weighted_means(parameters: np.ndarray, covariances: np.ndarray, mask=None) -> (np.ndarray, np.ndarray):
+    """
+    Finds inverse-covariance weighted means of many groups of parameters at once
+    :param parameters: (K, N, 2) array: k-th parameters of N groups
+    :param covariances: (K, N, 2, 2) array of corresponding covariances
+    :param mask: (K, N) boolean array of valid members of the groups or None, if all members are valid
+    :return: (N, 2) array of weighted parameters and (N, 2, 2) array of their covariances
+    """
+    members_number, groups_number = parameters.shape[:2]
+    inverses = inverse_covariances(covariances.reshape(-1, 2, 2)).reshape(members_number, groups_number, 2, 2)
+    weighted_points = np.einsum('kgij,kgj->kgi', inverses, parameters)
+    if mask is not None:
+        inverses = inverses * mask[:, :, np.newaxis, np.newaxis]
+        weighted_points = weighted_points * mask[:, :, np.newaxis]
+
+    weighted_covariances = inverse_covariances(inverses.sum(axis=0))
+    return np.einsum('gij,gj->gi', weighted_covariances, weighted_points.sum(axis=0)), weighted_covariances
+
+
 class LinearRegressionCoordinator:
 
     def __init__(self, entity: LinearRegressionEntity, start_index: int):
@@ -165,73 +559,84 @@ class LinearRegressionCoordinator:
         if left.start_index + len(left_points) < right.start_index:
             raise ValueError("Intervals must intersect to merge")
 
-        new_points = []
-        new_points.extend(left_points)
-
         cut_position = left.start_index + len(left_points)
-        cut_len = right.start_index + len(right_points) - cut_position
-        if cut_len > 0:
-            new_points.extend(right.entity.points[len(right_points) - cut_len:])
+        cut_len = max(right.start_index + len(right_points) - cut_position, 0)
+
+        # Entities, which are ranges of the same statistics, are merged in O(1) without copying points
+        statistics = left.entity.statistics
+        if statistics is not None and statistics is right.entity.statistics:
+            return LinearRegressionCoordinator(left.entity.extend(left.entity.stop + cut_len), left.start_index)
 
-        new_entity = LinearRegressionEntity(points=new_points)
+        new_points = list(left_points) + list(right_points[len(right_points) - cut_len:])
+        new_entity = type(left.entity)(points=new_points)
         return LinearRegressionCoordinator(new_entity, left.start_index)
 
 
 class LineRegressionSegmentsFinder(SegmentsFinder):
 
-    def __init__(self, window_size: int, merge_threshold: float, segment_eps: float, segmentation_size=3):
+    ENTITY_TYPES = {
+        'slope': LinearRegressionEntity,
+        'orthogonal': OrthogonalRegressionEntity
+    }
+
+    def __init__(self, window_size: int, merge_threshold: float, segment_eps: float, segmentation_size=3,
+                 line_model='slope', noise_sigma=DEFAULT_NOISE_SIGMA):
+        """
+        Inits finder
+        :param window_size: Number of points in the window, odd
+        :param merge_threshold: Maximal Mahalanobis distance between merged entities
+        :param segment_eps: Maximal gap inside one segment
+        :param segmentation_size: Number of windows in the neighbourhood, odd. If it is 0, windows are merged
+        sequentially
+        :param line_model: 'slope' for y = slope * x + offset or 'orthogonal' for (angle, distance) lines, fitted with
+        total least squares, which stay well-conditioned for near-vertical walls
+        :param noise_sigma: Lower bound of the residual standard deviation for the orthogonal model
+        """
         if window_size % 2 != 1:
             raise ValueError("Window size must be odd number")
 
         if segmentation_size > 0 and segmentation_size % 2 != 1:
             raise ValueError("Segmentation size must be odd number")
 
+        if line_model not in self.ENTITY_TYPES:
+            raise ValueError("Unknown line model: {}".format(line_model))
+
         self._window_size = window_size
         self._segmentation_size = segmentation_size
         self._merge_threshold = merge_threshold
         self._segment_eps = segment_eps
+        self._entity_type = self.ENTITY_TYPES[line_model]
+        self._noise_sigma = noise_sigma
 
     def find(self, area: Area):
-        points = list(area.get_objects(Point2D))
+        points = area.points.array
 
         if self._segmentation_size > 0:
             segmentation_coordinators = self._perform_segmentation(points)
         else:
             segmentation_coordinators = self._perform_segmentation_simplified(points)
 
-        for coordinator in segmentation_coordinators:
-            line = Line2D(p1=Point2D(0, coordinator.entity.offset), slope=coordinator.entity.slope)
-            segment_finder = SegmentsInLineFinder()
-            segments = segment_finder.find_segments(line, coordinator.entity.points, self._segment_eps)
-            for segment in segments:
-                area.add_object(Segment, segment)
+        found_segments = SegmentsInLineFinder.concatenate_found_segments(
+            SegmentsInLineFinder.find_segments_array(*coordinator.entity.line, coordinator.entity.points,
+                                                     self._segment_eps)
+            for coordinator in segmentation_coordinators)
+        area.add_segments(found_segments.ends, found_segments.points_numbers, found_segments.densities,
+                          type(self).__name__)
 
         return area
 
-    def _perform_segmentation(self, points: List[Point2D]) -> List[LinearRegressionCoordinator]:
+    def _perform_segmentation(self, points: np.ndarray) -> List[LinearRegressionCoordinator]:
         coordinators = self._build_linear_regression_coordinators(points)
+        distances = self._find_neighbourhood_distances(coordinators)
 
         segmentation_coord = []
         merged_coordinator = None
         for i in range(0, len(coordinators)):
-            lind = i - (self._segmentation_size - 1) // 2
-            if lind < 0:
-                lind = 0
-
-            rind = i + (self._segmentation_size - 1) // 2
-            if rind >= len(coordinators):
-                rind = len(coordinators) - 1
-
-            curr_coordinators = coordinators[lind:rind+1]
-            curr_entities = list(map(lambda c: c.entity, curr_coordinators))
-            weighted_mean_entity = LinearRegressionEntity.weighted_mean_entity(curr_entities)
+            lind = max(i - (self._segmentation_size - 1) // 2, 0)
+            rind = min(i + (self._segmentation_size - 1) // 2, len(coordinators) - 1)
 
-            d = 0.0
-            for entity in curr_entities:
-                d += LinearRegressionEntity.mahalanobis_distance_sqr(entity, weighted_mean_entity)
-
-            if d < self._merge_threshold:
-                for coord in curr_coordinators:
+            if distances[i] < self._merge_threshold:
+                for coord in coordinators[lind:rind+1]:
                     if merged_coordinator is None:
                         merged_coordinator = coord
                     else:
@@ -245,7 +650,38 @@ class LineRegressionSegmentsFinder(SegmentsFinder):
 
         return segmentation_coord
 
-    def _perform_segmentation_simplified(self, points: List[Point2D]) -> List[LinearRegressionCoordinator]:
+    def _find_neighbourhood_distances(self, coordinators: List[LinearRegressionCoordinator]) -> np.ndarray:
+        """
+        Finds, for each coordinator, sum of squared Mahalanobis distances from the entities of its neighbourhood
+        (segmentation_size coordinators, clipped by the ends) to their weighted mean. All neighbourhoods are
+        processed at once: k-th members of all neighbourhoods are gathered by the offset k
+        :param coordinators: Coordinators list
+        :return: Distances
+        """
+        coordinators_number = len(coordinators)
+        if coordinators_number == 0:
+            return np.empty(0)
+
+        parameters = np.array([c.entity.parameters for c in coordinators])
+        covariances = np.array([c.entity.covariance for c in coordinators])
+
+        radius = (self._segmentation_size - 1) // 2
+        indices = np.arange(coordinators_number)
+        neighbours = indices + np.arange(-radius, radius + 1)[:, np.newaxis]
+        mask = (neighbours >= 0) & (neighbours < coordinators_number)
+        neighbours = np.clip(neighbours, 0, coordinators_number - 1)
+
+        neighbours_parameters = self._entity_type.align_parameters(parameters[neighbours], parameters[np.newaxis])
+        weighted_parameters, weighted_covariances = weighted_means(neighbours_parameters, covariances[neighbours],
+                                                                   mask)
+
+        distances = mahalanobis_distances_sqr(neighbours_parameters.reshape(-1, 2),
+                                              np.broadcast_to(weighted_parameters, neighbours.shape + (2,))
+                                              .reshape(-1, 2),
+                                              (covariances[neighbours] + weighted_covariances).reshape(-1, 2, 2))
+        return (distances.reshape(neighbours.shape) * mask).sum(axis=0)
+
+    def _perform_segmentation_simplified(self, points: np.ndarray) -> List[LinearRegressionCoordinator]:
         coordinators = self._build_linear_regression_coordinators(points)
 
         if len(coordinators) == 0:
@@ -256,7 +692,7 @@ class LineRegressionSegmentsFinder(SegmentsFinder):
         for i in range(1, len(coordinators)):
             curr_coord = coordinators[i]
 
-            d = LinearRegressionEntity.mahalanobis_distance_sqr(merged_coordinator.entity, curr_coord.entity)
+            d = self._entity_type.mahalanobis_distance_sqr(merged_coordinator.entity, curr_coord.entity)
 
             if d < self._merge_threshold:
                 merged_coordinator = merged_coordinator.merge(curr_coord)
@@ -269,10 +705,11 @@ class LineRegressionSegmentsFinder(SegmentsFinder):
 
         return segmentation_coord
 
-    def _build_linear_regression_coordinators(self, points: List[Point2D]) -> List[LinearRegressionCoordinator]:
-        coordinators = []
-        for i in range(0, len(points) - self._window_size):
-            fit_points = points[i:i + self._window_size]
-            entity = LinearRegressionEntity(fit_points)
-            coordinators.append(LinearRegressionCoordinator(entity=entity, start_index=i))
-        return coordinators
+    def _build_linear_regression_coordinators(self, points: np.ndarray) -> List[LinearRegressionCoordinator]:
+        statistics = LinearRegressionStatistics(points)
+        windows_number = max(len(statistics) - self._window_size, 0)
+
+        starts = np.arange(windows_number)
+        entities = self._entity_type.from_ranges(statistics, starts, starts + self._window_size, self._noise_sigma)
+
+        return [LinearRegressionCoordinator(entity=entity, start_index=i) for i, entity in enumerate(entities)]
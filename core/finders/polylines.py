@@ -1,43 +1,80 @@
 from typing import List
 
+import numpy as np
 from sympy import Point2D
 
-from core.base import Area, Polyline
+from core.base import Area, Polyline, PointCloud
 from core.finders.base import Finder
 
 __author__ = 'Xomak'
 
 
 class PolylinesFinder(Finder):
-    def __init__(self, epsilon):
+    def __init__(self, epsilon, range_factor=None, sensor_origin=(0, 0)):
+        """
+        Inits finder
+        :param epsilon: Maximal distance between consecutive points of one polyline
+        :param range_factor: If it is set, threshold grows with the range: epsilon + range_factor * r, where r is the
+        smallest distance from the sensor to the two consecutive points. It lets far walls, which are scanned sparsely,
+        not to be broken apart
+        :param sensor_origin: Position of the sensor, which ranges are measured from
+        """
         self._epsilon = epsilon
-
-    def _accept_point(self, point1: Point2D, point2: Point2D):
-        return point1.distance(point2) < self._epsilon
+        self._range_factor = range_factor
+        self._sensor_origin = np.asarray(sensor_origin, dtype=np.float64)
 
     def find(self, area: Area) -> Area:
-        points = area.get_objects(Point2D)
-        polylines = self.find_polylines(points)
-        for line in polylines:
-            area.add_object(Polyline, line)
+        if len(area.points) == 0:
+            raise ValueError("There is no points")
+
+        area.add_polylines(area.points, self.find_polyline_offsets(area.points), type(self).__name__)
         return area
 
+    def find_polyline_offsets(self, points) -> np.ndarray:
+        """
+        Finds breakpoints in the points, ordered by scan, in one pass
+        :param points: PointCloud, (N, 2) array or list of points
+        :return: (P + 1) array of boundaries: points of the i-th polyline are points[offsets[i]:offsets[i + 1]]
+        """
+        np_points = PointCloud.as_array(points)
+        if len(np_points) == 0:
+            return np.zeros(1, dtype=np.intp)
+
+        steps = np.diff(np_points, axis=0)
+        distances = np.hypot(steps[:, 0], steps[:, 1])
+
+        thresholds = self._epsilon
+        if self._range_factor is not None:
+            relative_points = np_points - self._sensor_origin
+            ranges = np.hypot(relative_points[:, 0], relative_points[:, 1])
+            thresholds = self._epsilon + self._range_factor * np.minimum(ranges[:-1], ranges[1:])
+
+        breaks = np.flatnonzero(distances >= thresholds) + 1
+        return np.concatenate(([0], breaks, [len(np_points)])).astype(np.intp)
+
+    def split_polylines(self, points) -> List[np.ndarray]:
+        """
+        Splits points into polylines without copying
+        :param points: PointCloud, (N, 2) array or list of points
+        :return: List of (K, 2) views into the points array
+        """
+        np_points = PointCloud.as_array(points)
+        offsets = self.find_polyline_offsets(np_points)
+        return [np_points[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
     def find_polylines(self, points: List[Point2D]) -> List[Polyline]:
 
         if len(points) == 0:
             raise ValueError("There is no points")
 
-        found_polylines = []
-        current_polyline = Polyline()
-        previous_point = None
+        offsets = self.find_polyline_offsets(points).tolist()
+        points = list(points)
 
-        for current_point in points:
-            if previous_point is not None and not self._accept_point(current_point, previous_point):
-                found_polylines.append(current_polyline)
-                current_polyline = Polyline()
-            current_polyline.add(current_point)
-            previous_point = current_point
-
-        found_polylines.append(current_polyline)
+        found_polylines = []
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            polyline = Polyline()
+            for point in points[start:end]:
+                polyline.add(point)
+            found_polylines.append(polyline)
 
-        return found_polylines
\ No newline at end of file
+        return found_polylines
@@ -1,23 +1,120 @@
+import math
+from collections import namedtuple
 from typing import List
 
 import numpy as np
-from skimage.measure import ransac, LineModelND
-from sympy import Point2D, Segment, Line
+from sympy import Point2D, Segment
 
-from core.base import Area
+from core.base import Area, PointCloud
 from core.finders.base import SegmentsFinder
 from core.finders.segments import SegmentsInLineFinder
 
 __author__ = 'Xomak'
 
 
+class LineRansac:
+    """
+    RANSAC for one line. Hypotheses are generated and scored in batches, and trials number is adapted to the observed
+    inliers ratio, so that the best line is found with the given confidence.
+    """
+
+    FoundLine = namedtuple('FoundLine', ('origin', 'direction', 'inliers'))
+
+    def __init__(self, residual_threshold, max_trials=1000, confidence=0.99, batch_size=64, random_state=None):
+        """
+        Inits RANSAC
+        :param residual_threshold: Maximal distance from the point to the line for the point to be an inlier
+        :param max_trials: Upper bound of the hypotheses number
+        :param confidence: Required probability of sampling at least one hypothesis, consisting of inliers only
+        :param batch_size: Number of hypotheses, scored at once
+        :param random_state: Seed or numpy.random.RandomState
+        """
+        if not 0 < confidence <= 1:
+            raise ValueError("Confidence must be in (0, 1]")
+
+        self.residual_threshold = residual_threshold
+        self.max_trials = max_trials
+        self.confidence = confidence
+        self.batch_size = batch_size
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        self.random_state = random_state
+
+    def required_trials(self, inliers_ratio: float) -> float:
+        """
+        Finds number of trials, required to sample two inliers with the given confidence
+        :param inliers_ratio: Ratio of inliers in the data
+        :return: Trials number
+        """
+        if inliers_ratio <= 0 or self.confidence >= 1:
+            return math.inf
+
+        outlier_pair_probability = 1 - inliers_ratio ** 2
+        if outlier_pair_probability <= 0:
+            return 0
+
+        return math.ceil(math.log(1 - self.confidence) / math.log(outlier_pair_probability))
+
+    def fit(self, points: np.ndarray) -> FoundLine:
+        """
+        Finds line with maximal number of inliers
+        :param points: (N, 2) array of points, N >= 2
+        :return: Line, fitted to the inliers with total least squares, and inliers mask or None,
+        if all hypotheses are degenerate
+        """
+        points_number = len(points)
+        best_score = None
+        best_inliers = None
+
+        trials = 0
+        required_trials = self.max_trials
+        while trials < min(required_trials, self.max_trials):
+            batch_size = min(self.batch_size, self.max_trials - trials)
+            trials += batch_size
+
+            first = self.random_state.randint(0, points_number, batch_size)
+            second = self.random_state.randint(0, points_number - 1, batch_size)
+            second += second >= first
+
+            directions = points[second] - points[first]
+            lengths = np.hypot(directions[:, 0], directions[:, 1])
+            is_valid = lengths > 0
+            if not is_valid.any():
+                continue
+
+            normals = np.column_stack((-directions[is_valid, 1], directions[is_valid, 0])) / lengths[is_valid, None]
+            offsets = (normals * points[first[is_valid]]).sum(axis=1)
+
+            residuals = np.abs(points.dot(normals.T) - offsets)
+            inliers = residuals < self.residual_threshold
+            inliers_numbers = inliers.sum(axis=0)
+            residuals_sums = (residuals * inliers).sum(axis=0)
+
+            # The most inliers win, ties are broken by the lowest residuals sum
+            best_index = np.lexsort((residuals_sums, -inliers_numbers))[0]
+            score = (inliers_numbers[best_index], -residuals_sums[best_index])
+            if best_score is None or score > best_score:
+                best_score = score
+                best_inliers = inliers[:, best_index]
+                required_trials = self.required_trials(best_score[0] / points_number)
+
+        if best_inliers is None or not best_inliers.any():
+            return None
+
+        inliers_points = points[best_inliers]
+        origin = inliers_points.mean(axis=0)
+        centred = inliers_points - origin
+        eigenvalues, eigenvectors = np.linalg.eigh(centred.T.dot(centred))
+        return LineRansac.FoundLine(origin, eigenvectors[:, 1], best_inliers)
+
+
 class RansacSegmentsFinder(SegmentsFinder):
     """
-    RANSAC segments finder. Currently it does not support segments, parallel to Y-axis.
+    RANSAC segments finder. It runs RANSAC sequentially: inliers of each found line are removed from consideration.
     """
 
     def __init__(self, residual_threshold, segments_threshold, max_trials=1000,
-                 density_threshold=None, length_threshold=None):
+                 density_threshold=None, length_threshold=None, confidence=0.99, batch_size=64, random_state=None):
         """
         Inits finder
         :param residual_threshold: Residual threshold for RANSAC
@@ -27,57 +124,67 @@ class RansacSegmentsFinder(SegmentsFinder):
         than this value, process will be stopped)
         :param length_threshold: Threshold for new segments finder (if previous segment's length is less
         than this value, process will be stopped)
+        :param confidence: Confidence for adaptive trials number of one RANSAC (see LineRansac)
+        :param batch_size: Number of hypotheses, scored at once
+        :param random_state: Seed or numpy.random.RandomState
         """
         self.length_threshold = length_threshold
         self.density_threshold = density_threshold
         self.max_trials = max_trials
         self.segments_threshold = segments_threshold
         self.residual_threshold = residual_threshold
+        self.confidence = confidence
+        self.batch_size = batch_size
+        self.random_state = random_state
 
     def find(self, area: Area) -> Area:
-        points = area.get_objects(Point2D)
-        segments = self.find_segments_in_points(points)
-        for segment in segments:
-            area.add_object(Segment, segment)
+        found_segments = self.find_segments_array(area.points)
+        area.add_segments(found_segments.ends, found_segments.points_numbers, found_segments.densities,
+                          type(self).__name__)
         return area
 
-    def find_segments_in_points(self, points: List[Point2D]) -> List[Segment]:
-        np_points = np.ndarray((len(points), 2))
+    def find_segments_in_points(self, points) -> List[Segment]:
+        """
+        Finds segments in given points
+        :param points: PointCloud, (N, 2) array or list of points
+        :return: List of segments
+        """
+        ends = self.find_segments_array(points).ends
+        return [Segment(Point2D(x1, y1), Point2D(x2, y2)) for x1, y1, x2, y2 in ends.tolist()]
+
+    def find_segments_array(self, points) -> SegmentsInLineFinder.FoundSegments:
+        """
+        Finds segments in given points
+        :param points: PointCloud, (N, 2) array or list of points
+        :return: Found segments of all lines (see SegmentsInLineFinder.find_segments_array())
+        """
+        line_ransac = LineRansac(self.residual_threshold, self.max_trials, self.confidence, self.batch_size,
+                                 self.random_state)
 
-        segments = []
+        # Remained points are kept at the beginning of this buffer
+        np_points = np.array(PointCloud.as_array(points))
+        points_number = len(np_points)
 
-        for idx, point in enumerate(points):
-            np_points[idx, 0] = point.x
-            np_points[idx, 1] = point.y
+        found_segments_list = []
 
         is_density_valid = True
         is_length_valid = True
 
-        while len(np_points) > 2 \
+        while points_number > 2 \
                 and (self.density_threshold is None or is_density_valid) \
                 and (self.length_threshold is None or is_length_valid):
 
-            model_robust, inliers_mask = ransac(np_points, LineModelND, min_samples=2,
-                                                residual_threshold=self.residual_threshold, max_trials=self.max_trials)
-
-            inliers = np_points[inliers_mask]
-
-            line_params = model_robust.params
-
-            origin = Point2D(line_params[0][0], line_params[0][1])
-            direction = Point2D(line_params[1][0], line_params[1][1])
-
-            line = Line(origin, origin + direction)
-            points = [Point2D(point[0], point[1]) for point in inliers]
-            found_segments = SegmentsInLineFinder.find_segments_with_density(line, points, 150)
-            current_segments = []
-            densities = []
-            lengths = []
+            remained_points = np_points[:points_number]
+            found_line = line_ransac.fit(remained_points)
+            if found_line is None:
+                break
 
-            for found_segment in found_segments:
-                current_segments.append(found_segment.segment)
-                densities.append(found_segment.density)
-                lengths.append(found_segment.segment.length)
+            inliers = remained_points[found_line.inliers]
+            found_segments = SegmentsInLineFinder.find_segments_array(found_line.origin, found_line.direction,
+                                                                      inliers, self.segments_threshold)
+            ends = found_segments.ends
+            densities = found_segments.densities
+            lengths = np.hypot(ends[:, 2] - ends[:, 0], ends[:, 3] - ends[:, 1])
 
             if len(densities) > 0:
                 avg_density = np.mean(densities)
@@ -90,8 +197,11 @@ class RansacSegmentsFinder(SegmentsFinder):
                 is_density_valid = False
                 is_length_valid = False
 
-            segments += current_segments
+            found_segments_list.append(found_segments)
 
-            np_points = np_points[~inliers_mask]
+            outliers = ~found_line.inliers
+            remained_number = int(outliers.sum())
+            np_points[:remained_number] = remained_points[outliers]
+            points_number = remained_number
 
-        return segments
\ No newline at end of file
+        return SegmentsInLineFinder.concatenate_found_segments(found_segments_list)
@@ -1,82 +1,134 @@
-from typing import List
+import numpy as np
 
-from rdp import rdp
-from sympy import Segment, Point2D
-
-from core.base import Area, Polyline
-from core.finders.base import SegmentsFinder
+from core.base import PointCloud
+from core.finders.base import SimplifyingSegmentsFinder
 
 __author__ = 'Xomak'
 
 
-class RDPSegmentsFinder(SegmentsFinder):
+class RDPSegmentsFinder(SimplifyingSegmentsFinder):
     def __init__(self, epsilon):
         self._epsilon = epsilon
 
-    def find(self, area: Area) -> Area:
-        polylines = area.get_objects(Polyline)
-        segments = self.find_segments_in_polylines(polylines)
-        for segment in segments:
-            area.add_object(Segment, segment)
-        return area
+    def _find_masks(self, points: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        return self.find_masks(points, offsets, self._epsilon)
 
     @staticmethod
-    def _dist_function(point, start, end):
+    def segment_distances(points: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
         """
-        This is simple method to find the euclidean distance. It was implemented here, since rdp's internal one
-        does not work correctly on zero distances
-        :param point: Point, which distance is measured to
+        Finds euclidean distances from the points to the segment. If segment has zero length, distances to its start
+        are returned
+        :param points: (N, 2) array of points
         :param start: Start point of the segment
         :param end: End point of the segment
-        :return: Euclidean distance
-        """
-        start_point = Point2D(start[0], start[1])
-        end_point = Point2D(end[0], end[1])
-        point_point = Point2D(point[0], point[1])
-        return Segment(start_point, end_point).distance(point_point)
-
-    def reduce_polylines(self, polylines: List[Polyline]) -> List[Polyline]:
-        """
-        Reduces polylines in list, using RDP algorithm
-        :param polylines: Polylines list
-        :return: List of reduced polylines
+        :return: Distances
         """
+        start = np.asarray(start, dtype=np.float64)
+        direction = end - start
+        squared_length = direction.dot(direction)
+        offsets = points - start
 
-        reduced_polylines = []
-        for polyline in polylines:
-            if len(polyline.points) > 1:
-                reduced_polylines.append(self.find_polyline_in_points(polyline.points))
+        if squared_length == 0:
+            return np.hypot(offsets[:, 0], offsets[:, 1])
 
-        return reduced_polylines
+        parameters = np.clip(offsets.dot(direction) / squared_length, 0, 1)
+        offsets -= parameters[:, np.newaxis] * direction
+        return np.hypot(offsets[:, 0], offsets[:, 1])
 
-    def find_segments_in_polylines(self, polylines: List[Polyline]) -> List[Segment]:
+    @staticmethod
+    def find_mask(points, epsilon: float) -> np.ndarray:
         """
-        Finds segments in given polylines (with their reducing using RDP)
-        :param polylines: Polylines to extract segments
-        :return: List of segments
+        Finds main points of the polyline, using iterative Ramer-Douglas-Peucker algorithm: ranges are taken from the
+        stack, and distances of all inner points of the range are computed at once. The farthest point is the first
+        one with maximal distance
+        :param points: PointCloud, (N, 2) array or list of points
+        :param epsilon: Maximal distance from the point to the simplified polyline
+        :return: Boolean mask of main points
         """
-        segments = []
-
-        reduced_polylines = self.reduce_polylines(polylines)
-        for polyline in reduced_polylines:
-            segments += polyline.get_segments()
-
-        return segments
+        np_points = PointCloud.as_array(points)
+        mask = np.ones(len(np_points), dtype=bool)
+        if len(np_points) < 3:
+            return mask
+
+        stack = [(0, len(np_points) - 1)]
+        while stack:
+            start, end = stack.pop()
+            if end - start < 2:
+                continue
+
+            distances = RDPSegmentsFinder.segment_distances(np_points[start + 1:end], np_points[start], np_points[end])
+            farthest = int(np.argmax(distances))
+            if distances[farthest] > epsilon:
+                farthest += start + 1
+                stack.append((start, farthest))
+                stack.append((farthest, end))
+            else:
+                mask[start + 1:end] = False
+
+        return mask
 
-    def find_polyline_in_points(self, points: List[Point2D]) -> Polyline:
+    @staticmethod
+    def segments_distances(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
         """
-        Finds polyline in given points list, using The Ramer-Douglas-Peucker algorithm
-        :param points: List of points
-        :return: Polyline
+        Row-wise version of segment_distances(): finds distance from each point to its own segment
+        :param points: (N, 2) array of points
+        :param starts: (N, 2) array of segments' starts
+        :param ends: (N, 2) array of segments' ends
+        :return: Distances
         """
-        points_lists = [[point.x, point.y] for point in points]
-        mask = rdp(points_lists, return_mask=True, epsilon=self._epsilon, dist=self._dist_function)
-
-        main_points = [point for point, is_main in zip(points, mask) if is_main]
-
-        polyline = Polyline()
+        directions = ends - starts
+        squared_lengths = (directions * directions).sum(axis=1)
+        offsets = points - starts
 
-        for point in main_points:
-            polyline.add(point)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            parameters = np.clip((offsets * directions).sum(axis=1) / squared_lengths, 0, 1)
+        parameters[squared_lengths == 0] = 0
+        offsets -= parameters[:, np.newaxis] * directions
+        return np.hypot(offsets[:, 0], offsets[:, 1])
 
-        return polyline
\ No newline at end of file
+    @staticmethod
+    def find_masks(points, offsets: np.ndarray, epsilon: float) -> np.ndarray:
+        """
+        Batch version of find_mask(), which simplifies many polylines at once. Instead of the stack, all ranges of all
+        polylines, which are not processed yet, are kept in the frontier, and each round splits all of them together
+        :param points: PointCloud or (N, 2) array of concatenated points of the polylines
+        :param offsets: (P + 1) array of boundaries: points of the i-th polyline are points[offsets[i]:offsets[i + 1]]
+        :param epsilon: Maximal distance from the point to the simplified polyline
+        :return: Boolean mask of main points
+        """
+        np_points = PointCloud.as_array(points)
+        offsets = np.asarray(offsets, dtype=np.intp)
+        mask = np.ones(len(np_points), dtype=bool)
+
+        is_nonempty = offsets[1:] > offsets[:-1]
+        starts = offsets[:-1][is_nonempty]
+        ends = offsets[1:][is_nonempty] - 1
+
+        while True:
+            is_open = ends - starts > 1
+            starts = starts[is_open]
+            ends = ends[is_open]
+            if len(starts) == 0:
+                break
+
+            # Inner points of all ranges are concatenated, each range is a group of consecutive items
+            inner_numbers = ends - starts - 1
+            group_starts = np.concatenate(([0], np.cumsum(inner_numbers)[:-1]))
+            ranges = np.repeat(np.arange(len(starts)), inner_numbers)
+            inner = np.arange(len(ranges)) - group_starts[ranges] + starts[ranges] + 1
+
+            distances = RDPSegmentsFinder.segments_distances(np_points[inner], np_points[starts[ranges]],
+                                                             np_points[ends[ranges]])
+            max_distances = np.maximum.reduceat(distances, group_starts)
+
+            # The first point with maximal distance is the farthest one
+            candidates = np.where(distances == max_distances[ranges], inner, len(np_points))
+            farthest = np.minimum.reduceat(candidates, group_starts)
+
+            is_split = max_distances > epsilon
+            mask[inner[~is_split[ranges]]] = False
+
+            starts, ends = (np.concatenate((starts[is_split], farthest[is_split])),
+                            np.concatenate((farthest[is_split], ends[is_split])))
+
+        return mask
@@ -1,9 +1,10 @@
 from collections import namedtuple
 from typing import Iterable, List
 
-from sympy import Line, Ray, Point2D, Segment
+import numpy as np
+from sympy import Line, Point2D, Segment
 
-from core.base import Area
+from core.base import Area, PointCloud
 from core.finders.base import Finder
 
 __author__ = 'Xomak'
@@ -12,10 +13,101 @@ __author__ = 'Xomak'
 class SegmentsInLineFinder(Finder):
     ProjectedPoint = namedtuple('ProjectedPoint', ('point', 'projection', 'line_coordinate'))
     FoundSegment = namedtuple('FoundSegment', ('segment', 'points_number', 'density'))
+    FoundSegments = namedtuple('FoundSegments', ('ends', 'points_numbers', 'densities', 'lines'))
+
+    def __init__(self, tolerance=None, epsilon=None, lines=None):
+        """
+        Inits finder
+        :param tolerance: Maximal distance from the point to its nearest line for the point to be assigned to it.
+        If it is None, every point is assigned to its nearest line
+        :param epsilon: Maximal gap inside one segment
+        :param lines: Lines to find segments in: list of sympy lines or (L, 4) array of origins and directions.
+        If it is None, lines of the area are used
+        """
+        self.tolerance = tolerance
+        self.epsilon = epsilon
+        self.lines = lines
 
     def find(self, area: Area) -> Area:
-        # TODO: Implement this
-        raise NotImplementedError()
+        if self.epsilon is None:
+            raise ValueError("Epsilon must be set to find segments")
+
+        lines = self.lines if self.lines is not None else area.get_objects(Line)
+        found_segments = self.find_segments_in_lines(lines, area.points, self.tolerance, self.epsilon)
+        area.add_segments(found_segments.ends, found_segments.points_numbers, found_segments.densities,
+                          type(self).__name__)
+
+        return area
+
+    @staticmethod
+    def lines_to_array(lines) -> np.ndarray:
+        """
+        Converts lines to the array form
+        :param lines: List of sympy lines or (L, 4) array
+        :return: (L, 4) array of origins and direction vectors (x, y, dx, dy)
+        """
+        if isinstance(lines, np.ndarray):
+            return np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+
+        return np.array([(line.p1.x, line.p1.y, line.p2.x - line.p1.x, line.p2.y - line.p1.y) for line in lines],
+                        dtype=np.float64).reshape(-1, 4)
+
+    @staticmethod
+    def find_segments_in_lines(lines, points, tolerance, epsilon: float) -> FoundSegments:
+        """
+        Finds segments in many lines at once: each point is assigned to its nearest line within the tolerance, then
+        points of all lines are sorted by line and line coordinate together and split by gaps, exceeding epsilon.
+        Single points and segments of zero length are skipped
+        :param lines: List of sympy lines or (L, 4) array of origins and direction vectors
+        :param points: PointCloud, (N, 2) array or iterable of points
+        :param tolerance: Maximal distance from the point to the line. If it is None, it is not limited
+        :param epsilon: Maximal gap inside one segment
+        :return: Found segments: (M, 4) array of ends, numbers of points, densities and indices of the lines
+        """
+        np_lines = SegmentsInLineFinder.lines_to_array(lines)
+        np_points = PointCloud.as_array(points)
+
+        empty_segments = SegmentsInLineFinder.FoundSegments(np.empty((0, 4)), np.empty(0, dtype=np.intp),
+                                                            np.empty(0), np.empty(0, dtype=np.intp))
+        if len(np_lines) == 0 or len(np_points) == 0:
+            return empty_segments
+
+        origins = np_lines[:, :2]
+        directions = np_lines[:, 2:] / np.hypot(np_lines[:, 2], np_lines[:, 3])[:, np.newaxis]
+        normals = np.column_stack((-directions[:, 1], directions[:, 0]))
+
+        distances = np.abs(np_points.dot(normals.T) - (normals * origins).sum(axis=1))
+        nearest = np.argmin(distances, axis=1)
+        if tolerance is not None:
+            is_assigned = distances[np.arange(len(np_points)), nearest] < tolerance
+            np_points = np_points[is_assigned]
+            nearest = nearest[is_assigned]
+            if len(nearest) == 0:
+                return empty_segments
+
+        line_coordinates = ((np_points - origins[nearest]) * directions[nearest]).sum(axis=1)
+        order = np.lexsort((line_coordinates, nearest))
+        nearest = nearest[order]
+        line_coordinates = line_coordinates[order]
+
+        breaks = np.flatnonzero((np.diff(nearest) != 0) | (np.diff(line_coordinates) > epsilon)) + 1
+        first_indices = np.concatenate(([0], breaks)).astype(np.intp)
+        last_indices = np.concatenate((breaks - 1, [len(line_coordinates) - 1])).astype(np.intp)
+
+        lengths = line_coordinates[last_indices] - line_coordinates[first_indices]
+        is_valid = lengths > 0
+        first_indices = first_indices[is_valid]
+        last_indices = last_indices[is_valid]
+        segments_lines = nearest[first_indices]
+
+        starts = line_coordinates[first_indices, np.newaxis]
+        ends = line_coordinates[last_indices, np.newaxis]
+        segments_ends = np.hstack((origins[segments_lines] + starts * directions[segments_lines],
+                                   origins[segments_lines] + ends * directions[segments_lines]))
+        points_numbers = last_indices - first_indices + 1
+
+        return SegmentsInLineFinder.FoundSegments(segments_ends, points_numbers, points_numbers / lengths[is_valid],
+                                                  segments_lines)
 
     @staticmethod
     def project_on_line(line: Line, points: Iterable[ProjectedPoint]) -> List[ProjectedPoint]:
@@ -28,8 +120,8 @@ class SegmentsInLineFinder(Finder):
             if projection == some_line_point:
                 line_coordinate = 0
             else:
-                dst_ray = Ray(some_line_point, projection)
-                is_inversed = dst_ray.angle_between(line) != 0
+                # Sign of the dot product is used, because the angle of float lines is not exactly zero
+                is_inversed = (projection - some_line_point).dot(line.direction) < 0
                 line_coordinate = some_line_point.distance(projection)
                 if is_inversed:
                     line_coordinate = -line_coordinate
@@ -40,32 +132,55 @@ class SegmentsInLineFinder(Finder):
         return line_points
 
     @staticmethod
-    def find_segments(line: Line, points: Iterable[Point2D], epsilon: float) -> List[Segment]:
+    def find_segments(line: Line, points, epsilon: float) -> List[Segment]:
         return [found_segment.segment for found_segment in
                 SegmentsInLineFinder.find_segments_with_density(line, points, epsilon)]
 
     @staticmethod
-    def find_segments_with_density(line: Line, points: Iterable[Point2D], epsilon: float) -> List[FoundSegment]:
-        line_points = SegmentsInLineFinder.project_on_line(line, points)
+    def find_segments_with_density(line: Line, points, epsilon: float) -> List[FoundSegment]:
+        """
+        Projects points on the line and splits projections into segments, where distance between consecutive
+        projections does not exceed epsilon
+        :param line: Line to project points on
+        :param points: PointCloud, (N, 2) array or iterable of points
+        :param epsilon: Maximal gap inside one segment
+        :return: List of found segments, ordered along the line
+        """
+        origin = np.array([float(line.p1.x), float(line.p1.y)])
+        direction = np.array([float(line.p2.x), float(line.p2.y)]) - origin
+        found_segments = SegmentsInLineFinder.find_segments_array(origin, direction, points, epsilon)
+
+        return [SegmentsInLineFinder.FoundSegment(Segment(Point2D(x1, y1), Point2D(x2, y2)), points_number, density)
+                for (x1, y1, x2, y2), points_number, density in zip(found_segments.ends.tolist(),
+                                                                     found_segments.points_numbers.tolist(),
+                                                                     found_segments.densities.tolist())]
 
-        segments = []
-        current_start_point = None
-        current_segment_points_number = 0
-
-        for i, current_point in enumerate(line_points):
-
-            if current_start_point is None:
-                current_start_point = current_point
-                current_segment_points_number = 0
-
-            current_segment_points_number += 1
-
-            if i == len(line_points) - 1 \
-                    or abs(current_point.line_coordinate - line_points[i + 1].line_coordinate) > epsilon:
-                if current_point != current_start_point:
-                    segment = Segment(current_start_point.projection, current_point.projection)
-                    density = current_segment_points_number / segment.length
-                    segments.append(SegmentsInLineFinder.FoundSegment(segment, current_segment_points_number, density))
-                current_start_point = None
+    @staticmethod
+    def find_segments_array(origin: np.ndarray, direction: np.ndarray, points, epsilon: float) -> FoundSegments:
+        """
+        Array version of find_segments_with_density(): find_segments_in_lines() for one line, all points are projected
+        on it. Single points and segments of zero length are skipped
+        :param origin: Point of the line
+        :param direction: Direction vector of the line
+        :param points: PointCloud, (N, 2) array or iterable of points
+        :param epsilon: Maximal gap inside one segment
+        :return: Found segments: (M, 4) array of ends (x1, y1, x2, y2), numbers of points, densities and zero indices
+        of the line
+        """
+        line = np.concatenate((np.asarray(origin, dtype=np.float64), np.asarray(direction, dtype=np.float64)))
+        return SegmentsInLineFinder.find_segments_in_lines(line, points, None, epsilon)
 
-        return segments
\ No newline at end of file
+    @staticmethod
+    def concatenate_found_segments(found_segments_list: Iterable[FoundSegments]) -> FoundSegments:
+        """
+        Concatenates results of find_segments_array()
+        :param found_segments_list: Found segments of several lines
+        :return: All found segments, indices of the lines are positions of the results in the list
+        """
+        found_segments_list = list(found_segments_list)
+        return SegmentsInLineFinder.FoundSegments(
+            np.concatenate([np.empty((0, 4))] + [found.ends for found in found_segments_list]),
+            np.concatenate([np.empty(0, dtype=np.intp)] + [found.points_numbers for found in found_segments_list]),
+            np.concatenate([np.empty(0)] + [found.densities for found in found_segments_list]),
+            np.concatenate([np.empty(0, dtype=np.intp)] + [np.full(len(found.ends), i, dtype=np.intp)
+                                                           for i, found in enumerate(found_segments_list)]))
@@ -0,0 +1,96 @@
+import heapq
+
+import numpy as np
+
+from core.base import PointCloud
+from core.finders.base import SimplifyingSegmentsFinder
+
+__author__ = 'Xomak'
+
+
+class VisvalingamSegmentsFinder(SimplifyingSegmentsFinder):
+    """
+    Simplifies polylines with Visvalingam-Whyatt algorithm: the point with the smallest effective area (area of the
+    triangle, formed with its neighbours) is removed repeatedly. Points are kept in the min-heap with lazy invalidation,
+    so it takes O(n log n) for any polyline shape.
+    """
+
+    def __init__(self, area_threshold=None, vertices_number=None):
+        """
+        Inits finder. At least one of the parameters must be given
+        :param area_threshold: Points with effective area less than this value are removed
+        :param vertices_number: Maximal number of points in the simplified polyline (but not less than 2)
+        """
+        if area_threshold is None and vertices_number is None:
+            raise ValueError("Area threshold or vertices number must be set")
+
+        self._area_threshold = area_threshold
+        self._vertices_number = vertices_number
+
+    def _find_masks(self, points: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        mask = np.ones(len(points), dtype=bool)
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            mask[start:end] = self.find_mask(points[start:end], self._area_threshold, self._vertices_number)
+
+        return mask
+
+    @staticmethod
+    def find_mask(points, area_threshold=None, vertices_number=None) -> np.ndarray:
+        """
+        Finds main points of the polyline. Points are removed, while the smallest effective area is less than
+        area_threshold or there are more points than vertices_number. Effective area of the point never becomes less
+        than the one of the previously removed point, so that the removal order is consistent
+        :param points: PointCloud, (N, 2) array or list of points
+        :param area_threshold: Minimal effective area of the main point or None
+        :param vertices_number: Maximal number of main points or None
+        :return: Boolean mask of main points
+        """
+        np_points = PointCloud.as_array(points)
+        points_number = len(np_points)
+        mask = np.ones(points_number, dtype=bool)
+        if points_number < 3:
+            return mask
+
+        min_vertices = max(vertices_number or 2, 2)
+
+        previous_indices = np.arange(-1, points_number - 1)
+        next_indices = np.arange(1, points_number + 1)
+
+        areas = np.full(points_number, np.inf)
+        areas[1:-1] = VisvalingamSegmentsFinder._triangle_areas(np_points[:-2], np_points[1:-1], np_points[2:])
+        heap = list(zip(areas[1:-1].tolist(), range(1, points_number - 1)))
+        heapq.heapify(heap)
+
+        remained_number = points_number
+        while heap:
+            point_area, index = heapq.heappop(heap)
+            if not mask[index] or point_area != areas[index]:
+                continue
+
+            is_insignificant = area_threshold is not None and point_area < area_threshold
+            is_over_budget = vertices_number is not None and remained_number > min_vertices
+            if not is_insignificant and not is_over_budget:
+                break
+
+            mask[index] = False
+            remained_number -= 1
+            previous_index = previous_indices[index]
+            next_index = next_indices[index]
+            next_indices[previous_index] = next_index
+            previous_indices[next_index] = previous_index
+
+            for neighbour in (previous_index, next_index):
+                if 0 < neighbour < points_number - 1:
+                    neighbour_area = VisvalingamSegmentsFinder._triangle_areas(np_points[previous_indices[neighbour]],
+                                                                               np_points[neighbour],
+                                                                               np_points[next_indices[neighbour]])
+                    areas[neighbour] = max(float(neighbour_area), point_area)
+                    heapq.heappush(heap, (areas[neighbour], neighbour))
+
+        return mask
+
+    @staticmethod
+    def _triangle_areas(first: np.ndarray, second: np.ndarray, third: np.ndarray) -> np.ndarray:
+        first_sides = first - second
+        second_sides = third - second
+        return 0.5 * np.abs(first_sides[..., 0] * second_sides[..., 1] - first_sides[..., 1] * second_sides[..., 0])
@@ -1,6 +1,11 @@
-from typing import Set
+import math
+from collections import namedtuple
+from typing import Iterable, List
 
-from core.base import Area, SimpleArea
+import numpy as np
+from sympy import Point2D, Segment
+
+from core.base import Area, PointCloud
 
 __author__ = 'Xomak'
 
@@ -10,6 +15,302 @@ class Merger:
 
 
 class SimpleSegmentsMerger(Merger):
+    """
+    Merges areas, e.g. tiles of SimpleAreaSplitter or results of several finders on the same scan: points are united,
+    and collinear segments, which overlap or nearly touch, are fused. Segments are binned by their orientation and
+    clustered by the distance of their lines from the origin, and only segments from neighbour bins and the same
+    cluster are compared, sweeping along the line, so it takes near-linear time.
+    """
+
+    MergedSegments = namedtuple('MergedSegments', ('ends', 'points_numbers', 'densities', 'sources'))
+
+    def __init__(self, angle_tolerance: float, distance_tolerance: float, gap_tolerance: float):
+        """
+        Inits merger
+        :param angle_tolerance: Maximal angle between fused segments (radians)
+        :param distance_tolerance: Maximal distance from the ends of one segment to the line of another one
+        :param gap_tolerance: Maximal gap between fused segments along the line
+        """
+        if angle_tolerance <= 0 or distance_tolerance <= 0:
+            raise ValueError("Tolerances must be positive")
+
+        self._angle_tolerance = angle_tolerance
+        self._distance_tolerance = distance_tolerance
+        self._gap_tolerance = gap_tolerance
+
+    def merge(self, areas: Iterable[Area]) -> Area:
+        """
+        Merges areas into the new one
+        :param areas: Areas to merge. Pass them in a list to keep the order of the points
+        :return: Area with the united points and fused segments
+        """
+        areas = list(areas)
+        merged_area = Area(self._unite_points([area.points.array for area in areas]))
+
+        # Sources are recoded by the common list of the finders' names
+        source_names = []
+        sources_list = []
+        for area in areas:
+            codes = []
+            for name in area.segments.source_names:
+                if name not in source_names:
+                    source_names.append(name)
+                codes.append(source_names.index(name))
+            sources_list.append(np.array(codes + [-1], dtype=np.int16)[area.segments.sources])
+
+        merged_segments = self.merge_segments_columns(
+            np.concatenate([np.empty((0, 4))] + [area.segments.ends for area in areas]),
+            np.concatenate([np.empty(0, dtype=np.intp)] + [area.segments.points_numbers for area in areas]),
+            np.concatenate([np.empty(0)] + [area.segments.densities for area in areas]),
+            np.concatenate([np.empty(0, dtype=np.int16)] + sources_list))
+
+        if len(merged_segments.ends) == 0:
+            return merged_area
+
+        # Segments are added by the runs of the same source to keep their order
+        sources = merged_segments.sources
+        boundaries = np.concatenate(([0], np.flatnonzero(sources[1:] != sources[:-1]) + 1, [len(sources)]))
+        for start, stop in zip(boundaries[:-1].tolist(), boundaries[1:].tolist()):
+            source = int(sources[start])
+            merged_area.add_segments(merged_segments.ends[start:stop], merged_segments.points_numbers[start:stop],
+                                     merged_segments.densities[start:stop],
+                                     source_names[source] if source >= 0 else None)
+
+        return merged_area
+
+    @staticmethod
+    def _unite_points(arrays: List[np.ndarray]) -> np.ndarray:
+        """
+        Concatenates points of the areas in their order. Points, which are already in one of the previous areas (e.g.
+        in the tiles' margins or in the results of another finder on the same scan), are dropped, while repeated points
+        of the same area are kept, so that the scan order is not broken
+        :param arrays: Points of the areas
+        :return: (N, 2) array of points
+        """
+        points = np.concatenate([np.empty((0, 2))] + arrays)
+        if len(points) == 0:
+            return points
+
+        area_indices = np.repeat(np.arange(len(arrays)), [len(array) for array in arrays])
+        _, first_indices, inverse = np.unique(points, axis=0, return_index=True, return_inverse=True)
+        return points[area_indices == area_indices[first_indices[inverse.ravel()]]]
+
+    def merge_segments(self, segments: Iterable[Segment]) -> list:
+        """
+        Fuses collinear overlapping or nearly touching segments. Segments, which have nothing to fuse with, are
+        returned as is
+        :param segments: Segments
+        :return: List of segments
+        """
+        segments = list(segments)
+        if len(segments) == 0:
+            return []
+
+        ends = np.array([(segment.p1.x, segment.p1.y, segment.p2.x, segment.p2.y) for segment in segments],
+                        dtype=np.float64)
+        labels = self.find_groups(ends)
+
+        merged_segments = []
+        for members in self._split_groups(labels):
+            if len(members) == 1:
+                merged_segments.append(segments[members[0]])
+            else:
+                x1, y1, x2, y2 = self._fuse(ends[members]).tolist()
+                merged_segments.append(Segment(Point2D(x1, y1), Point2D(x2, y2)))
+
+        return merged_segments
+
+    def merge_segments_array(self, ends: np.ndarray) -> np.ndarray:
+        """
+        Array version of merge_segments()
+        :param ends: (M, 4) array of segments' ends
+        :return: (K, 4) array of ends of the fused and the remained segments
+        """
+        return self.merge_segments_columns(ends).ends
+
+    def merge_segments_columns(self, ends: np.ndarray, points_numbers=None, densities=None,
+                               sources=None) -> MergedSegments:
+        """
+        Version of merge_segments_array(), which carries the columns of the segments' store through. Remained segments
+        keep their values. Numbers of points of the fused segment are summed (it is -1, if any of them is unknown), its
+        density is recomputed for the fused length, and its source is the one of the member with the most points
+        :param ends: (M, 4) array of segments' ends
+        :param points_numbers: (M) array of numbers of supporting points (-1 if it is unknown) or None
+        :param densities: (M) array of densities (nan if it is unknown) or None
+        :param sources: (M) array of sources' codes (-1 if it is unknown) or None
+        :return: Merged segments: (K, 4) array of ends, numbers of points, densities and sources
+        """
+        ends = np.asarray(ends, dtype=np.float64).reshape((-1, 4))
+        points_numbers = np.full(len(ends), -1, dtype=np.intp) if points_numbers is None \
+            else np.asarray(points_numbers, dtype=np.intp)
+        densities = np.full(len(ends), np.nan) if densities is None else np.asarray(densities, dtype=np.float64)
+        sources = np.full(len(ends), -1, dtype=np.int16) if sources is None else np.asarray(sources, dtype=np.int16)
+        if len(ends) == 0:
+            return self.MergedSegments(ends, points_numbers, densities, sources)
+
+        groups = self._split_groups(self.find_groups(ends))
+        merged_ends = np.empty((len(groups), 4))
+        merged_points_numbers = np.empty(len(groups), dtype=np.intp)
+        merged_densities = np.empty(len(groups))
+        merged_sources = np.empty(len(groups), dtype=np.int16)
+        for group_index, members in enumerate(groups):
+            if len(members) == 1:
+                index = members[0]
+                merged_ends[group_index] = ends[index]
+                merged_points_numbers[group_index] = points_numbers[index]
+                merged_densities[group_index] = densities[index]
+                merged_sources[group_index] = sources[index]
+                continue
+
+            fused_ends = self._fuse(ends[members])
+            members_points_numbers = points_numbers[members]
+            points_number = members_points_numbers.sum() if np.all(members_points_numbers >= 0) else -1
+            length = math.hypot(fused_ends[2] - fused_ends[0], fused_ends[3] - fused_ends[1])
+
+            merged_ends[group_index] = fused_ends
+            merged_points_numbers[group_index] = points_number
+            merged_densities[group_index] = points_number / length if points_number >= 0 and length > 0 else np.nan
+            merged_sources[group_index] = sources[members[np.argmax(members_points_numbers)]]
+
+        return self.MergedSegments(merged_ends, merged_points_numbers, merged_densities, merged_sources)
+
+    def find_groups(self, ends: np.ndarray) -> np.ndarray:
+        """
+        Finds groups of segments to fuse. Segments are binned by orientation, and each bin is processed together with
+        the next one. Within them, segments are clustered by the distance of their lines from the origin (rho), and
+        each cluster is swept along the direction of the bin
+        :param ends: (M, 4) array of segments' ends
+        :return: Group label of each segment
+        """
+        directions = ends[:, 2:] - ends[:, :2]
+        angles = np.mod(np.arctan2(directions[:, 1], directions[:, 0]), np.pi)
+        normals = np.column_stack((-np.sin(angles), np.cos(angles)))
+        rhos = (normals * ends[:, :2]).sum(axis=1)
+
+        # When the line turns by the angle tolerance, rho of its point at distance r from the origin changes by up to
+        # r * angle_tolerance, so rho windows of collinear segments far from the origin are widened accordingly
+        radii = np.hypot(ends[:, [0, 2]], ends[:, [1, 3]]).max(axis=1)
+        rho_tolerances = self._distance_tolerance + self._angle_tolerance * radii
+
+        angles_number = max(int(math.ceil(math.pi / self._angle_tolerance)), 1)
+        angle_bins = np.minimum((angles / self._angle_tolerance).astype(np.int64), angles_number - 1)
+        order = np.argsort(angle_bins, kind='mergesort')
+        bins = np.split(order, np.searchsorted(angle_bins[order], np.arange(1, angles_number)))
+
+        parents = np.arange(len(ends))
+
+        def find_root(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        for angle_bin in range(angles_number):
+            # Bin after the last one is the first one, where the orientations and rhos are mirrored
+            next_bin = angle_bin + 1
+            next_sign = 1
+            if next_bin == angles_number:
+                next_bin = 0
+                next_sign = -1
+            next_members = bins[next_bin] if next_bin != angle_bin else np.empty(0, dtype=np.intp)
+
+            candidates = np.concatenate((bins[angle_bin], next_members))
+            if len(candidates) < 2:
+                continue
+
+            candidates_rhos = np.concatenate((rhos[bins[angle_bin]], next_sign * rhos[next_members]))
+            bin_angle = (angle_bin + 0.5) * self._angle_tolerance
+            bin_direction = np.array([math.cos(bin_angle), math.sin(bin_angle)])
+
+            for cluster in self._split_clusters(candidates_rhos, rho_tolerances[candidates]):
+                if len(cluster) < 2:
+                    continue
+
+                # Sweep along the direction of the bin
+                members = candidates[cluster]
+                coordinates = np.column_stack((ends[members, :2].dot(bin_direction),
+                                               ends[members, 2:].dot(bin_direction)))
+                coordinates.sort(axis=1)
+                sweep_order = np.argsort(coordinates[:, 0], kind='mergesort')
+
+                active = []
+                for position in sweep_order.tolist():
+                    start, end = coordinates[position]
+                    active = [(active_end, active_index) for active_end, active_index in active
+                              if active_end + self._gap_tolerance >= start]
+                    index = int(members[position])
+                    for _, active_index in active:
+                        if self._are_collinear(ends[active_index], ends[index]):
+                            parents[find_root(active_index)] = find_root(index)
+                    active.append((end, index))
+
+        return np.array([find_root(index) for index in range(len(ends))])
+
+    @staticmethod
+    def _split_clusters(rhos: np.ndarray, tolerances: np.ndarray) -> list:
+        """
+        Splits segments into clusters, which windows rho +- tolerance do not overlap
+        :param rhos: Distances of the segments' lines from the origin
+        :param tolerances: Half-widths of the windows
+        :return: List of arrays of indices
+        """
+        lower_bounds = rhos - tolerances
+        order = np.argsort(lower_bounds, kind='mergesort')
+        reached_bounds = np.maximum.accumulate((rhos + tolerances)[order])
+        boundaries = np.flatnonzero(lower_bounds[order][1:] > reached_bounds[:-1]) + 1
+        return np.split(order, boundaries)
+
+    @staticmethod
+    def _split_groups(labels: np.ndarray) -> list:
+        """
+        Splits indices of the segments by their group labels
+        :param labels: Group label of each segment
+        :return: List of arrays of indices, ordered by the first member
+        """
+        order = np.argsort(labels, kind='mergesort')
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        groups = np.split(order, boundaries)
+        groups.sort(key=lambda members: members[0])
+        return groups
+
+    def _are_collinear(self, first: np.ndarray, second: np.ndarray) -> bool:
+        first_direction = first[2:] - first[:2]
+        second_direction = second[2:] - second[:2]
+        first_length = math.hypot(first_direction[0], first_direction[1])
+        second_length = math.hypot(second_direction[0], second_direction[1])
+        if first_length == 0 or second_length == 0:
+            return False
+
+        cross = first_direction[0] * second_direction[1] - first_direction[1] * second_direction[0]
+        dot = first_direction.dot(second_direction)
+        if abs(math.atan2(cross, abs(dot))) > self._angle_tolerance:
+            return False
+
+        # Ends of the shorter segment are measured to the line of the longer one
+        if first_length < second_length:
+            first, second = second, first
+            first_direction, first_length = second_direction, second_length
+        unit = first_direction / first_length
+        offsets = second.reshape(2, 2) - first[:2]
+        distances = np.abs(offsets[:, 0] * unit[1] - offsets[:, 1] * unit[0])
+        if distances.max() > self._distance_tolerance:
+            return False
+
+        coordinates = offsets.dot(unit)
+        return coordinates.min() - first_length <= self._gap_tolerance and -coordinates.max() <= self._gap_tolerance
+
+    @staticmethod
+    def _fuse(ends: np.ndarray) -> np.ndarray:
+        """
+        Fits line to the ends of the segments with total least squares and finds the extent of their projections
+        :param ends: (K, 4) array of segments' ends
+        :return: Ends of the fused segment
+        """
+        points = PointCloud.as_array(ends)
+        mean = points.mean(axis=0)
+        centred = points - mean
+        eigenvalues, eigenvectors = np.linalg.eigh(centred.T.dot(centred))
+        direction = eigenvectors[:, 1]
 
-    def merge(self, areas: Set[SimpleArea]) -> Area:
-        pass
+        coordinates = centred.dot(direction)
+        return np.concatenate((mean + coordinates.min() * direction, mean + coordinates.max() * direction))
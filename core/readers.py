@@ -1,5 +1,9 @@
-from typing import Dict, List
+import itertools
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 from sympy import Point2D
 
 from core.base import Area
@@ -9,17 +13,88 @@ __author__ = 'Xomak'
 
 class XYFileReader:
 
+    # Maps point delimiters of the "(x;y;z),(x;y;z)" list to spaces, so it can be parsed by NumPy at once
+    _POINTS_DELIMITERS = str.maketrans('(;),', '    ')
+
     @staticmethod
     def get_data(file_path) -> Dict[int, List[Point2D]]:
-        timed_points = {}
-        with open(file_path, 'r') as file:
-            for line in file.readlines():
-                timestamp, points = XYFileReader.parse_file_line(line)
-                timed_points[timestamp] = points
-        return timed_points
+        """
+        Reads file as sympy points. This is compatibility wrapper over get_arrays()
+        :param file_path: Path to the file
+        :return: Dictionary, mapping timestamp to the list of points
+        """
+        return {timestamp: [Point2D(x, y) for x, y in points.tolist()]
+                for timestamp, points in XYFileReader.get_arrays(file_path).items()}
+
+    @staticmethod
+    def get_arrays(file_path) -> Dict[int, np.ndarray]:
+        """
+        Reads file as points arrays
+        :param file_path: Path to the file
+        :return: Dictionary, mapping timestamp to the (N, 2) points array
+        """
+        return dict(XYFileReader.iter_arrays(file_path))
 
     @staticmethod
     def parse_file_line(string):
+        timestamp, points = XYFileReader.parse_file_line_array(string)
+        return timestamp, [Point2D(x, y) for x, y in points.tolist()]
+
+    @staticmethod
+    def iter_arrays(file_path, start_timestamp=None, end_timestamp=None, stride=1,
+                    index: 'XYFileIndex' = None) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Lazily reads file frame by frame, so memory consumption does not depend on the file size.
+        Points of the skipped frames are not parsed.
+        :param file_path: Path to the file
+        :param start_timestamp: If given, frames with lower timestamps are skipped
+        :param end_timestamp: If given, frames with greater timestamps are skipped
+        :param stride: Only every stride-th frame of the matching ones is returned
+        :param index: Index of the file. If given, matching frames are read directly, without reading preceding ones.
+        It must be built for the file_path
+        :return: Generator of timestamps and (N, 2) points arrays
+        """
+        if stride < 1:
+            raise ValueError("Stride must be positive")
+
+        if index is not None:
+            if os.path.abspath(index.file_path) != os.path.abspath(file_path):
+                raise ValueError("Index is built for {}, not for {}".format(index.file_path, file_path))
+
+            frame_numbers = index.find_frames(start_timestamp, end_timestamp)[::stride]
+            for timestamp, points in index.iter_frames(frame_numbers):
+                yield timestamp, points
+            return
+
+        matched_frames_number = 0
+        with open(file_path, 'r') as file:
+            for line in file:
+                if line.isspace():
+                    continue
+
+                timestamp, points_str = XYFileReader._split_file_line(line)
+                if (start_timestamp is not None and timestamp < start_timestamp) \
+                        or (end_timestamp is not None and timestamp > end_timestamp):
+                    continue
+
+                matched_frames_number += 1
+                if (matched_frames_number - 1) % stride != 0:
+                    continue
+
+                yield timestamp, XYFileReader._parse_points(points_str)
+
+    @staticmethod
+    def parse_file_line_array(string) -> Tuple[int, np.ndarray]:
+        """
+        Parses one line of the file. Coordinates are parsed by NumPy in bulk, no per-point objects are created
+        :param string: Line in "timestamp: (x;y;z),(x;y;z)" format
+        :return: Timestamp and contiguous (N, 2) array of points
+        """
+        timestamp, points_str = XYFileReader._split_file_line(string)
+        return timestamp, XYFileReader._parse_points(points_str)
+
+    @staticmethod
+    def _split_file_line(string) -> Tuple[int, str]:
         comps = string.split(":")
 
         if len(comps) != 2:
@@ -30,34 +105,398 @@ class XYFileReader:
         except ValueError:
             raise IOError("Timestamp should has int type")
 
-        points_list = []
-        points_comps = comps[1].strip(" ,\t\n").split(",")
-        for point_str in points_comps:
-            point_comps = point_str.strip(" ()").split(";")
-            if len(point_comps) != 3:
-                raise IOError("Undefined urgxy format: (x;y;z) list expected but received " + point_comps)
-            points_list.append(Point2D(float(point_comps[0]), float(point_comps[1])))
+        return timestamp, comps[1]
+
+    @staticmethod
+    def _parse_points(points_str) -> np.ndarray:
+        values = np.fromstring(points_str.translate(XYFileReader._POINTS_DELIMITERS), dtype=np.float64, sep=' ')
+
+        if values.size == 0 or values.size != 3 * points_str.count('('):
+            raise IOError("Undefined urgxy format: (x;y;z) list expected")
 
-        return timestamp, points_list
+        return np.ascontiguousarray(values.reshape((-1, 3))[:, :2])
 
 
 class XYFileAreaReader(XYFileReader):
 
     @staticmethod
     def get_area(file_path, ignore_zero_point=True, merge_duplicates=True):
-        timestamped_points_lists = XYFileReader.get_data(file_path)
-        if len(timestamped_points_lists) != 1:
-            raise NotImplemented("Area construction is not supported for files with not one instance of data")
+        # At most two frames are read: the second one is enough to reject the file
+        frames = XYFileReader.iter_arrays(file_path)
+        try:
+            first_frames = list(itertools.islice(frames, 2))
+        finally:
+            frames.close()
+
+        if len(first_frames) != 1:
+            raise NotImplementedError("Area construction is not supported for files with not one instance of data")
+
+        _, points = first_frames[0]
+        return Area(XYFileAreaReader.filter_points(points, ignore_zero_point, merge_duplicates))
+
+    @staticmethod
+    def iter_areas(file_path, start_timestamp=None, end_timestamp=None, stride=1,
+                   ignore_zero_point=True, merge_duplicates=True,
+                   index: 'XYFileIndex' = None) -> Iterator[Tuple[int, Area]]:
+        """
+        Lazily reads file frame by frame, building area for each of them. See iter_arrays() for the parameters
+        :return: Generator of timestamps and areas
+        """
+        for timestamp, points in XYFileReader.iter_arrays(file_path, start_timestamp, end_timestamp, stride, index):
+            yield timestamp, Area(XYFileAreaReader.filter_points(points, ignore_zero_point, merge_duplicates))
+
+    @staticmethod
+    def get_frame_area(file_path, frame_number, ignore_zero_point=True, merge_duplicates=True) -> Tuple[int, Area]:
+        """
+        Reads one frame of the file, using its index (it is built, if there is no actual one)
+        :param file_path: Path to the file
+        :param frame_number: Number of the frame in the file
+        :return: Timestamp and area of the frame
+        """
+        timestamp, points = XYFileIndex.open(file_path).read_frame(frame_number)
+        return timestamp, Area(XYFileAreaReader.filter_points(points, ignore_zero_point, merge_duplicates))
+
+    @staticmethod
+    def filter_points(points: np.ndarray, ignore_zero_point=True, merge_duplicates=True) -> np.ndarray:
+        """
+        Removes service points from the scan
+        :param points: (N, 2) points array
+        :param ignore_zero_point: Whether (0, 0) points should be removed
+        :param merge_duplicates: Whether sequentially repeated points should be removed
+        :return: Filtered points array
+        """
+        mask = np.ones(len(points), dtype=bool)
+
+        if merge_duplicates:
+            mask[1:] = np.any(points[1:] != points[:-1], axis=1)
+
+        if ignore_zero_point:
+            mask &= np.any(points != 0, axis=1)
+
+        if mask.all():
+            return points
+
+        return points[mask]
+
+
+def _find_frames(timestamps: np.ndarray, is_sorted: bool, start_timestamp, end_timestamp) -> np.ndarray:
+    if is_sorted:
+        start = 0 if start_timestamp is None else np.searchsorted(timestamps, start_timestamp, 'left')
+        end = len(timestamps) if end_timestamp is None else np.searchsorted(timestamps, end_timestamp, 'right')
+        return np.arange(start, end)
+
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start_timestamp is not None:
+        mask &= timestamps >= start_timestamp
+    if end_timestamp is not None:
+        mask &= timestamps <= end_timestamp
+    return np.flatnonzero(mask)
+
+
+class XYFileIndex:
+    """
+    Index of the .xy file frames: timestamp and byte offset of each frame. It is stored in the small sidecar file
+    next to the log, so it is built only once, and is rebuilt when the log's size or modification time changes.
+    """
+
+    SUFFIX = '.idx'
+
+    # Magic, size and modification time (in ns) of the indexed file, frames number
+    _HEADER = struct.Struct('<8sqqq')
+    _MAGIC = b'XYIDX\x00\x00\x01'
+
+    def __init__(self, file_path, timestamps: np.ndarray, offsets: np.ndarray):
+        if len(timestamps) != len(offsets):
+            raise ValueError("Timestamps and offsets must have the same length")
+
+        self._file_path = file_path
+        self._timestamps = np.asarray(timestamps, dtype=np.int64)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._is_sorted = bool(np.all(self._timestamps[1:] >= self._timestamps[:-1]))
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    @staticmethod
+    def get_sidecar_path(file_path):
+        return file_path + XYFileIndex.SUFFIX
+
+    @staticmethod
+    def build(file_path) -> 'XYFileIndex':
+        """
+        Builds index, scanning the file. Only timestamps are parsed
+        :param file_path: Path to the file
+        :return: Index
+        """
+        timestamps = []
+        offsets = []
 
-        area = Area()
-        timestamped_points = next(iter(timestamped_points_lists.values()))
+        offset = 0
+        with open(file_path, 'rb') as file:
+            for line in file:
+                if not line.isspace():
+                    separator_position = line.find(b':')
+                    try:
+                        timestamps.append(int(line[:separator_position]))
+                    except ValueError:
+                        raise IOError("Undefined urgxy format: 'timestamp: list' expected")
+                    offsets.append(offset)
+                offset += len(line)
 
-        previous_point = None
-        zero_point = Point2D(0, 0)
+        return XYFileIndex(file_path, np.array(timestamps, dtype=np.int64), np.array(offsets, dtype=np.int64))
 
-        for point in timestamped_points:
-            if (not merge_duplicates or point != previous_point) and (not ignore_zero_point or point != zero_point):
-                area.add_object(Point2D, point)
-            previous_point = point
+    @staticmethod
+    def load(file_path) -> Optional['XYFileIndex']:
+        """
+        Loads index from the sidecar file
+        :param file_path: Path to the indexed file (not to the sidecar)
+        :return: Index or None, if there is no sidecar or it is stale
+        """
+        sidecar_path = XYFileIndex.get_sidecar_path(file_path)
+
+        try:
+            with open(sidecar_path, 'rb') as file:
+                header = file.read(XYFileIndex._HEADER.size)
+                if len(header) != XYFileIndex._HEADER.size:
+                    return None
+
+                magic, size, mtime, frames_number = XYFileIndex._HEADER.unpack(header)
+                stat = os.stat(file_path)
+                if magic != XYFileIndex._MAGIC or size != stat.st_size or mtime != stat.st_mtime_ns:
+                    return None
+
+                table = np.fromfile(file, dtype='<i8', count=2 * frames_number)
+        except OSError:
+            return None
+
+        if len(table) != 2 * frames_number:
+            return None
+
+        table = table.reshape((-1, 2))
+        return XYFileIndex(file_path, table[:, 0], table[:, 1])
+
+    @staticmethod
+    def open(file_path) -> 'XYFileIndex':
+        """
+        Loads index from the sidecar file, building and saving it, if needed
+        :param file_path: Path to the indexed file (not to the sidecar)
+        :return: Index
+        """
+        index = XYFileIndex.load(file_path)
+        if index is None:
+            index = XYFileIndex.build(file_path)
+            try:
+                index.save()
+            except OSError:
+                pass
+        return index
+
+    def save(self):
+        """
+        Saves index to the sidecar file. Index is expected to be built for the current version of the file
+        """
+        stat = os.stat(self._file_path)
+        sidecar_path = XYFileIndex.get_sidecar_path(self._file_path)
+        temporary_path = sidecar_path + '.tmp'
+
+        table = np.empty((len(self), 2), dtype='<i8')
+        table[:, 0] = self._timestamps
+        table[:, 1] = self._offsets
+
+        with open(temporary_path, 'wb') as file:
+            file.write(XYFileIndex._HEADER.pack(XYFileIndex._MAGIC, stat.st_size, stat.st_mtime_ns, len(self)))
+            file.write(table.tobytes())
+        os.replace(temporary_path, sidecar_path)
+
+    def find_frames(self, start_timestamp=None, end_timestamp=None) -> np.ndarray:
+        """
+        Finds frames in the given time window
+        :param start_timestamp: If given, frames with lower timestamps are skipped
+        :param end_timestamp: If given, frames with greater timestamps are skipped
+        :return: Numbers of the frames, in the file order
+        """
+        return _find_frames(self._timestamps, self._is_sorted, start_timestamp, end_timestamp)
+
+    def read_frame(self, frame_number) -> Tuple[int, np.ndarray]:
+        """
+        Reads one frame, seeking directly to it
+        :param frame_number: Number of the frame in the file
+        :return: Timestamp and (N, 2) points array
+        """
+        return next(self.iter_frames([frame_number]))
+
+    def iter_frames(self, frame_numbers: Iterable[int]) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Reads given frames, seeking directly to each of them
+        :param frame_numbers: Numbers of the frames in the file
+        :return: Generator of timestamps and (N, 2) points arrays
+        """
+        with open(self._file_path, 'rb') as file:
+            for frame_number in frame_numbers:
+                if frame_number < 0 or frame_number >= len(self):
+                    raise IndexError("Frame {} does not exist".format(frame_number))
+                file.seek(int(self._offsets[frame_number]))
+                yield XYFileReader.parse_file_line_array(file.readline().decode())
+
+
+class XYBinaryFileWriter:
+    """
+    Converts .xy logs to the packed binary format, which can be memory-mapped by XYBinaryFileReader.
+    The file consists of:
+
+    * header: magic, size of coordinate in bytes (4 or 8), frames number, points number
+    * frames table: timestamp, offset (in points) and points number for each frame, int64 values
+    * points block: (x, y) pairs of little-endian float32 or float64 coordinates
+    """
+
+    MAGIC = b'XYBIN\x00\x00\x01'
+    HEADER = struct.Struct('<8sqqq')
+    FRAME_DTYPE = np.dtype([('timestamp', '<i8'), ('offset', '<i8'), ('count', '<i8')])
+
+    @staticmethod
+    def convert(xy_file_path, binary_file_path, dtype=np.float64):
+        """
+        Converts .xy file to the binary one. Points are stored as is, without any filtering
+        :param xy_file_path: Path to the source .xy file
+        :param binary_file_path: Path to the binary file to create
+        :param dtype: Type of coordinates: float32 or float64
+        """
+        points_dtype = np.dtype(dtype).newbyteorder('<')
+        if points_dtype.kind != 'f' or points_dtype.itemsize not in (4, 8):
+            raise ValueError("float32 or float64 coordinates expected")
+
+        frames_number = len(XYFileIndex.build(xy_file_path))
+        frames = np.zeros(frames_number, dtype=XYBinaryFileWriter.FRAME_DTYPE)
+        header = XYBinaryFileWriter.HEADER
+
+        with open(binary_file_path, 'wb') as file:
+            file.write(header.pack(XYBinaryFileWriter.MAGIC, points_dtype.itemsize, frames_number, 0))
+            file.write(frames.tobytes())
+
+            points_number = 0
+            for frame_number, (timestamp, points) in enumerate(XYFileReader.iter_arrays(xy_file_path)):
+                frames[frame_number] = (timestamp, points_number, len(points))
+                file.write(points.astype(points_dtype).tobytes())
+                points_number += len(points)
+
+            file.seek(0)
+            file.write(header.pack(XYBinaryFileWriter.MAGIC, points_dtype.itemsize, frames_number, points_number))
+            file.write(frames.tobytes())
 
-        return area
+
+class XYBinaryFileReader:
+    """
+    Reader of the files, created by XYBinaryFileWriter. File is memory-mapped, so frames are returned as views,
+    and nothing is read or copied, until they are accessed
+    """
+
+    def __init__(self, file_path):
+        header = XYBinaryFileWriter.HEADER
+
+        with open(file_path, 'rb') as file:
+            header_bytes = file.read(header.size)
+
+        if len(header_bytes) != header.size:
+            raise IOError("Undefined binary xy format: header expected")
+
+        magic, item_size, frames_number, points_number = header.unpack(header_bytes)
+        if magic != XYBinaryFileWriter.MAGIC or item_size not in (4, 8):
+            raise IOError("Undefined binary xy format: wrong header")
+
+        frames_offset = header.size
+        points_offset = frames_offset + frames_number * XYBinaryFileWriter.FRAME_DTYPE.itemsize
+        points_dtype = np.dtype('<f{}'.format(item_size))
+
+        self._file_path = file_path
+        self._frames = XYBinaryFileReader._map(file_path, XYBinaryFileWriter.FRAME_DTYPE, frames_offset,
+                                               (frames_number,))
+        self._points = XYBinaryFileReader._map(file_path, points_dtype, points_offset, (points_number, 2))
+        self._is_sorted = bool(np.all(self.timestamps[1:] >= self.timestamps[:-1]))
+
+    @staticmethod
+    def _map(file_path, dtype, offset, shape) -> np.ndarray:
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._frames['timestamp']
+
+    def __len__(self):
+        return len(self._frames)
+
+    def get_points(self, frame_number) -> np.ndarray:
+        """
+        Returns points of the frame
+        :param frame_number: Number of the frame in the file
+        :return: Memory-mapped (N, 2) view of the points
+        """
+        if frame_number < 0 or frame_number >= len(self):
+            raise IndexError("Frame {} does not exist".format(frame_number))
+
+        offset = int(self._frames['offset'][frame_number])
+        count = int(self._frames['count'][frame_number])
+        return self._points[offset:offset + count]
+
+    def find_frames(self, start_timestamp=None, end_timestamp=None) -> np.ndarray:
+        """
+        Finds frames in the given time window
+        :param start_timestamp: If given, frames with lower timestamps are skipped
+        :param end_timestamp: If given, frames with greater timestamps are skipped
+        :return: Numbers of the frames, in the file order
+        """
+        return _find_frames(self.timestamps, self._is_sorted, start_timestamp, end_timestamp)
+
+    def iter_arrays(self, start_timestamp=None, end_timestamp=None, stride=1) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Iterates over the frames. See XYFileReader.iter_arrays() for the parameters
+        :return: Generator of timestamps and memory-mapped (N, 2) views of the points
+        """
+        if stride < 1:
+            raise ValueError("Stride must be positive")
+
+        for frame_number in self.find_frames(start_timestamp, end_timestamp)[::stride]:
+            yield int(self.timestamps[frame_number]), self.get_points(frame_number)
+
+
+class XYBinaryFileAreaReader:
+    """
+    Counterpart of XYFileAreaReader for the binary files. When no filtering is required, areas of float64 files
+    use memory-mapped points without copying
+    """
+
+    @staticmethod
+    def get_area(file_path, ignore_zero_point=True, merge_duplicates=True) -> Area:
+        reader = XYBinaryFileReader(file_path)
+        if len(reader) != 1:
+            raise NotImplementedError("Area construction is not supported for files with not one instance of data")
+
+        points = reader.get_points(0)
+        return Area(XYFileAreaReader.filter_points(points, ignore_zero_point, merge_duplicates))
+
+    @staticmethod
+    def iter_areas(file_path, start_timestamp=None, end_timestamp=None, stride=1,
+                   ignore_zero_point=True, merge_duplicates=True) -> Iterator[Tuple[int, Area]]:
+        reader = XYBinaryFileReader(file_path)
+        for timestamp, points in reader.iter_arrays(start_timestamp, end_timestamp, stride):
+            yield timestamp, Area(XYFileAreaReader.filter_points(points, ignore_zero_point, merge_duplicates))
+
+    @staticmethod
+    def get_frame_area(file_path, frame_number, ignore_zero_point=True, merge_duplicates=True) -> Tuple[int, Area]:
+        reader = XYBinaryFileReader(file_path)
+        points = reader.get_points(frame_number)
+        timestamp = int(reader.timestamps[frame_number])
+        return timestamp, Area(XYFileAreaReader.filter_points(points, ignore_zero_point, merge_duplicates))
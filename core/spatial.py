@@ -0,0 +1,77 @@
+from itertools import chain
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+__author__ = 'Xomak'
+
+
+class SpatialIndex:
+    """
+    KD-tree over the points array for bulk neighbour queries. It is built in O(n log n) once, and each query takes
+    O(log n) plus the number of found neighbours. Points are not copied, so the array must not be changed
+    """
+
+    def __init__(self, points: np.ndarray):
+        """
+        Inits index
+        :param points: (N, 2) array of points
+        """
+        self._points = points
+        self._tree = cKDTree(points) if len(points) > 0 else None
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._points
+
+    def __len__(self):
+        return len(self._points)
+
+    def query_radius(self, queries, radius: float) -> (np.ndarray, np.ndarray):
+        """
+        Finds points within the radius from each query point (inclusively)
+        :param queries: (Q, 2) array of query points
+        :param radius: Radius of the neighbourhood
+        :return: (Q + 1) array of offsets and array of indices: neighbours of the i-th query are
+        indices[offsets[i]:offsets[i + 1]], ordered by index
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape((-1, 2))
+        if self._tree is None or len(queries) == 0:
+            return np.zeros(len(queries) + 1, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+        neighbours = self._tree.query_ball_point(queries, radius)
+        counts = np.fromiter((len(query_neighbours) for query_neighbours in neighbours), dtype=np.intp,
+                             count=len(queries))
+        indices = np.fromiter(chain.from_iterable(neighbours), dtype=np.intp, count=int(counts.sum()))
+
+        rows = np.repeat(np.arange(len(queries)), counts)
+        indices = indices[np.lexsort((indices, rows))]
+        return np.concatenate(([0], np.cumsum(counts))).astype(np.intp), indices
+
+    def count_radius(self, queries, radius: float) -> np.ndarray:
+        """
+        Counts points within the radius from each query point (inclusively)
+        :param queries: (Q, 2) array of query points
+        :param radius: Radius of the neighbourhood
+        :return: (Q) array of counts
+        """
+        offsets, _ = self.query_radius(queries, radius)
+        return np.diff(offsets)
+
+    def query_knn(self, queries, k: int) -> (np.ndarray, np.ndarray):
+        """
+        Finds k nearest points for each query point
+        :param queries: (Q, 2) array of query points
+        :param k: Number of neighbours
+        :return: (Q, k) arrays of distances and indices, ordered by distance. If there are less than k points, missing
+        neighbours have infinite distance and index, equal to the number of points
+        """
+        if k < 1:
+            raise ValueError("Number of neighbours must be positive")
+
+        queries = np.asarray(queries, dtype=np.float64).reshape((-1, 2))
+        if self._tree is None or len(queries) == 0:
+            return np.full((len(queries), k), np.inf), np.full((len(queries), k), len(self), dtype=np.intp)
+
+        distances, indices = self._tree.query(queries, k)
+        return distances.reshape((-1, k)), indices.reshape((-1, k)).astype(np.intp)
@@ -1,6 +1,11 @@
-from typing import Set
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Set, Iterable, List
 
-from core.base import Area, SimpleArea
+import numpy as np
+
+from core.base import Area, SimpleArea, PointCloud
+from core.finders.base import Finder
 
 __author__ = 'Xomak'
 
@@ -15,6 +20,102 @@ class AreasSplitter:
 
 
 class SimpleAreaSplitter(AreasSplitter):
+    """
+    Splits points by the uniform grid of square tiles. Each tile also gets points within the margin around it,
+    so that objects, crossing tiles' borders, are found in the whole in at least one tile.
+    """
+
+    def __init__(self, points, tile_size: float, margin: float = 0, origin=None):
+        """
+        Inits splitter
+        :param points: PointCloud, (N, 2) array or iterable of points
+        :param tile_size: Side of the tile
+        :param margin: Width of the margin around the tile
+        :param origin: Corner of the grid. If it is None, minimal coordinates of the points are used
+        """
+        if tile_size <= 0:
+            raise ValueError("Tile size must be positive")
+
+        if margin < 0:
+            raise ValueError("Margin must not be negative")
+
+        super().__init__(PointCloud.as_array(points))
+        self._tile_size = tile_size
+        self._margin = margin
+        self._origin = None if origin is None else np.asarray(origin, dtype=np.float64)
 
     def get_areas(self) -> Set[SimpleArea]:
-        pass
+        """
+        Finds tiles, containing points. Points of all tiles are gathered into one buffer in the tile order, and each
+        tile's cloud is a view into it, so points are copied once (points in the margins are repeated). Tiles' x and y
+        are coordinates of their corners
+        :return: Set of tiles, containing at least one point besides the margins
+        """
+        points = self._points
+        if len(points) == 0:
+            return set()
+
+        origin = self._origin if self._origin is not None else points.min(axis=0)
+        cells = np.floor((points - origin) / self._tile_size).astype(np.int64)
+        reach = int(np.ceil(self._margin / self._tile_size))
+
+        # Each point is assigned to its own tile and to the neighbour ones, which margins contain it
+        tiles_list = []
+        indices_list = []
+        for column_shift in range(-reach, reach + 1):
+            for row_shift in range(-reach, reach + 1):
+                tiles = cells + (column_shift, row_shift)
+                lower_bounds = origin + tiles * self._tile_size - self._margin
+                upper_bounds = lower_bounds + self._tile_size + 2 * self._margin
+                is_inside = np.all((points >= lower_bounds) & (points < upper_bounds), axis=1)
+                if column_shift == 0 and row_shift == 0:
+                    # Own tile is not checked to keep points, which are misplaced by rounding
+                    is_inside[:] = True
+                tiles_list.append(tiles[is_inside])
+                indices_list.append(np.flatnonzero(is_inside))
+
+        tiles = np.concatenate(tiles_list)
+        indices = np.concatenate(indices_list)
+
+        min_tile = tiles.min(axis=0)
+        rows_number = int(tiles[:, 1].max() - min_tile[1]) + 1
+        keys = (tiles[:, 0] - min_tile[0]) * rows_number + (tiles[:, 1] - min_tile[1])
+
+        # Tiles, containing margin points only, are skipped
+        own_keys = (cells[:, 0] - min_tile[0]) * rows_number + (cells[:, 1] - min_tile[1])
+        is_kept = np.isin(keys, np.unique(own_keys))
+        keys = keys[is_kept]
+        indices = indices[is_kept]
+        unique_keys, tiles_indices = np.unique(keys, return_inverse=True)
+
+        order = np.lexsort((indices, tiles_indices))
+        buffer = points[indices[order]]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(tiles_indices, minlength=len(unique_keys)))))
+
+        corners = origin + (np.column_stack((unique_keys // rows_number, unique_keys % rows_number)) + min_tile) \
+            * self._tile_size
+
+        areas = set()
+        for (x, y), start, end in zip(corners.tolist(), offsets[:-1].tolist(), offsets[1:].tolist()):
+            areas.add(SimpleArea(x, y, PointCloud(buffer[start:end])))
+
+        return areas
+
+
+def find_in_areas(finder: Finder, areas: Iterable[Area], workers=None) -> List[Area]:
+    """
+    Runs finder on each area in the worker processes
+    :param finder: Finder, which can be pickled
+    :param areas: Areas, e.g. tiles of SimpleAreaSplitter
+    :param workers: Number of worker processes. If it is None, number of CPUs is used, if it is 1, areas are processed
+    in the current process
+    :return: List of processed areas. They are copies of the given ones, if worker processes are used
+    """
+    areas = list(areas)
+    workers = workers if workers is not None else os.cpu_count() or 1
+
+    if workers == 1 or len(areas) < 2:
+        return [finder.find(area) for area in areas]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(areas))) as executor:
+        return list(executor.map(finder.find, areas))
@@ -1,9 +1,10 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Union
 
 import matplotlib.pyplot as plt
-from sympy import Segment, Point2D
+import numpy as np
+from sympy import Segment
 
-from core.base import Polyline, Area
+from core.base import Polyline, Area, PointCloud, PolylinesStore
 
 __author__ = 'Xomak'
 
@@ -28,24 +29,47 @@ class MatplotlibVisualiser:
         }
     }
 
-    def draw_segments(self, segments: List[Segment], style: str, extra_style_params: Dict[str, Any]):
-        for segment in segments:
-            plt.plot((segment.p1.x, segment.p2.x), (segment.p1.y, segment.p2.y), style, **extra_style_params)
+    def draw_segments(self, segments: Union[List[Segment], np.ndarray], style: str, extra_style_params: Dict[str, Any]):
+        """
+        Draws all segments by one plot call, separating them with nan
+        :param segments: List of segments or (M, 4) array of their ends
+        """
+        if isinstance(segments, np.ndarray):
+            ends = segments.reshape((-1, 4))
+        else:
+            ends = np.array([(segment.p1.x, segment.p1.y, segment.p2.x, segment.p2.y) for segment in segments],
+                            dtype=np.float64).reshape((-1, 4))
 
-    def draw_polylines(self, polylines: List[Polyline], style: str, extra_style_params: Dict[str, Any]):
-        for polyline in polylines:
-            if len(polyline.points) > 1:
-                self.draw_segments(polyline.get_segments(), style, extra_style_params)
+        if len(ends) == 0:
+            return
 
-    def draw_points(self, points: List[Point2D], style: str, extra_style_params: Dict[str, Any]):
-        points_x = []
-        points_y = []
+        separators = np.full(len(ends), np.nan)
+        plt.plot(np.column_stack((ends[:, 0], ends[:, 2], separators)).ravel(),
+                 np.column_stack((ends[:, 1], ends[:, 3], separators)).ravel(), style, **extra_style_params)
 
-        for point in points:
-            points_x.append(point.x)
-            points_y.append(point.y)
+    def draw_polylines(self, polylines: Union[PolylinesStore, List[Polyline]], style: str,
+                       extra_style_params: Dict[str, Any]):
+        """
+        Draws all polylines by one plot call, separating them with nan
+        :param polylines: PolylinesStore or list of polylines
+        """
+        if isinstance(polylines, PolylinesStore):
+            vertices, offsets = polylines.vertices, polylines.offsets
+        else:
+            store = PolylinesStore()
+            for polyline in polylines:
+                store.append(polyline)
+            vertices, offsets = store.vertices, store.offsets
 
-        plt.plot(points_x, points_y, style, **extra_style_params)
+        if len(vertices) == 0:
+            return
+
+        vertices = np.insert(vertices, offsets[1:-1], np.nan, axis=0)
+        plt.plot(vertices[:, 0], vertices[:, 1], style, **extra_style_params)
+
+    def draw_points(self, points, style: str, extra_style_params: Dict[str, Any]):
+        np_points = PointCloud.as_array(points)
+        plt.plot(np_points[:, 0], np_points[:, 1], style, **extra_style_params)
 
     def get_style_for(self, object_type: str) -> Tuple[str, Dict[str, Any]]:
         dict_rec = self.STYLE[object_type]
@@ -55,14 +79,14 @@ class MatplotlibVisualiser:
     def draw(self, area: Area, draw_points=True, draw_polylines=True, draw_segments=True):
         if draw_points:
             point_style, points_kwargs = self.get_style_for('points')
-            self.draw_points(area.get_objects(Point2D), point_style, points_kwargs)
+            self.draw_points(area.points, point_style, points_kwargs)
 
         if draw_polylines:
             polylines_style, polylines_kwargs = self.get_style_for('polylines')
-            self.draw_polylines(area.get_objects(Polyline), polylines_style, polylines_kwargs)
+            self.draw_polylines(area.polylines, polylines_style, polylines_kwargs)
 
         if draw_segments:
             segments_style, segments_kwargs = self.get_style_for('segments')
-            self.draw_segments(area.get_objects(Segment), segments_style, segments_kwargs)
+            self.draw_segments(area.segments.ends, segments_style, segments_kwargs)
 
         plt.show()
@@ -1,8 +1,9 @@
 import unittest
 
+import numpy as np
 from sympy import Point2D, Segment
 
-from core.base import Area
+from core.base import Area, PointCloud, Polyline, SegmentsStore, PolylinesStore
 
 __author__ = 'Xomak'
 
@@ -27,3 +28,124 @@ class TestArea(unittest.TestCase):
         a.add_object(Segment, segment)
         self.assertListEqual(a.get_objects(Point2D), [point])
         self.assertListEqual(a.get_objects(Segment), [segment])
+
+    def test_get_objects_points_from_array(self):
+        a = Area(np.array([[1.0, 2.0], [3.5, 4.0]]))
+        self.assertListEqual(a.get_objects(Point2D), [Point2D(1, 2), Point2D(3.5, 4)])
+
+    def test_add_object_point_extends_cloud(self):
+        a = Area()
+        a.add_object(Point2D, Point2D(1, 1))
+        a.add_object(Point2D, Point2D(2, 3))
+        self.assertTrue(np.array_equal(a.points.array, np.array([[1.0, 1.0], [2.0, 3.0]])))
+
+
+class TestPointCloud(unittest.TestCase):
+
+    def test_array_is_read_only_view(self):
+        points = np.array([[1.0, 2.0], [3.0, 4.0]])
+        cloud = PointCloud(points)
+
+        self.assertTrue(np.shares_memory(cloud.array, points))
+        self.assertFalse(cloud.array.flags.writeable)
+
+    def test_from_points_keeps_objects(self):
+        points = [Point2D(1, 2), Point2D(3, 4)]
+        cloud = PointCloud.from_points(points)
+
+        self.assertListEqual(cloud.to_points(), points)
+        self.assertTrue(np.array_equal(cloud.x, np.array([1.0, 3.0])))
+        self.assertTrue(np.array_equal(cloud.y, np.array([2.0, 4.0])))
+
+    def test_append_does_not_modify_source_array(self):
+        points = np.array([[1.0, 2.0]])
+        cloud = PointCloud(points)
+        for i in range(0, 20):
+            cloud.append((i, i))
+
+        self.assertEqual(len(cloud), 21)
+        self.assertTrue(np.array_equal(points, np.array([[1.0, 2.0]])))
+        self.assertEqual(cloud.to_points()[-1], Point2D(19, 19))
+
+    def test_wrong_shape(self):
+        self.assertRaises(ValueError, PointCloud, np.zeros((3, 3)))
+
+
+class TestSegmentsStore(unittest.TestCase):
+
+    def test_add_segments(self):
+        store = SegmentsStore()
+        store.add_segments(np.array([[0, 0, 1, 0], [0, 1, 1, 1]]), [3, 4], [3.0, 4.0], 'first')
+        store.add_segments(np.zeros((20, 4)), source='second')
+
+        self.assertEqual(len(store), 22)
+        self.assertListEqual(store.ends[1].tolist(), [0, 1, 1, 1])
+        self.assertListEqual(store.points_numbers[:3].tolist(), [3, 4, -1])
+        self.assertTrue(np.isnan(store.densities[2]))
+        self.assertListEqual(store.sources[[0, 2]].tolist(), [0, 1])
+        self.assertListEqual(store.source_names, ['first', 'second'])
+
+    def test_views_are_read_only(self):
+        store = SegmentsStore()
+        store.add_segments([[0, 0, 1, 0]])
+
+        self.assertFalse(store.ends.flags.writeable)
+        self.assertRaises(ValueError, store.ends.__setitem__, (0, 0), 1)
+
+    def test_to_segments(self):
+        segment = Segment(Point2D(1, 1), Point2D(2, 2))
+        store = SegmentsStore()
+        store.add_segments([[0, 0, 1, 0]])
+        store.append(segment)
+
+        segments = store.to_segments()
+
+        self.assertListEqual(segments, [Segment(Point2D(0, 0), Point2D(1, 0)), segment])
+        self.assertIs(segments[1], segment)
+        self.assertIs(store.to_segments()[0], segments[0])
+
+
+class TestPolylinesStore(unittest.TestCase):
+
+    def test_add_polylines(self):
+        store = PolylinesStore()
+        store.add_polylines(np.array([[0, 0], [1, 0], [5, 5], [6, 5], [7, 5]]), [0, 2, 5])
+        store.add_polylines(np.array([[9, 9], [9, 8], [9, 7]]), [1, 3])
+
+        self.assertEqual(len(store), 3)
+        self.assertListEqual(store.offsets.tolist(), [0, 2, 5, 7])
+        self.assertListEqual(store.get_vertices(2).tolist(), [[9, 8], [9, 7]])
+
+    def test_to_polylines(self):
+        polyline = Polyline()
+        polyline.add(Point2D(1, 1))
+        polyline.add(Point2D(2, 1))
+        store = PolylinesStore()
+        store.append(polyline)
+        store.add_polylines(np.array([[0, 0], [0, 1]]), [0, 2])
+
+        polylines = store.to_polylines()
+
+        self.assertIs(polylines[0], polyline)
+        self.assertListEqual(polylines[1].points, [Point2D(0, 0), Point2D(0, 1)])
+        self.assertListEqual(store.vertices.tolist(), [[1, 1], [2, 1], [0, 0], [0, 1]])
+
+
+class TestAreaObjectsStores(unittest.TestCase):
+
+    def test_add_segments(self):
+        a = Area()
+        a.add_segments([[0, 0, 1, 0]], source='finder')
+        a.add_object(Segment, Segment(Point2D(1, 1), Point2D(2, 2)))
+
+        self.assertEqual(len(a.segments), 2)
+        self.assertListEqual(a.get_objects(Segment), [Segment(Point2D(0, 0), Point2D(1, 0)),
+                                                      Segment(Point2D(1, 1), Point2D(2, 2))])
+
+    def test_add_polylines(self):
+        a = Area()
+        a.add_polylines(np.array([[0, 0], [1, 0]]), [0, 2])
+
+        self.assertEqual(len(a.polylines), 1)
+        self.assertListEqual(a.get_objects(Polyline)[0].points, [Point2D(0, 0), Point2D(1, 0)])
+
@@ -52,3 +52,51 @@ class PointsToImageRoundBasedConverterTest(unittest.TestCase):
 
         self.assertEqual(inverse_converter.convert(Point2D(0, 0)), Point2D(10, 10))
         self.assertEqual(inverse_converter.convert(Point2D(1, 1)), Point2D(11, 11))
+
+    def test_find_cloud_params(self):
+        points = [Point2D(3, 10), Point2D(-2, 4.5), Point2D(7, 4), Point2D(1, -6)]
+        params = PointsToImageRoundBasedConverter.find_cloud_params(points)
+
+        self.assertEqual(params, PointsToImageRoundBasedConverter.CloudParams(-2, 7, -6, 10, 0.5))
+
+    def test_find_cloud_params_one_point(self):
+        params = PointsToImageRoundBasedConverter.find_cloud_params(np.array([[1.0, 2.0]]))
+
+        self.assertEqual(params, PointsToImageRoundBasedConverter.CloudParams(1, 1, 2, 2, None))
+
+    def test_convert_cell_size(self):
+        points = np.array([[0.0, 0.0], [9.0, 1.0], [21.0, 30.0]])
+        image_reference = np.zeros((4, 3), dtype=int)
+        image_reference[0, 0] = 1
+        image_reference[0, 1] = 1
+        image_reference[3, 2] = 1
+
+        converter = PointsToImageRoundBasedConverter(cell_size=10)
+        image, inverse_converter = converter.convert(points)
+
+        self.assertTrue(np.array_equal(image, image_reference))
+        self.assertEqual(image.dtype, np.uint8)
+        self.assertEqual(inverse_converter.convert(Point2D(2, 3)), Point2D(20, 30))
+        self.assertTrue(np.array_equal(inverse_converter.convert_array(np.array([[2, 3]])), np.array([[20.0, 30.0]])))
+
+    def test_convert_round_trip(self):
+        # Minimum is not aligned to the grid
+        points = np.array([[4.0, 4.0], [54.0, 14.0], [6.0, 26.0], [14.0, 36.0]])
+
+        converter = PointsToImageRoundBasedConverter(min_precision=0.0, cell_size=10)
+        image, inverse_converter = converter.convert(points)
+        rows, columns = np.nonzero(image)
+        cells = inverse_converter.convert_array(np.column_stack((columns, rows)))
+
+        self.assertSetEqual({tuple(cell) for cell in cells.tolist()}, {(0, 0), (50, 10), (10, 30), (10, 40)})
+        for point in points:
+            self.assertLessEqual(np.abs(cells - point).max(axis=1).min(), 5)
+
+    def test_convert_sparse(self):
+        points = [Point2D(10.4, 10.3), Point2D(11.3, 11.4), Point2D(11.2, 11.1)]
+
+        dense_image, _ = PointsToImageRoundBasedConverter(min_precision=0.0).convert(points)
+        sparse_image, _ = PointsToImageRoundBasedConverter(min_precision=0.0, sparse=True).convert(points)
+
+        self.assertEqual(sparse_image.nnz, 2)
+        self.assertTrue(np.array_equal(sparse_image.toarray(), dense_image))
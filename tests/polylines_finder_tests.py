@@ -1,5 +1,6 @@
 import unittest
 
+import numpy as np
 from sympy import Point2D
 
 from core.base import Area, Polyline
@@ -61,3 +62,24 @@ class TestPolylinesFinder(unittest.TestCase):
         finder = PolylinesFinder(epsilon=0.5)
         finder.find(area)
         self.assertListEqual(area.get_objects(Polyline), [polyline])
+
+    def test_find_polyline_offsets(self):
+        points = np.array([[0, 0], [1, 0], [5, 0], [5.5, 0], [6, 0], [20, 0]])
+
+        finder = PolylinesFinder(epsilon=2)
+        np.testing.assert_array_equal(finder.find_polyline_offsets(points), [0, 2, 5, 6])
+
+    def test_find_polyline_offsets_range_factor(self):
+        points = np.array([[1, 0], [2, 0], [100, 0], [104, 0], [115, 0]])
+
+        finder = PolylinesFinder(epsilon=2, range_factor=0.05)
+        np.testing.assert_array_equal(finder.find_polyline_offsets(points), [0, 2, 4, 5])
+
+    def test_split_polylines(self):
+        points = np.array([[0, 0], [1, 0], [5, 0]])
+
+        polylines = PolylinesFinder(epsilon=2).split_polylines(points)
+
+        self.assertEqual(len(polylines), 2)
+        np.testing.assert_array_equal(polylines[0], [[0, 0], [1, 0]])
+        self.assertFalse(polylines[0].flags.owndata)
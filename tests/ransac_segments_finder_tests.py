@@ -1,9 +1,10 @@
 import unittest
 import math
 
+import numpy as np
 from sympy import Point2D, Segment, pi
 
-from core.finders.ransac import RansacSegmentsFinder
+from core.finders.ransac import RansacSegmentsFinder, LineRansac
 
 __author__ = 'Xomak'
 
@@ -49,4 +50,41 @@ class RansacSegmentsFinderTest(unittest.TestCase):
             self.assertEqual(1, found_similarities)
             segments_reference.remove(similar)
 
+    def test_find_segments_in_points_vertical(self):
+        points = np.array([[5.0, y] for y in range(0, 10)] + [[20.0, 30.0], [-7.0, 12.0]])
 
+        finder = RansacSegmentsFinder(0.001, 1.1, random_state=0)
+        segments = finder.find_segments_in_points(points)
+
+        self.assertTrue(any(self.are_segments_close(segment, Segment(Point2D(5, 0), Point2D(5, 9)))
+                            or self.are_segments_close(segment, Segment(Point2D(5, 9), Point2D(5, 0)))
+                            for segment in segments))
+
+    def test_find_segments_in_points_gap(self):
+        points = np.array([[x, 2.0] for x in range(0, 10)] + [[x, 2.0] for x in range(15, 25)])
+
+        finder = RansacSegmentsFinder(0.001, 1.1, random_state=0)
+        segments = finder.find_segments_in_points(points)
+
+        self.assertEqual(len(segments), 2)
+
+
+class LineRansacTest(unittest.TestCase):
+
+    def test_fit_with_outliers(self):
+        random_state = np.random.RandomState(1)
+        line_points = np.column_stack((np.arange(0, 50.0), 2 * np.arange(0, 50.0) + 1))
+        outliers = random_state.uniform(-100, 100, (20, 2))
+        points = np.vstack((line_points, outliers))
+
+        found_line = LineRansac(0.01, random_state=2).fit(points)
+
+        self.assertTrue(found_line.inliers[:50].all())
+        self.assertAlmostEqual(found_line.direction[1] / found_line.direction[0], 2.0, delta=1e-6)
+
+    def test_required_trials(self):
+        line_ransac = LineRansac(1, confidence=0.99)
+
+        self.assertEqual(line_ransac.required_trials(1.0), 0)
+        self.assertEqual(line_ransac.required_trials(0.5), 17)
+        self.assertEqual(line_ransac.required_trials(0.0), math.inf)
@@ -1,5 +1,7 @@
 import unittest
 
+import numpy as np
+
 from sympy import Point2D, Segment
 
 from core.base import Polyline, Area
@@ -55,3 +57,43 @@ class RDPSegmentsFinderTest(unittest.TestCase):
         segments = finder.find_segments_in_polylines([polyline])
 
         self.assertSetEqual(set(segments),  segments_reference)
+
+    def test_find_mask_closed_polyline(self):
+        points = np.array([[0, 0], [2, 1], [4, 0], [2, -3], [0, 0]])
+
+        mask = RDPSegmentsFinder.find_mask(points, 0.5)
+
+        np.testing.assert_array_equal(mask, [True, True, True, True, True])
+
+    def test_find_mask_first_farthest_point(self):
+        points = np.array([[0, 0], [1, 1], [2, 0], [3, 1], [4, 0]])
+
+        mask = RDPSegmentsFinder.find_mask(points, 0.5)
+
+        np.testing.assert_array_equal(mask, [True, True, True, True, True])
+        np.testing.assert_array_equal(RDPSegmentsFinder.find_mask(points, 1.5), [True, False, False, False, True])
+
+    def test_segment_distances(self):
+        points = np.array([[0, 1], [-3, 4], [5, -1], [2, 0]])
+
+        distances = RDPSegmentsFinder.segment_distances(points, np.array([0, 0]), np.array([2, 0]))
+
+        np.testing.assert_array_almost_equal(distances, [1, 5, 3.16227766, 0])
+
+    def test_find_masks(self):
+        first = np.array([[0, 0], [1, 1], [2, 2], [3, 3]])
+        second = np.array([[0, 0], [2, 1], [4, 0], [2, -3], [0, 0]])
+        third = np.array([[5, 5]])
+        points = np.vstack((first, second, third))
+
+        mask = RDPSegmentsFinder.find_masks(points, [0, 4, 9, 9, 10], 0.5)
+
+        np.testing.assert_array_equal(mask, np.concatenate((RDPSegmentsFinder.find_mask(first, 0.5),
+                                                            RDPSegmentsFinder.find_mask(second, 0.5), [True])))
+
+    def test_find_segments_array(self):
+        points = np.array([[0, 0], [1, 1], [2, 2], [3, 3], [10, 0], [10, 4], [14, 4]])
+
+        segments = RDPSegmentsFinder(epsilon=0.5).find_segments_array(points, [0, 4, 7])
+
+        np.testing.assert_array_equal(segments, [[0, 0, 3, 3], [10, 0, 10, 4], [10, 4, 14, 4]])
@@ -3,9 +3,11 @@ import tempfile
 import unittest
 from os import path
 
+import numpy as np
 from sympy import Point2D
 
-from core.readers import XYFileReader, XYFileAreaReader
+from core.readers import XYFileReader, XYFileAreaReader, XYFileIndex, XYBinaryFileWriter, XYBinaryFileReader, \
+    XYBinaryFileAreaReader
 
 
 class TestXYFileReader(unittest.TestCase):
@@ -25,6 +27,17 @@ class TestXYFileReader(unittest.TestCase):
         assert abs(points[0][0] - 1.0) < 1e-6 and abs(points[0][1] - 2.0) < 1e-6
         assert abs(points[1][0] - 3.0) < 1e-6 and abs(points[1][1] - 2.0) < 1e-6
 
+    def test_parse_array(self):
+        test_str = "222: (1;2;0), (-3.5;2e2;0),  \t\n"
+        timestamp, points = XYFileReader.parse_file_line_array(test_str)
+
+        self.assertEqual(timestamp, 222)
+        self.assertTrue(np.array_equal(points, np.array([[1.0, 2.0], [-3.5, 200.0]])))
+        self.assertTrue(points.flags.c_contiguous)
+
+    def test_parse_array_wrong_point(self):
+        self.assertRaises(IOError, XYFileReader.parse_file_line_array, "222: (1;2;0), (3;2)")
+
 
 class TestXYFileAreaReader(unittest.TestCase):
 
@@ -42,6 +55,39 @@ class TestXYFileAreaReader(unittest.TestCase):
         area = XYFileAreaReader.get_area(file_path)
         assert area.get_objects(Point2D) == [Point2D(-114.352, -201.86), Point2D(-113.112, -202.558)]
 
+    def test_get_data_several_lines(self):
+        file_path = path.join(self.test_dir, 'test1.txt')
+        with open(file_path, 'w') as f:
+            f.write("1:(1;2;0),(3;4;0),\n2:(5;6;0),\n")
+
+        data = XYFileReader.get_data(file_path)
+        self.assertDictEqual(data, {1: [Point2D(1, 2), Point2D(3, 4)], 2: [Point2D(5, 6)]})
+
+    def test_iter_areas_range_and_stride(self):
+        file_path = path.join(self.test_dir, 'test1.txt')
+        with open(file_path, 'w') as f:
+            for timestamp in range(0, 10):
+                f.write("{}:({};1;0),\n".format(timestamp, timestamp + 1))
+
+        frames = list(XYFileAreaReader.iter_areas(file_path, start_timestamp=2, end_timestamp=8, stride=3))
+
+        self.assertListEqual([timestamp for timestamp, area in frames], [2, 5, 8])
+        self.assertListEqual(frames[1][1].get_objects(Point2D), [Point2D(6, 1)])
+
+    def test_get_area_several_frames(self):
+        file_path = path.join(self.test_dir, 'test1.txt')
+        with open(file_path, 'w') as f:
+            f.write("1:(1;2;0),\n2:(5;6;0),\n")
+
+        self.assertRaises(NotImplementedError, XYFileAreaReader.get_area, file_path)
+
+    def test_get_area_stops_at_second_frame(self):
+        file_path = path.join(self.test_dir, 'test1.txt')
+        with open(file_path, 'w') as f:
+            f.write("1:(1;2;0),\n2:(5;6;0),\nbroken line\n")
+
+        self.assertRaises(NotImplementedError, XYFileAreaReader.get_area, file_path)
+
     def test_get_area_duplicates(self):
         file_path = path.join(self.test_dir, 'test1.txt')
         with open(file_path, 'w') as f:
@@ -63,4 +109,93 @@ class TestXYFileAreaReader(unittest.TestCase):
         self.assertListEqual(area.get_objects(Point2D), [Point2D(0, 0), Point2D(-113.112, -202.558)])
 
         area = XYFileAreaReader.get_area(file_path, ignore_zero_point=True)
-        self.assertListEqual(area.get_objects(Point2D), [Point2D(-113.112, -202.558)])
\ No newline at end of file
+        self.assertListEqual(area.get_objects(Point2D), [Point2D(-113.112, -202.558)])
+
+
+class TestXYFileIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.file_path = path.join(self.test_dir, 'test1.xy')
+        with open(self.file_path, 'w') as f:
+            for timestamp in range(0, 10):
+                f.write("{}:({};1;0),\n".format(10 * timestamp, timestamp + 1))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_open_saves_sidecar(self):
+        index = XYFileIndex.open(self.file_path)
+
+        self.assertTrue(path.exists(XYFileIndex.get_sidecar_path(self.file_path)))
+        loaded_index = XYFileIndex.load(self.file_path)
+        self.assertTrue(np.array_equal(loaded_index.timestamps, index.timestamps))
+        self.assertTrue(np.array_equal(loaded_index.offsets, index.offsets))
+
+    def test_load_stale(self):
+        XYFileIndex.open(self.file_path)
+        with open(self.file_path, 'a') as f:
+            f.write("100:(1;1;0),\n")
+
+        self.assertIsNone(XYFileIndex.load(self.file_path))
+        self.assertEqual(len(XYFileIndex.open(self.file_path)), 11)
+
+    def test_read_frame(self):
+        index = XYFileIndex.open(self.file_path)
+        timestamp, points = index.read_frame(7)
+
+        self.assertEqual(timestamp, 70)
+        self.assertTrue(np.array_equal(points, np.array([[8.0, 1.0]])))
+
+    def test_iter_areas_with_index(self):
+        index = XYFileIndex.open(self.file_path)
+        frames = list(XYFileAreaReader.iter_areas(self.file_path, start_timestamp=15, end_timestamp=60, stride=2,
+                                                  index=index))
+
+        self.assertListEqual([timestamp for timestamp, area in frames], [20, 40, 60])
+        self.assertListEqual(frames[1][1].get_objects(Point2D), [Point2D(5, 1)])
+
+    def test_iter_areas_with_index_of_other_file(self):
+        index = XYFileIndex(self.file_path + '.other', np.array([10]), np.array([0]))
+
+        self.assertRaises(ValueError, list, XYFileAreaReader.iter_areas(self.file_path, index=index))
+
+
+class TestXYBinaryFile(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.file_path = path.join(self.test_dir, 'test1.xy')
+        self.binary_file_path = path.join(self.test_dir, 'test1.xyb')
+        with open(self.file_path, 'w') as f:
+            f.write("10:(1.5;2;0),(0;0;0),(3;4;0),\n20:(5;6;0),\n30:(7.25;8;0),(9;10;0),\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_convert_and_read(self):
+        XYBinaryFileWriter.convert(self.file_path, self.binary_file_path)
+        reader = XYBinaryFileReader(self.binary_file_path)
+
+        self.assertEqual(len(reader), 3)
+        self.assertListEqual(reader.timestamps.tolist(), [10, 20, 30])
+        self.assertTrue(np.array_equal(reader.get_points(2), np.array([[7.25, 8.0], [9.0, 10.0]])))
+        self.assertIsInstance(reader.get_points(0), np.memmap)
+
+    def test_convert_float32(self):
+        XYBinaryFileWriter.convert(self.file_path, self.binary_file_path, dtype=np.float32)
+        reader = XYBinaryFileReader(self.binary_file_path)
+
+        self.assertEqual(reader.get_points(0).dtype.itemsize, 4)
+        self.assertTrue(np.array_equal(reader.get_points(0), np.array([[1.5, 2.0], [0.0, 0.0], [3.0, 4.0]])))
+
+    def test_area_reader(self):
+        XYBinaryFileWriter.convert(self.file_path, self.binary_file_path)
+
+        frames = list(XYBinaryFileAreaReader.iter_areas(self.binary_file_path, start_timestamp=10, stride=2))
+        self.assertListEqual([timestamp for timestamp, area in frames], [10, 30])
+        self.assertListEqual(frames[0][1].get_objects(Point2D), [Point2D(1.5, 2), Point2D(3, 4)])
+
+        timestamp, area = XYBinaryFileAreaReader.get_frame_area(self.binary_file_path, 2)
+        self.assertEqual(timestamp, 30)
+        self.assertFalse(area.points.array.flags.owndata)
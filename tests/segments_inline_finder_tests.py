@@ -1,7 +1,10 @@
+import math
 import unittest
 
-from sympy import Line, Point2D, sqrt, Segment
+import numpy as np
+from sympy import Line, Line2D, Point2D, sqrt, Segment
 
+from core.base import Area
 from core.finders.segments import SegmentsInLineFinder
 
 __author__ = 'Xomak'
@@ -56,6 +59,20 @@ class SegmentsInlineFinderTest(unittest.TestCase):
 
         self.assertListEqual(points_test, points_reference)
 
+    def test_project_on_line_float_slope(self):
+        # Angle between the float line and the ray along it is not exactly zero
+        slope, offset = 0.0709297482015403, 450.4636963259353
+        line = Line2D(p1=Point2D(0, offset), slope=slope)
+        points = [Point2D(x, slope * x + offset) for x in np.arange(1, 8) * 3.7]
+
+        projected_points = SegmentsInLineFinder.project_on_line(line, points)
+        found_segments = SegmentsInLineFinder.find_segments_with_density(line, points, 4)
+
+        self.assertListEqual([projected_point.point for projected_point in projected_points], points)
+        self.assertEqual(len(found_segments), 1)
+        self.assertEqual(found_segments[0].points_number, 7)
+        self.assertAlmostEqual(float(found_segments[0].segment.length), 6 * 3.7 * math.hypot(1, slope), places=6)
+
     def test_find_segments_one_segment(self):
         line = Line(Point2D(0, 0), Point2D(10, 0))
         points_coords = (
@@ -89,3 +106,23 @@ class SegmentsInlineFinderTest(unittest.TestCase):
         segments_test = SegmentsInLineFinder.find_segments(line, points, 6)
 
         self.assertListEqual(segments_reference, segments_test)
+
+    def test_find_segments_in_lines(self):
+        lines = np.array([[0, 0, 1, 0], [0, 10, 1, 0]])
+        points = np.array([[0, 1], [2, -1], [4, 0], [20, 0], [21, 0], [0, 9], [3, 11], [50, 50]])
+
+        found_segments = SegmentsInLineFinder.find_segments_in_lines(lines, points, 2, 5)
+
+        np.testing.assert_array_almost_equal(found_segments.ends, [[0, 0, 4, 0], [20, 0, 21, 0], [0, 10, 3, 10]])
+        np.testing.assert_array_equal(found_segments.points_numbers, [3, 2, 2])
+        np.testing.assert_array_equal(found_segments.lines, [0, 0, 1])
+
+    def test_find(self):
+        points = [Point2D(3, 1), Point2D(7, -1), Point2D(1, 4), Point2D(2, 8)]
+        area = Area(points)
+
+        SegmentsInLineFinder(tolerance=2, epsilon=5, lines=[Line(Point2D(0, 0), Point2D(1, 0)),
+                                                            Line(Point2D(0, 0), Point2D(1, 4))]).find(area)
+
+        self.assertListEqual(area.get_objects(Segment), [Segment(Point2D(3, 0), Point2D(7, 0)),
+                                                         Segment(Point2D(1, 4), Point2D(2, 8))])
@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from core.base import SimpleArea, Polyline
+from core.finders.polylines import PolylinesFinder
+from core.splitters import SimpleAreaSplitter, find_in_areas
+
+
+class TestSimpleAreaSplitter(unittest.TestCase):
+
+    def test_get_areas(self):
+        points = np.array([[0, 0], [1, 1], [3, 0.5], [0.5, 2.5], [3.5, 3.5]])
+
+        areas = SimpleAreaSplitter(points, tile_size=2).get_areas()
+        tiles = {(area.x, area.y): area.points.array.tolist() for area in areas}
+
+        self.assertDictEqual(tiles, {(0, 0): [[0, 0], [1, 1]],
+                                     (2, 0): [[3, 0.5]],
+                                     (0, 2): [[0.5, 2.5]],
+                                     (2, 2): [[3.5, 3.5]]})
+        self.assertTrue(all(isinstance(area, SimpleArea) for area in areas))
+
+    def test_get_areas_margin(self):
+        points = np.array([[0, 0], [1.9, 0], [2.1, 0], [3.9, 0]])
+
+        areas = SimpleAreaSplitter(points, tile_size=2, margin=0.5, origin=(0, 0)).get_areas()
+        tiles = {(area.x, area.y): area.points.array.tolist() for area in areas}
+
+        self.assertDictEqual(tiles, {(0, 0): [[0, 0], [1.9, 0], [2.1, 0]],
+                                     (2, 0): [[1.9, 0], [2.1, 0], [3.9, 0]]})
+
+    def test_get_areas_sparse(self):
+        points = np.array([[0, 0], [1e5, 1e5]])
+
+        areas = SimpleAreaSplitter(points, tile_size=0.01, margin=0.01).get_areas()
+        tiles = {(round(area.x, 6), round(area.y, 6)): area.points.array.tolist() for area in areas}
+
+        self.assertDictEqual(tiles, {(0, 0): [[0, 0]], (1e5, 1e5): [[1e5, 1e5]]})
+
+    def test_get_areas_views(self):
+        points = np.random.RandomState(0).uniform(0, 10, (100, 2))
+
+        areas = SimpleAreaSplitter(points, tile_size=3).get_areas()
+        bases = {id(area.points.array.base.base) for area in areas}
+
+        self.assertEqual(len(bases), 1)
+        self.assertEqual(sum(len(area.points) for area in areas), 100)
+
+    def test_find_in_areas(self):
+        points = np.array([[0, 0], [1, 0], [2, 0], [10, 10], [10, 11], [10, 12]])
+        areas = SimpleAreaSplitter(points, tile_size=5).get_areas()
+
+        found_areas = find_in_areas(PolylinesFinder(epsilon=1.5), areas, workers=2)
+        polylines_lengths = sorted(len(polyline.points) for area in found_areas
+                                   for polyline in area.get_objects(Polyline))
+
+        self.assertListEqual(polylines_lengths, [3, 3])
@@ -2,7 +2,8 @@ import unittest
 
 import numpy as np
 
-from core.finders.hough import HoughTransformSegmentsFinder
+from core.finders.hough import HoughTransformSegmentsFinder, PointsHoughTransformSegmentsFinder, HoughAccumulator, \
+    PyramidHoughTransformSegmentsFinder
 
 
 class TestHoughTransformFinder(unittest.TestCase):
@@ -20,3 +21,78 @@ class TestHoughTransformFinder(unittest.TestCase):
         hough_lines = hough_transform_finder._find_segments_in_image(img)
 
         self.assertEqual(len(hough_lines), 4)
+
+
+class TestPointsHoughTransformFinder(unittest.TestCase):
+
+    @staticmethod
+    def get_square_points():
+        coordinates = np.arange(0, 20, dtype=float)
+        zeros = np.zeros(20)
+        return np.vstack((np.column_stack((coordinates, zeros)),
+                          np.column_stack((zeros + 19, coordinates)),
+                          np.column_stack((coordinates, zeros + 19)),
+                          np.column_stack((zeros, coordinates))))
+
+    def test_find_segments_square(self):
+        finder = PointsHoughTransformSegmentsFinder(threshold=5, line_length=10, line_gap=2, rho_resolution=0.5)
+        segments = finder.find_segments_array(self.get_square_points())
+
+        self.assertEqual(len(segments), 4)
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        self.assertTrue(np.all(lengths > 16.5))
+
+    def test_find_segments_gap(self):
+        points = np.column_stack((np.concatenate((np.arange(0, 20), np.arange(40, 60))), np.full(40, 5.0)))
+        finder = PointsHoughTransformSegmentsFinder(threshold=5, line_length=10, line_gap=5, rho_resolution=0.5)
+        segments = finder.find_segments_array(points)
+
+        self.assertEqual(len(segments), 2)
+        self.assertTrue(np.allclose(np.sort(np.sort(segments[:, [0, 2]], axis=1), axis=0), [[0, 19], [40, 59]]))
+        self.assertTrue(np.allclose(segments[:, [1, 3]], 5.0))
+
+    def test_accumulator_reuse(self):
+        accumulator = HoughAccumulator(rho_resolution=0.5)
+        finder = PointsHoughTransformSegmentsFinder(threshold=5, line_length=10, line_gap=2, accumulator=accumulator)
+
+        finder.find_segments_array(self.get_square_points() * 2)
+        votes = accumulator.votes
+        segments = finder.find_segments_array(self.get_square_points())
+
+        self.assertTrue(np.shares_memory(votes, accumulator.votes))
+        self.assertEqual(len(segments), 4)
+
+    def test_find_segments_inclined_line(self):
+        x_values = np.arange(0, 200, dtype=float)
+        points = np.column_stack((x_values, x_values * 0.02 + 3))
+        finder = PointsHoughTransformSegmentsFinder(threshold=5, line_length=10, line_gap=2,
+                                                    theta_resolution=np.pi / 90, rho_resolution=0.5)
+
+        segments = finder.find_segments_array(points)
+
+        self.assertEqual(len(segments), 1)
+        self.assertTrue(np.allclose(segments[0, [1, 3]], segments[0, [0, 2]] * 0.02 + 3))
+
+
+class TestPyramidHoughTransformFinder(unittest.TestCase):
+
+    def test_find_segments_square(self):
+        finder = PyramidHoughTransformSegmentsFinder(threshold=5, line_length=10, line_gap=2, rho_resolution=0.25,
+                                                     levels=3, factor=2)
+        segments = finder.find_segments_array(TestPointsHoughTransformFinder.get_square_points())
+
+        self.assertEqual(len(segments), 4)
+        self.assertEqual(finder.accumulator.rho_resolution, 1.0)
+
+    def test_find_segments_inclined_line_precise(self):
+        angle = 0.3
+        distances = np.arange(0, 2000, 10, dtype=float)
+        points = np.column_stack((100 + distances * np.cos(angle), -50 + distances * np.sin(angle)))
+
+        finder = PyramidHoughTransformSegmentsFinder(threshold=10, line_length=100, line_gap=20, rho_resolution=1.0,
+                                                     levels=3, factor=4)
+        segments = finder.find_segments_array(points)
+
+        self.assertEqual(len(segments), 1)
+        ends = np.sort(segments.reshape((2, 2)), axis=0)
+        self.assertTrue(np.allclose(ends, np.sort(points[[0, -1]], axis=0), atol=1e-3))
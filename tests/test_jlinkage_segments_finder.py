@@ -0,0 +1,94 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sympy import Segment
+
+from core.base import Area
+from core.finders.jlinkage import JLinkageSegmentsFinder
+from core.spatial import SpatialIndex
+
+
+class TestJLinkageSegmentsFinder(unittest.TestCase):
+
+    @staticmethod
+    def get_corner_points():
+        coordinates = np.arange(0, 30, dtype=float)
+        horizontal = np.column_stack((coordinates, np.zeros(30)))
+        vertical = np.column_stack((np.full(30, 40.0), coordinates + 5))
+        return np.vstack((horizontal, vertical))
+
+    def test_cluster_two_lines(self):
+        finder = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=200, sampling_radius=5, workers=1, random_state=0)
+        points = self.get_corner_points()
+        labels = finder.cluster(finder.find_preferences(points))
+
+        self.assertEqual(len(np.unique(labels[:30])), 1)
+        self.assertEqual(len(np.unique(labels[30:])), 1)
+        self.assertNotEqual(labels[0], labels[30])
+
+    def test_fit_lines(self):
+        finder = JLinkageSegmentsFinder(0.1, 2, min_points=3)
+        points = self.get_corner_points()
+        labels = np.array([7] * 30 + [3] * 29 + [5])
+
+        origins, directions, new_labels = finder.fit_lines(points, labels)
+
+        self.assertEqual(len(origins), 2)
+        self.assertEqual(new_labels[-1], -1)
+        self.assertAlmostEqual(abs(directions[new_labels[0], 0]), 1.0)
+        self.assertAlmostEqual(abs(directions[new_labels[30], 1]), 1.0)
+
+    def test_find_workers(self):
+        points = self.get_corner_points()
+        results = []
+        for workers in (1, 2):
+            finder = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=200, sampling_radius=5, workers=workers,
+                                            random_state=0)
+            results.append(finder.find_preferences(points))
+
+        self.assertTrue(np.array_equal(results[0], results[1]))
+
+    def test_find_executor(self):
+        points = self.get_corner_points()
+        reference = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=200, sampling_radius=5, random_state=0)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            finder = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=200, sampling_radius=5, workers=2,
+                                            random_state=0, executor=executor)
+            preferences = finder.find_preferences(points)
+
+        self.assertEqual(reference.workers, 1)
+        self.assertTrue(np.array_equal(preferences, reference.find_preferences(points)))
+
+    def test_find_segments(self):
+        area = Area(self.get_corner_points())
+        finder = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=200, sampling_radius=5, workers=1, random_state=0)
+        segments = finder.find_segments_in_points(area.points)
+
+        self.assertEqual(len(segments), 2)
+        self.assertSetEqual({float(segment.length) for segment in segments}, {29.0})
+
+    def test_find_segments_too_many_points(self):
+        finder = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=200, workers=1, random_state=0, max_points=50)
+
+        with self.assertRaises(ValueError):
+            finder.find_segments_array(self.get_corner_points())
+
+    def test_sample_hypotheses_by_distance(self):
+        points = np.random.RandomState(1).permutation(self.get_corner_points())
+        finder = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=500, workers=1, random_state=0, sampling_distance=3)
+
+        pairs = finder.sample_hypotheses(len(points), SpatialIndex(points))
+        lengths = np.hypot(*(points[pairs[:, 1]] - points[pairs[:, 0]]).T)
+
+        self.assertTrue(np.all(pairs[:, 0] != pairs[:, 1]))
+        self.assertTrue(np.all(lengths <= 3))
+
+    def test_find_segments_unordered(self):
+        area = Area(np.random.RandomState(1).permutation(self.get_corner_points()))
+        finder = JLinkageSegmentsFinder(0.1, 2, hypotheses_number=200, workers=1, random_state=0, sampling_distance=3)
+        finder.find(area)
+
+        segments = area.get_objects(Segment)
+        self.assertEqual(len(segments), 2)
+        self.assertSetEqual({float(segment.length) for segment in segments}, {29.0})
@@ -1,9 +1,12 @@
 import math
 import unittest
 
+import numpy as np
 from sympy import Point2D
 
 from core.finders.lineregression import LinearRegressionEntity, LinearRegressionCoordinator, LineRegressionSegmentsFinder
+from core.finders.lineregression import LinearRegressionStatistics, inverse_covariances, weighted_means, \
+    OrthogonalRegressionEntity
 
 
 class TestLineRegressionSegmentsFinder(unittest.TestCase):
@@ -54,6 +57,61 @@ class TestLineRegressionSegmentsFinder(unittest.TestCase):
         entities = finder._perform_segmentation(points)
         self.assertEqual(len(entities), 4)
 
+    def test_square_segmentation_orthogonal(self):
+        points = []
+
+        for i in range(0, 20):
+            points.append(Point2D(i*0.1, 0.0))
+        for i in range(0, 20):
+            points.append(Point2D(2.0, i*0.1))
+        for i in range(0, 20):
+            points.append(Point2D(2.0 - i*0.1, 2.0))
+        for i in range(0, 20):
+            points.append(Point2D(0.0, 2.0 - i * 0.1))
+
+        finder = LineRegressionSegmentsFinder(7, 0.5, 0.5, line_model='orthogonal', noise_sigma=0.01)
+        entities = finder._perform_segmentation(points)
+        self.assertEqual(len(entities), 4)
+
+
+class TestOrthogonalRegression(unittest.TestCase):
+
+    def test_vertical_line(self):
+        points = np.array([[5, 0], [5, 1], [5, 2], [5, 3]])
+        entity = OrthogonalRegressionEntity(points, noise_sigma=0.1)
+
+        self.assertAlmostEqual(entity.angle % np.pi, 0, delta=1e-9)
+        self.assertAlmostEqual(abs(entity.distance), 5, delta=1e-9)
+        self.assertTrue(np.all(np.linalg.eigvalsh(entity.covariance) > 0))
+
+    def test_collinear_points_default_noise(self):
+        points = np.array([[0, 0], [10, 10], [20, 20]])
+        entity = OrthogonalRegressionEntity(points)
+
+        self.assertTrue(np.all(np.linalg.eigvalsh(entity.covariance) > 0))
+        self.assertTrue(np.allclose(inverse_covariances(entity.covariance[np.newaxis])[0],
+                                    np.linalg.inv(entity.covariance)))
+
+    def test_parameters_covariance(self):
+        points = np.array([[0, 1], [1, 0.9], [2, 1.1], [3, 1], [4, 1.05]])
+        entity = OrthogonalRegressionEntity(points)
+
+        along = 2.0
+        angle_variance = entity.covariance[0, 0]
+        self.assertAlmostEqual(entity.angle, np.pi / 2, delta=0.05)
+        self.assertAlmostEqual(entity.covariance[0, 1], -along * angle_variance, delta=0.1 * angle_variance)
+
+    def test_aligned_mahalanobis_distance_sqr(self):
+        entity1 = OrthogonalRegressionEntity(angle=0.01, distance=5.0, covariance=np.eye(2) * 0.01)
+        entity2 = OrthogonalRegressionEntity(angle=np.pi - 0.01, distance=-5.0, covariance=np.eye(2) * 0.01)
+
+        d = OrthogonalRegressionEntity.mahalanobis_distance_sqr(entity1, entity2)
+        self.assertAlmostEqual(d, 0.02 ** 2 / 0.02, delta=1e-9)
+
+        weighted_entity = OrthogonalRegressionEntity.weighted_mean_entity([entity1, entity2])
+        self.assertAlmostEqual(weighted_entity.angle, 0, delta=1e-9)
+        self.assertAlmostEqual(weighted_entity.distance, 5, delta=1e-9)
+
 
 class TestLinearRegression(unittest.TestCase):
 
@@ -99,8 +157,32 @@ class TestLinearRegression(unittest.TestCase):
         entity = LinearRegressionEntity(points)
 
         weighted_entity = LinearRegressionEntity.weighted_mean_entity([entity])
-        self.assertAlmostEquals(first=entity.slope, second=weighted_entity.slope, delta=1e-6)
-        self.assertAlmostEquals(first=entity.offset, second=weighted_entity.offset, delta=1e-6)
+        self.assertAlmostEqual(first=entity.slope, second=weighted_entity.slope, delta=1e-6)
+        self.assertAlmostEqual(first=entity.offset, second=weighted_entity.offset, delta=1e-6)
+
+    def test_inverse_covariances(self):
+        covariances = np.array([[[2, 1], [1, 3]], [[1, 2], [2, 4]], [[0, 0], [0, 0]]], dtype=np.float64)
+
+        inverses = inverse_covariances(covariances)
+
+        np.testing.assert_array_almost_equal(inverses[0], np.linalg.inv(covariances[0]))
+        np.testing.assert_array_almost_equal(inverses[1], np.linalg.pinv(covariances[1]))
+        np.testing.assert_array_equal(inverses[2], np.zeros((2, 2)))
+
+    def test_weighted_means(self):
+        points1 = [Point2D(2, 2), Point2D(2, 5), Point2D(6, 5), Point2D(7, 3), Point2D(4, 7)]
+        points2 = [Point2D(6, 5), Point2D(7, 4), Point2D(8, 7), Point2D(5, 6), Point2D(5, 4)]
+        entities = [LinearRegressionEntity(points1), LinearRegressionEntity(points2)]
+
+        parameters = np.array([[[entity.slope, entity.offset]] * 2 for entity in entities])
+        covariances = np.array([[entity.covariance] * 2 for entity in entities])
+        weighted_parameters, weighted_covariances = weighted_means(parameters, covariances,
+                                                                   np.array([[True, True], [True, False]]))
+
+        reference_entity = LinearRegressionEntity.weighted_mean_entity(entities)
+        np.testing.assert_array_almost_equal(weighted_parameters[0], [reference_entity.slope, reference_entity.offset])
+        np.testing.assert_array_almost_equal(weighted_covariances[0], reference_entity.covariance)
+        np.testing.assert_array_almost_equal(weighted_parameters[1], [entities[0].slope, entities[0].offset])
 
 
 class TestLinearRegressionCoordination(unittest.TestCase):
@@ -176,3 +258,59 @@ class TestLinearRegressionCoordination(unittest.TestCase):
 
         self.assertEqual(first=coordinator.start_index, second=2)
         self.assertEqual(first=len(coordinator.entity.points), second=5)
+
+    def test_merge_statistics_ranges(self):
+        points = np.array([[6, 5], [7, 4], [8, 7], [5, 6], [5, 4], [3, 1], [2, 6], [1, 1], [9, 3]])
+        statistics = LinearRegressionStatistics(points)
+        coordinator1 = LinearRegressionCoordinator(LinearRegressionEntity(statistics=statistics, start=0, stop=5), 0)
+        coordinator2 = LinearRegressionCoordinator(LinearRegressionEntity(statistics=statistics, start=3, stop=8), 3)
+
+        coordinator = coordinator1.merge(coordinator2)
+        reference_entity = LinearRegressionEntity(points[:8])
+
+        self.assertIs(coordinator.entity.statistics, statistics)
+        self.assertEqual(coordinator.entity.stop, 8)
+        self.assertFalse(coordinator.entity.points.flags.owndata)
+        self.assertAlmostEqual(coordinator.entity.slope, reference_entity.slope, delta=1e-9)
+        self.assertAlmostEqual(coordinator.entity.offset, reference_entity.offset, delta=1e-9)
+        np.testing.assert_array_almost_equal(coordinator.entity.covariance, reference_entity.covariance)
+
+    def test_merge_orthogonal_points(self):
+        points1 = [Point2D(0, 5), Point2D(0, 6), Point2D(0, 7), Point2D(0.1, 8)]
+        coordinator1 = LinearRegressionCoordinator(OrthogonalRegressionEntity(points1), 0)
+        points2 = [Point2D(0.1, 8), Point2D(0, 9), Point2D(0, 10)]
+        coordinator2 = LinearRegressionCoordinator(OrthogonalRegressionEntity(points2), 3)
+
+        coordinator = coordinator1.merge(coordinator2)
+        reference_entity = OrthogonalRegressionEntity(points1 + points2[1:])
+
+        self.assertIsInstance(coordinator.entity, OrthogonalRegressionEntity)
+        self.assertEqual(len(coordinator.entity.points), 6)
+        self.assertAlmostEqual(coordinator.entity.angle, reference_entity.angle, delta=1e-9)
+        self.assertAlmostEqual(coordinator.entity.distance, reference_entity.distance, delta=1e-9)
+
+
+class TestLinearRegressionStatistics(unittest.TestCase):
+
+    def test_fit(self):
+        points = np.array([[2, 2], [2, 5], [6, 5], [7, 3], [4, 7], [1, 1], [1, 2], [1, 3]])
+        statistics = LinearRegressionStatistics(points)
+
+        slopes, offsets, covariances = statistics.fit([0, 2], [5, 7])
+
+        for i, (start, stop) in enumerate([(0, 5), (2, 7)]):
+            window = points[start:stop]
+            slope, offset = np.polyfit(window[:, 0], window[:, 1], 1)
+            self.assertAlmostEqual(slopes[i], slope, delta=1e-9)
+            self.assertAlmostEqual(offsets[i], offset, delta=1e-9)
+            np.testing.assert_array_almost_equal(covariances[i], np.cov(window[:, 0], window[:, 1]))
+
+    def test_fit_axis_aligned(self):
+        points = np.array([[0, 0], [1, 0], [2, 0], [3, 0]]) + 1000
+        statistics = LinearRegressionStatistics(points)
+
+        slopes, offsets, covariances = statistics.fit([0], [4])
+
+        self.assertEqual(slopes[0], 0)
+        self.assertEqual(covariances[0, 1, 1], 0)
+        self.assertEqual(covariances[0, 0, 1], 0)
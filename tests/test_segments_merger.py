@@ -0,0 +1,105 @@
+import math
+import unittest
+
+import numpy as np
+from sympy import Point2D, Segment
+
+from core.base import SimpleArea
+from core.mergers import SimpleSegmentsMerger
+
+
+def _segment(x1, y1, x2, y2):
+    return Segment(Point2D(x1, y1), Point2D(x2, y2))
+
+
+def _ends(segments):
+    return sorted(sorted([[round(float(segment.p1.x), 6), round(float(segment.p1.y), 6)],
+                          [round(float(segment.p2.x), 6), round(float(segment.p2.y), 6)]])
+                  for segment in segments)
+
+
+class TestSimpleSegmentsMerger(unittest.TestCase):
+
+    def setUp(self):
+        self.merger = SimpleSegmentsMerger(angle_tolerance=0.05, distance_tolerance=0.1, gap_tolerance=0.5)
+
+    def test_merge_overlapping(self):
+        segments = self.merger.merge_segments([_segment(0, 0, 2, 0), _segment(1, 0, 3, 0), _segment(3.3, 0, 5, 0)])
+
+        self.assertListEqual(_ends(segments), [[[0, 0], [5, 0]]])
+
+    def test_merge_keeps_separate(self):
+        segments = [_segment(0, 0, 2, 0), _segment(3, 0, 5, 0), _segment(0, 1, 2, 1), _segment(0, 0, 0, 2)]
+
+        merged_segments = self.merger.merge_segments(segments)
+
+        self.assertListEqual(_ends(merged_segments), _ends(segments))
+
+    def test_merge_opposite_directions(self):
+        # Orientations near 0 and near pi are in the first and the last bins
+        segments = self.merger.merge_segments([_segment(0, 0, 2, 0.01), _segment(3.5, 0, 1.5, 0.01)])
+
+        self.assertEqual(len(segments), 1)
+        self.assertAlmostEqual(float(segments[0].length), 3.5, places=3)
+
+    def test_merge_far_from_origin(self):
+        # Rhos of the lines differ by about 20 distance tolerances, while the segments are collinear
+        segments = self.merger.merge_segments([_segment(1000, 0, 1002, 0.02), _segment(1002.2, 0.02, 1004.2, 0.02)])
+
+        self.assertEqual(len(segments), 1)
+        self.assertAlmostEqual(float(segments[0].length), 4.2, places=3)
+
+    def test_merge_many(self):
+        angles = np.linspace(0, math.pi, 30, endpoint=False)
+        segments = []
+        for angle in angles.tolist():
+            direction = np.array([math.cos(angle), math.sin(angle)])
+            for start in range(4):
+                (x1, y1), (x2, y2) = (start * 2 * direction).tolist(), ((start * 2 + 2.2) * direction).tolist()
+                segments.append(_segment(x1, y1, x2, y2))
+
+        merged_segments = self.merger.merge_segments(segments)
+
+        self.assertEqual(len(merged_segments), 30)
+        for segment in merged_segments:
+            self.assertAlmostEqual(float(segment.length), 8.2, places=6)
+
+    def test_merge_areas(self):
+        first_area = SimpleArea(0, 0, np.array([[0, 0], [1, 0], [2, 0]]))
+        first_area.add_object(Segment, _segment(0, 0, 2, 0))
+        second_area = SimpleArea(2, 0, np.array([[2, 0], [3, 0]]))
+        second_area.add_object(Segment, _segment(2, 0, 3, 0))
+
+        area = self.merger.merge([first_area, second_area])
+
+        self.assertListEqual(area.points.array.tolist(), [[0, 0], [1, 0], [2, 0], [3, 0]])
+        self.assertListEqual(_ends(area.get_objects(Segment)), [[[0, 0], [3, 0]]])
+
+    def test_merge_areas_columns(self):
+        first_area = SimpleArea(0, 0, np.empty((0, 2)))
+        first_area.add_segments([[0, 0, 2, 0], [0, 5, 2, 5]], [3, 4], [1.5, 2.0], 'RDPSegmentsFinder')
+        second_area = SimpleArea(0, 0, np.empty((0, 2)))
+        second_area.add_segments([[2, 0, 4, 0]], [5], [2.5], 'HoughTransformSegmentsFinder')
+        second_area.add_segments([[0, 9, 1, 9]])
+
+        segments = self.merger.merge([first_area, second_area]).segments
+
+        self.assertListEqual(segments.ends.tolist(), [[0, 0, 4, 0], [0, 5, 2, 5], [0, 9, 1, 9]])
+        self.assertListEqual(segments.points_numbers.tolist(), [8, 4, -1])
+        self.assertTrue(np.allclose(segments.densities[:2], [2.0, 2.0]))
+        self.assertTrue(np.isnan(segments.densities[2]))
+        self.assertListEqual([segments.source_names[source] if source >= 0 else None
+                              for source in segments.sources.tolist()],
+                             ['HoughTransformSegmentsFinder', 'RDPSegmentsFinder', None])
+
+    def test_merge_areas_keeps_points_order(self):
+        first_area = SimpleArea(0, 0, np.array([[2, 0], [1, 0], [1, 0], [0, 0]]))
+        second_area = SimpleArea(0, 0, np.array([[0, 0], [1, 0], [5, 5], [3, 0], [5, 5]]))
+
+        area = self.merger.merge([first_area, second_area])
+
+        self.assertListEqual(area.points.array.tolist(), [[2, 0], [1, 0], [1, 0], [0, 0], [5, 5], [3, 0], [5, 5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+from sympy import Point2D
+
+from core.base import Area
+from core.spatial import SpatialIndex
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.points = np.array([[0, 0], [1, 0], [0, 1], [5, 5], [5, 6]], dtype=float)
+        self.index = SpatialIndex(self.points)
+
+    def test_query_radius(self):
+        offsets, indices = self.index.query_radius([[0, 0], [5, 5.5], [10, 10]], 1)
+
+        self.assertListEqual(offsets.tolist(), [0, 3, 5, 5])
+        self.assertListEqual(indices.tolist(), [0, 1, 2, 3, 4])
+
+    def test_count_radius(self):
+        self.assertListEqual(self.index.count_radius(self.points, 1.5).tolist(), [3, 3, 3, 2, 2])
+
+    def test_query_knn(self):
+        distances, indices = self.index.query_knn([[4.9, 5]], 2)
+
+        self.assertListEqual(indices.tolist(), [[3, 4]])
+        self.assertAlmostEqual(distances[0, 0], 0.1)
+
+    def test_query_knn_not_enough_points(self):
+        distances, indices = SpatialIndex(self.points[:1]).query_knn([[1, 1]], 2)
+
+        self.assertListEqual(indices.tolist(), [[0, 1]])
+        self.assertTrue(np.isinf(distances[0, 1]))
+
+    def test_empty(self):
+        offsets, indices = SpatialIndex(np.empty((0, 2))).query_radius([[0, 0]], 1)
+
+        self.assertListEqual(offsets.tolist(), [0, 0])
+        self.assertEqual(len(indices), 0)
+
+
+class TestAreaSpatialIndex(unittest.TestCase):
+
+    def test_cached(self):
+        area = Area(np.array([[0, 0], [1, 0]]))
+
+        self.assertIs(area.spatial_index, area.spatial_index)
+
+    def test_invalidated(self):
+        area = Area(np.array([[0, 0], [1, 0]]))
+        index = area.spatial_index
+
+        area.add_object(Point2D, Point2D(2, 0))
+        self.assertIsNot(area.spatial_index, index)
+        self.assertListEqual(area.spatial_index.count_radius([[2, 0]], 0.5).tolist(), [1])
+
+        index = area.spatial_index
+        area.points = np.array([[3, 0]])
+        self.assertIsNot(area.spatial_index, index)
+        self.assertEqual(len(area.spatial_index), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
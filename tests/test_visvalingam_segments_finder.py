@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+from sympy import Point2D, Segment
+
+from core.base import Polyline, Area
+from core.finders.visvalingam import VisvalingamSegmentsFinder
+
+
+class TestVisvalingamSegmentsFinder(unittest.TestCase):
+
+    def test_find_mask_area_threshold(self):
+        points = np.array([[0, 0], [1, 0.1], [2, 0], [3, 2], [4, 0]])
+
+        mask = VisvalingamSegmentsFinder.find_mask(points, area_threshold=1)
+
+        np.testing.assert_array_equal(mask, [True, False, True, True, True])
+
+    def test_find_mask_vertices_number(self):
+        points = np.array([[0, 0], [1, 0.1], [2, 0], [3, 2], [4, 0], [5, 0], [6, 3], [7, 0]])
+
+        mask = VisvalingamSegmentsFinder.find_mask(points, vertices_number=4)
+
+        self.assertListEqual(np.flatnonzero(mask).tolist(), [0, 3, 5, 7])
+
+    def test_find_mask_straight_line(self):
+        points = np.column_stack((np.arange(100), 2 * np.arange(100)))
+
+        mask = VisvalingamSegmentsFinder.find_mask(points, area_threshold=0.5)
+
+        self.assertListEqual(np.flatnonzero(mask).tolist(), [0, 99])
+
+    def test_find_segments_in_polylines_square(self):
+        top = [Point2D(x, 0) for x in range(0, 5)]
+        right = [Point2D(4, y) for y in range(1, 5)]
+        bottom = [Point2D(x, 4) for x in range(3, 0, -1)]
+        left = [Point2D(0, y) for y in range(4, 0, -1)]
+        square = top + right + bottom + left
+
+        polyline = Polyline()
+        for point in square:
+            polyline.add(point)
+
+        segments_reference = {Segment(square[0], square[4]),
+                              Segment(square[4], square[8]),
+                              Segment(square[8], square[12]),
+                              Segment(square[12], square[15])}
+
+        finder = VisvalingamSegmentsFinder(area_threshold=0.25)
+        segments = finder.find_segments_in_polylines([polyline])
+
+        self.assertSetEqual(set(segments), segments_reference)
+
+    def test_find(self):
+        points = [Point2D(0, 0), Point2D(1, 1), Point2D(2, 2), Point2D(3, 3)]
+        area = Area()
+        polyline = Polyline()
+        for point in points:
+            polyline.add(point)
+
+        area.add_object(Polyline, polyline)
+        VisvalingamSegmentsFinder(vertices_number=2).find(area)
+
+        self.assertListEqual(area.get_objects(Segment), [Segment(points[0], points[-1])])
+
+    def test_init_without_parameters(self):
+        with self.assertRaises(ValueError):
+            VisvalingamSegmentsFinder()